@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import documents, agents, chat, ml
+from app.api.v1.endpoints import documents, agents, chat, ml, tools
 
 api_router = APIRouter()
 
@@ -7,4 +7,5 @@ api_router.include_router(documents.router, prefix="/documents", tags=["document
 api_router.include_router(agents.router, prefix="/agents", tags=["agents"])
 api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
 api_router.include_router(ml.router, prefix="/ml", tags=["ml"])
+api_router.include_router(tools.router, prefix="/tools", tags=["tools"])
 
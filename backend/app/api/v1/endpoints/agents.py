@@ -1,7 +1,10 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
 from typing import List
 from pydantic import BaseModel
 from app.services.agent import agent_service, AgentConfig
+from app.services.vector_store import vector_store
+from app.core.tools import TOOL_REGISTRY
 
 router = APIRouter()
 
@@ -11,16 +14,24 @@ class CreateAgentRequest(BaseModel):
     system_prompt: str
     tools: List[str] = []
     document_ids: List[str] = []
+    dedicated_collection: bool = False
 
 @router.post("/", response_model=AgentConfig)
 async def create_agent(request: CreateAgentRequest):
+    unknown = [name for name in request.tools if name not in TOOL_REGISTRY]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown tools: {', '.join(unknown)}")
     agent = agent_service.create_agent(
         name=request.name,
         model=request.model,
         system_prompt=request.system_prompt,
         tools=request.tools,
-        document_ids=request.document_ids
+        document_ids=request.document_ids,
+        dedicated_collection=request.dedicated_collection
     )
+    if agent.dedicated_collection and agent.document_ids:
+        # Copies the documents' chunks, so keep it off the event loop
+        await asyncio.to_thread(vector_store.ensure_scoped_collection, agent.document_ids)
     return agent
 
 @router.get("/", response_model=List[AgentConfig])
@@ -33,3 +44,19 @@ async def get_agent(agent_id: str):
     if not agent:
         raise HTTPException(status_code=404, detail="Agent not found")
     return agent
+
+@router.delete("/{agent_id}")
+async def delete_agent(agent_id: str):
+    """Delete an agent, and its dedicated collection if no other agent searches the same documents."""
+    agent = agent_service.delete_agent(agent_id)
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    if agent.dedicated_collection and agent.document_ids:
+        doc_set = set(agent.document_ids)
+        in_use = any(
+            other.dedicated_collection and set(other.document_ids) == doc_set
+            for other in agent_service.list_agents()
+        )
+        if not in_use:
+            await asyncio.to_thread(vector_store.drop_scoped_collection, agent.document_ids)
+    return {"status": "deleted", "id": agent_id}
@@ -1,15 +1,24 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional, AsyncIterator, Iterator, Tuple
+import asyncio
+import base64
+import json
 from app.services.chat import chat_service
 from app.services.chat_storage import chat_storage
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
 class ChatRequest(BaseModel):
     agent_id: str
     message: str
-    history: List[Dict[str, str]] = []
+    # Deprecated: prior turns are loaded from storage for existing sessions;
+    # this is only used when the server has no history for the session
+    history: List[Dict[str, str]] = Field(default=[], json_schema_extra={"deprecated": True})
     session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
@@ -38,10 +47,94 @@ async def chat(request: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse_frame(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _sse(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[str]:
+    async for item in events:
+        yield _sse_frame(item["event"], item["data"])
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Same as POST /chat/ but streams the reply as Server-Sent Events:
+    `meta` (session_id, citations) first, then one `token` event per delta,
+    then `done` with ttfb_ms / total_ms (or `error`).
+    """
+    try:
+        events = await chat_service.chat_stream(
+            agent_id=request.agent_id,
+            message=request.message,
+            history=request.history,
+            session_id=request.session_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return StreamingResponse(
+        _sse(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _encode_cursor(row: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(chat_storage.page_key(row)).encode()).decode()
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    if not cursor:
+        return None
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created_at), str(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _json_array(rows: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    # Serializes row by row so the full list is never built in memory
+    yield "["
+    for i, row in enumerate(rows):
+        yield ("," if i else "") + json.dumps(row)
+    yield "]"
+
+def _ndjson(rows: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+def _page_response(page: List[Dict[str, Any]], limit: int) -> JSONResponse:
+    headers = {"X-Next-Cursor": _encode_cursor(page[-1])} if len(page) == limit else {}
+    return JSONResponse(page, headers=headers)
+
 @router.get("/history/{session_id}")
-async def get_chat_history(session_id: str):
-    return chat_storage.get_session_history(session_id)
+async def get_chat_history(session_id: str, limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """
+    Messages oldest first. With `limit`, returns one page and, if there may be
+    more, the cursor for the next one in the `X-Next-Cursor` header. Without it
+    the whole history is streamed as a JSON array.
+    """
+    after = _decode_cursor(cursor)
+    if limit is None and after is None:
+        return StreamingResponse(_json_array(chat_storage.iter_session_history(session_id)), media_type="application/json")
+    limit = limit or DEFAULT_PAGE_SIZE
+    page = await asyncio.to_thread(chat_storage.get_session_history, session_id, limit, after)
+    return _page_response(page, limit)
+
+@router.get("/history/{session_id}/export")
+async def export_chat_history(session_id: str):
+    """Full history as NDJSON (one message per line), streamed in constant memory."""
+    return StreamingResponse(_ndjson(chat_storage.iter_session_history(session_id)), media_type="application/x-ndjson")
 
 @router.get("/sessions/{agent_id}")
-async def get_agent_sessions(agent_id: str):
-    return chat_storage.get_agent_sessions(agent_id)
+async def get_agent_sessions(agent_id: str, limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """Sessions newest first; paginated like /history."""
+    after = _decode_cursor(cursor)
+    if limit is None and after is None:
+        return StreamingResponse(_json_array(chat_storage.iter_agent_sessions(agent_id)), media_type="application/json")
+    limit = limit or DEFAULT_PAGE_SIZE
+    page = await asyncio.to_thread(chat_storage.get_agent_sessions, agent_id, limit, after)
+    return _page_response(page, limit)
+
+@router.get("/sessions/{agent_id}/export")
+async def export_agent_sessions(agent_id: str):
+    return StreamingResponse(_ndjson(chat_storage.iter_agent_sessions(agent_id)), media_type="application/x-ndjson")
@@ -1,89 +1,162 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, Dict, Iterator, List, Optional
+from app.services.document_registry import document_registry
 from app.services.ingestion import ingestion_service
 from app.services.vector_store import vector_store
 from app.services.embedding import embedding_service
+from app.workers.tasks_ingestion import ingestion_jobs, IngestionJob, QueueFullError
+import asyncio
+import base64
+import hashlib
 import uuid
 import os
 import json
-from pathlib import Path
 
 router = APIRouter()
 
-# Simple JSON persistence for MVP
-DATA_DIR = Path("data")
-DATA_DIR.mkdir(exist_ok=True)
-DOCS_FILE = DATA_DIR / "documents.json"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
-def load_docs():
-    if not DOCS_FILE.exists():
-        return []
-    try:
-        with open(DOCS_FILE, "r") as f:
-            return json.load(f)
-    except:
-        return []
+def _on_job_finished(job: IngestionJob):
+    if document_registry.get(job.doc_id) is None:
+        # Deleted while it was being ingested
+        return
+    document_registry.update(
+        job.doc_id,
+        status="indexed" if job.status == "completed" else "failed",
+        chunks=job.chunks_done
+    )
 
-def save_docs(docs):
-    with open(DOCS_FILE, "w") as f:
-        json.dump(docs, f, indent=2)
+@router.post("/upload", status_code=202)
+async def upload_document(response: Response, file: UploadFile = File(...), external_id: Optional[str] = Form(None), upsert: bool = Form(False)):
+    """
+    Spool the upload and queue it for background ingestion. Poll
+    GET /documents/jobs/{job_id} for progress.
 
-@router.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
+    With `external_id` (or `upsert` to key on the filename) an upload that
+    matches an existing document replaces it in place: same id, and only
+    chunks whose content changed are re-embedded. Identical content is not
+    re-ingested at all (200 with `unchanged: true`).
+    """
+    hasher = hashlib.sha256()
     try:
-        # 1. Extract text
-        text = await ingestion_service.process_file(file)
-        
-        # 2. Chunk text
-        chunks = ingestion_service.chunk_text(text)
-        
-        # 3. Embed chunks
-        embeddings = embedding_service.get_embeddings(chunks)
-        
-        # 4. Store in Vector DB
-        doc_id = str(uuid.uuid4())
-        ids = [f"{doc_id}_{i}" for i in range(len(chunks))]
-        metadatas = [{"doc_id": doc_id, "filename": file.filename, "chunk_index": i} for i in range(len(chunks))]
-        
-        vector_store.add_documents(
-            documents=chunks,
-            metadatas=metadatas,
-            ids=ids
-        )
-        
-        # 5. Save metadata to JSON
-        doc_info = {
-            "id": doc_id, 
-            "filename": file.filename, 
-            "status": "indexed", 
-            "chunks": len(chunks),
-            "uploaded_at": str(os.path.getmtime(file.file.fileno()) if hasattr(file.file, 'fileno') else 0)
-        }
-        
-        docs = load_docs()
-        docs.append(doc_info)
-        save_docs(docs)
-        
-        return doc_info
-        
+        path = await ingestion_service.spool_upload(file, hasher)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    content_hash = hasher.hexdigest()
+    size_bytes = os.path.getsize(path)
+
+    existing = None
+    if external_id or upsert:
+        matches = await asyncio.to_thread(
+            document_registry.find_by_external_id if external_id else document_registry.find_by_filename,
+            external_id or file.filename
+        )
+        existing = matches[-1] if matches else None
+    if existing and existing["content_hash"] == content_hash and existing["status"] == "indexed":
+        os.remove(path)
+        response.status_code = 200
+        return {**existing, "unchanged": True}
+
+    # Registered before the job is queued so its completion always finds the row
+    if existing:
+        doc_id = existing["id"]
+        await asyncio.to_thread(
+            document_registry.update, doc_id,
+            filename=file.filename, status="processing", content_hash=content_hash, size_bytes=size_bytes
+        )
+    else:
+        doc_id = str(uuid.uuid4())
+        await asyncio.to_thread(
+            document_registry.add, doc_id, file.filename,
+            content_hash=content_hash, size_bytes=size_bytes, external_id=external_id
+        )
+    doc_info = await asyncio.to_thread(document_registry.get, doc_id)
+    try:
+        # Always diff against what is stored: a failed update rolls back to
+        # the previous version, whose chunks are still there
+        job = ingestion_jobs.submit(path, file.filename, doc_id, on_finished=_on_job_finished, incremental=existing is not None)
+    except QueueFullError as e:
+        os.remove(path)
+        if existing:
+            await asyncio.to_thread(
+                document_registry.update, doc_id,
+                **{field: existing[field] for field in ("filename", "status", "content_hash", "size_bytes")}
+            )
+        else:
+            await asyncio.to_thread(document_registry.delete, doc_id)
+        raise HTTPException(status_code=503, detail=str(e))
+
+    await asyncio.to_thread(document_registry.update, doc_id, job_id=job.id)
+    doc_info["job_id"] = job.id
+    return doc_info
+
+@router.get("/jobs/{job_id}", response_model=IngestionJob)
+async def get_ingestion_job(job_id: str):
+    job = ingestion_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def _encode_cursor(seq: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps(seq).encode()).decode()
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    if not cursor:
+        return None
+    try:
+        return int(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _json_array(rows: Iterator[Dict[str, Any]]) -> Iterator[str]:
+    yield "["
+    for i, row in enumerate(rows):
+        yield ("," if i else "") + json.dumps(row)
+    yield "]"
 
 @router.get("/")
-async def list_documents():
-    return load_docs()
+async def list_documents(limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), cursor: Optional[str] = None):
+    """
+    Documents in upload order. With `limit`, returns one page and, if there
+    may be more, the cursor for the next one in the `X-Next-Cursor` header.
+    Without it every document is streamed as a JSON array.
+    """
+    after = _decode_cursor(cursor)
+    if limit is None and after is None:
+        return StreamingResponse(_json_array(document_registry.iter_documents()), media_type="application/json")
+    limit = limit or DEFAULT_PAGE_SIZE
+    page = await asyncio.to_thread(document_registry.list, limit, after)
+    headers = {"X-Next-Cursor": _encode_cursor(page[-1]["seq"])} if len(page) == limit else {}
+    return JSONResponse(page, headers=headers)
+
+@router.get("/embedding-cache")
+async def embedding_cache_stats():
+    if embedding_service.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **embedding_service.cache.stats()}
+
+@router.get("/embedding-batcher")
+async def embedding_batcher_stats():
+    """Batch sizes and queue-wait times of query embedding micro-batching."""
+    if embedding_service.query_batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **embedding_service.query_batcher.stats()}
 
 @router.delete("/{doc_id}")
 async def delete_document(doc_id: str):
+    """
+    Queued ingestion jobs of the document are cancelled and a running one
+    is waited for, so no chunks are added after they are deleted.
+    """
+    ingestion_jobs.cancel_queued(doc_id)
     try:
-        # Delete from Vector DB
-        vector_store.delete_document(doc_id)
-        
-        # Delete from JSON
-        docs = load_docs()
-        docs = [d for d in docs if d["id"] != doc_id]
-        save_docs(docs)
-        
+        async with ingestion_jobs.document_lock(doc_id):
+            await asyncio.to_thread(vector_store.delete_document, doc_id)
+            await asyncio.to_thread(document_registry.delete, doc_id)
         return {"status": "deleted", "id": doc_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
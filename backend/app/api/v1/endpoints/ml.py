@@ -15,8 +15,11 @@ class TrainRequest(BaseModel):
     epochs: int = 3
     model_name: str = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
     mock: bool = False
+    # Pack several conversations into each training sequence (else batches
+    # of similar length are padded to their longest)
+    packing: bool = False
 
-def run_training(epochs: int, model_name: str, mock: bool):
+def run_training(epochs: int, model_name: str, mock: bool, packing: bool = False):
     cmd = [
         sys.executable, 
         TRAINING_SCRIPT,
@@ -27,6 +30,8 @@ def run_training(epochs: int, model_name: str, mock: bool):
     ]
     if mock:
         cmd.append("--mock")
+    if packing:
+        cmd.append("--packing")
         
     # Run in background
     with open(os.path.join(OUTPUT_DIR, "process.log"), "w") as log_file:
@@ -44,7 +49,7 @@ async def start_training(request: TrainRequest, background_tasks: BackgroundTask
         with open(DATA_PATH, "w") as f:
             f.write(json.dumps({"messages": [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]}) + "\n")
 
-    background_tasks.add_task(run_training, request.epochs, request.model_name, request.mock)
+    background_tasks.add_task(run_training, request.epochs, request.model_name, request.mock, request.packing)
     return {"status": "started", "message": "Training started in background"}
 
 @router.get("/status")
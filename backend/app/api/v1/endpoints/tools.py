@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from typing import Any, Dict, List
+from app.core.tools import TOOL_REGISTRY
+
+router = APIRouter()
+
+@router.get("/")
+async def list_tools() -> List[Dict[str, Any]]:
+    """Tools that can be enabled for an agent, as the schemas sent to the model."""
+    return [
+        {**tool.schema()["function"], "cache_ttl_seconds": tool.cache_ttl_seconds}
+        for tool in TOOL_REGISTRY.values()
+    ]
@@ -1,6 +1,6 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "AI Support Agent"
@@ -11,9 +11,144 @@ class Settings(BaseSettings):
 
     # OpenAI
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    # Point at any OpenAI-compatible server (vLLM, a local mock, ...)
+    OPENAI_BASE_URL: Optional[str] = None
+
+    # LLM client: shared connection pool, timeouts and concurrency cap
+    LLM_TIMEOUT_SECONDS: float = 60.0
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_MAX_CONCURRENCY: int = 64
+    LLM_MAX_RETRIES: int = 2
+
+    # Embeddings. Backend: "openai", "local" (ONNX Runtime on CPU), "hash"
+    # (offline feature hashing) or "auto" (openai when an API key is set,
+    # else hash). Backends produce different vector spaces: re-index the
+    # knowledge base after switching.
+    EMBEDDING_BACKEND: str = "auto"
+    EMBEDDING_MODEL: str = "text-embedding-ada-002"
+    # OpenAI accepts up to 2048 inputs / ~300k tokens per embeddings request
+    EMBEDDING_BATCH_SIZE: int = 2048
+    EMBEDDING_BATCH_MAX_TOKENS: int = 250_000
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    # Query embeddings of concurrent requests are sent together: a batch goes
+    # out when it has MAX_SIZE queries or WAIT_MS after the first one
+    EMBEDDING_QUERY_BATCHING: bool = True
+    EMBEDDING_QUERY_BATCH_MAX_SIZE: int = 64
+    EMBEDDING_QUERY_BATCH_WAIT_MS: float = 5.0
+    # Local backend: directory with model.onnx + tokenizer.json
+    LOCAL_EMBEDDING_MODEL_DIR: str = os.path.join("models", "all-MiniLM-L6-v2")
+    LOCAL_EMBEDDING_QUANTIZE: bool = True
+    LOCAL_EMBEDDING_THREADS: int = os.cpu_count() or 1
+    LOCAL_EMBEDDING_BATCH_SIZE: int = 32
+    LOCAL_EMBEDDING_MAX_LENGTH: int = 256
+    # Matches the OpenAI vector size so existing collections stay queryable
+    HASH_EMBEDDING_DIM: int = 1536
+    # Content-addressed cache: in-process LRU in front of a SQLite file
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = os.path.join("data", "embedding_cache.db")
+    EMBEDDING_CACHE_MEMORY_ITEMS: int = 10_000
+
+    # Ingestion pipeline: chunks per embed/upsert batch and batches buffered
+    # between stages (bounds memory for large documents)
+    INGEST_BATCH_SIZE: int = 64
+    INGEST_QUEUE_DEPTH: int = 2
+    INGEST_READ_BLOCK_BYTES: int = 1024 * 1024
+    # "tokens": chunks of up to CHUNK_TARGET_TOKENS (capped by the embedding
+    # model's input limit) cut at paragraph/sentence ends, overlapping by up
+    # to CHUNK_OVERLAP_TOKENS of whole sentences. "fixed": the original
+    # 1000-character windows with 200 characters of overlap.
+    CHUNK_STRATEGY: str = "tokens"
+    CHUNK_TARGET_TOKENS: int = 256
+    CHUNK_OVERLAP_TOKENS: int = 32
+    # PDFs with at least PDF_PARALLEL_MIN_PAGES pages are parsed by a pool of
+    # PDF_EXTRACT_WORKERS processes in PDF_PAGES_PER_TASK page ranges (0 = inline)
+    PDF_EXTRACT_WORKERS: int = os.cpu_count() or 1
+    PDF_PAGES_PER_TASK: int = 16
+    PDF_PARALLEL_MIN_PAGES: int = 32
+    INGEST_EMBED_RETRIES: int = 3
+    INGEST_RETRY_BACKOFF_SECONDS: float = 0.5
+
+    # Document registry (one row per uploaded document)
+    DOCUMENT_DB_PATH: str = os.path.join("data", "documents.db")
+
+    # Background ingestion jobs
+    INGEST_WORKERS: int = 2
+    INGEST_MAX_PENDING_JOBS: int = 200
+    INGEST_JOB_HISTORY: int = 1000
+
+    # Chat sessions and messages
+    CHAT_DB_PATH: str = os.path.join("data", "chat.db")
+    # Chat storage write-behind: rows are group-committed by a background
+    # writer when the batch fills up or the interval elapses
+    CHAT_WRITE_BEHIND: bool = True
+    CHAT_FLUSH_INTERVAL_MS: int = 50
+    CHAT_FLUSH_BATCH_SIZE: int = 256
+    CHAT_MAX_PENDING_WRITES: int = 10_000
+
+    # Conversation context: recent turns up to CHAT_HISTORY_MAX_TOKENS are sent
+    # verbatim, older ones as a rolling summary of at most CHAT_SUMMARY_MAX_TOKENS
+    CHAT_HISTORY_MAX_TOKENS: int = 2000
+    CHAT_SUMMARY_MAX_TOKENS: int = 400
+    CHAT_SUMMARY_INPUT_TOKENS: int = 3000
+    # Defaults to the agent's model
+    CHAT_SUMMARY_MODEL: Optional[str] = None
+
+    # RAG context: candidates retrieved per query, then merged, deduplicated
+    # and packed into RAG_CONTEXT_MAX_TOKENS
+    RAG_CANDIDATES: int = 8
+    RAG_CONTEXT_MAX_TOKENS: int = 1500
+    RAG_DEDUP_THRESHOLD: float = 0.8
+
+    # Hybrid retrieval: BM25 (SQLite FTS5) next to the vector search, fused
+    # with reciprocal rank fusion. Each side contributes HYBRID_CANDIDATES hits.
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_CANDIDATES: int = 20
+    RRF_K: int = 60
+    # Defaults to lexical.db inside CHROMA_DB_DIR
+    LEXICAL_INDEX_PATH: Optional[str] = None
 
     # Vector DB
     CHROMA_DB_DIR: str = os.path.join(os.getcwd(), "chroma_db")
+    # "chroma", or "numpy": exact brute-force search over a packed,
+    # memory-mapped float16/int8 matrix - smaller and faster than an HNSW
+    # index for knowledge bases up to a few hundred thousand chunks
+    VECTOR_STORE_BACKEND: str = "chroma"
+    # "float16" (near-exact) or "int8" (half the size, and faster to scan
+    # on CPUs where float16 -> float32 conversion is slow)
+    NUMPY_INDEX_DTYPE: str = "float16"
+    # Compact the matrix once this fraction of its rows are deleted
+    NUMPY_INDEX_COMPACT_RATIO: float = 0.2
+
+    # Agent tool calling: the tool calls of one model turn run concurrently
+    # (blocking tools on a pool of TOOL_MAX_WORKERS threads), each limited to
+    # TOOL_TIMEOUT_SECONDS unless the tool sets its own; after
+    # TOOL_MAX_ITERATIONS rounds of calls the model must answer
+    TOOL_MAX_ITERATIONS: int = 5
+    TOOL_TIMEOUT_SECONDS: float = 10.0
+    TOOL_MAX_WORKERS: int = 16
+    TOOL_CACHE_MAX_ITEMS: int = 1024
+
+    # Instrumentation: Prometheus metrics at /metrics. Requests slower than
+    # SLOW_REQUEST_MS are logged with their per-stage timings and, with
+    # PROFILE_SLOW_REQUESTS, profiled: all thread stacks are sampled every
+    # PROFILE_INTERVAL_MS while requests are in flight, and a slow one's
+    # samples are written to PROFILE_DIR as folded stacks (flame graph input)
+    METRICS_ENABLED: bool = True
+    SLOW_REQUEST_MS: float = 2000.0
+    PROFILE_SLOW_REQUESTS: bool = False
+    PROFILE_INTERVAL_MS: float = 10.0
+    PROFILE_DIR: str = os.path.join("data", "profiles")
+
+    # Retrieval cache (semantic tier is off while the threshold is 0). Only
+    # writes made by this process invalidate it: with several workers, results
+    # can be up to RETRIEVAL_CACHE_TTL_SECONDS stale
+    RETRIEVAL_CACHE_ENABLED: bool = True
+    RETRIEVAL_CACHE_MAX_ITEMS: int = 1024
+    RETRIEVAL_CACHE_TTL_SECONDS: float = 300.0
+    RETRIEVAL_CACHE_SEMANTIC_THRESHOLD: float = 0.0
+    RETRIEVAL_CACHE_SEMANTIC_MAX_ITEMS: int = 512
     
     class Config:
         case_sensitive = True
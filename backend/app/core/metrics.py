@@ -0,0 +1,366 @@
+"""
+In-process metrics: counters, latency histograms, per-stage spans and an
+opt-in sampling profiler for slow requests, exported in the Prometheus
+text format at /metrics.
+
+    with span("retrieval"):
+        ...
+
+A span costs two perf_counter() calls and one histogram update (a couple
+of microseconds), so instrumentation stays on in production. Spans opened
+while a request is traced (MetricsMiddleware) are also kept on the
+request, so a slow request is logged with its per-stage breakdown.
+"""
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+# Seconds; fine-grained at the low end for SQLite/cache stages, up to LLM timeouts
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Counter:
+    """Monotonic counter with optional labels."""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name if name.endswith("_total") else name + "_total"
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *label_values: str):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            items = list(self._values.items())
+        for values, value in items:
+            yield self.name, _format_labels(self.labels, values), value
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics) with optional labels."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def quantile(self, q: float, *label_values: str) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None without data)."""
+        series = self._series.get(label_values)
+        if not series:
+            return None
+        counts = series[0]
+        target, running = q * sum(counts), 0
+        for bound, n in zip(self.buckets + (math.inf,), counts):
+            running += n
+            if running >= target:
+                return bound
+        return math.inf
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        with self._lock:
+            items = [(values, list(series[0]), series[1]) for values, series in self._series.items()]
+        for values, counts, total in items:
+            running = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                running += n
+                yield self.name + "_bucket", _format_labels(self.labels, values, f'le="{_format_value(bound)}"'), running
+            yield self.name + "_sum", _format_labels(self.labels, values), total
+            yield self.name + "_count", _format_labels(self.labels, values), running
+
+class MetricsRegistry:
+    """
+    Named metrics plus collectors: callables run at scrape time that return
+    (name, kind, help, [(labels dict, value)]) for values kept elsewhere
+    (cache hit counts, queue depths), so the hot path doesn't pay for them.
+    """
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help: str, labels: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labels, buckets=buckets)
+
+    def add_collector(self, collector: Callable):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{sample}{labels} {_format_value(value)}" for sample, labels, value in metric.samples())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"Metrics collector {collector} failed: {e}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+stage_seconds = metrics.histogram("app_stage_duration_seconds", "Duration of instrumented stages (spans)", ("stage",))
+request_seconds = metrics.histogram("app_request_duration_seconds", "HTTP request duration, including streamed bodies", ("method", "route", "status"))
+llm_tokens = metrics.counter("llm_tokens", "Tokens reported by the LLM provider (streamed completions: one per chunk)", ("model", "type"))
+
+class Trace:
+    """Spans of one request, and profiler samples while a profiler runs."""
+    __slots__ = ("name", "started", "spans", "samples")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+        self.samples: Optional[_Tally] = None
+
+    def breakdown(self) -> str:
+        totals: Dict[str, float] = {}
+        for stage, _, duration in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + duration
+        return " ".join(f"{stage}={duration * 1000:.1f}ms" for stage, duration in totals.items())
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+class span:
+    """
+    Times a stage into app_stage_duration_seconds{stage=...} and the
+    current request's trace. Works as a sync context manager anywhere,
+    including around awaits and in worker threads (asyncio.to_thread
+    copies the request context).
+    """
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.started
+        stage_seconds.observe(duration, self.stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((self.stage, self.started - trace.started, duration))
+        return False
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread each interval_ms while at least one
+    traced request is in flight, and adds them to each active trace as
+    folded stacks ("thread;outer;...;inner" -> count, the input format of
+    flamegraph.pl and speedscope). Traces of requests slower than
+    SLOW_REQUEST_MS are written to out_dir.
+
+    Requests share the event loop thread, so a slow request's profile also
+    holds whatever else ran while it was in flight; the worker threads
+    (SQLite, embeddings, tools) show up under their own names.
+    """
+    def __init__(self, interval_ms: float, out_dir: str, max_files: int = 100):
+        self.interval = interval_ms / 1000
+        self.out_dir = out_dir
+        self.max_files = max_files
+        self._active: List[Trace] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._labels: Dict[Any, str] = {}
+
+    def begin(self, trace: Trace):
+        trace.samples = _Tally()
+        with self._cond:
+            self._active.append(trace)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def end(self, trace: Trace, slow: bool, route: str) -> Optional[str]:
+        with self._cond:
+            self._active.remove(trace)
+            samples = trace.samples.most_common()
+        if not slow or not samples:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        safe_route = "".join(c if c.isalnum() else "_" for c in route).strip("_") or "request"
+        elapsed_ms = (time.perf_counter() - trace.started) * 1000
+        path = os.path.join(self.out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_route}_{elapsed_ms:.0f}ms.folded")
+        with open(path, "w") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in samples)
+        self._prune()
+        return path
+
+    def _prune(self):
+        files = sorted(
+            (os.path.join(self.out_dir, name) for name in os.listdir(self.out_dir) if name.endswith(".folded")),
+            key=os.path.getmtime
+        )
+        for path in files[:-self.max_files]:
+            os.remove(path)
+
+    def _fold(self, frame) -> str:
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            label = self._labels.get(code)
+            if label is None:
+                label = self._labels[code] = _frame_label(code)
+            labels.append(label)
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._cond:
+                while not self._active:
+                    self._cond.wait()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [
+                names.get(ident, str(ident)) + ";" + self._fold(frame)
+                for ident, frame in sys._current_frames().items() if ident != me
+            ]
+            # Only traces still in flight: end() reads a trace's samples
+            # once it has left _active
+            with self._cond:
+                for trace in self._active:
+                    trace.samples.update(stacks)
+            time.sleep(self.interval)
+
+profiler: Optional[SamplingProfiler] = (
+    SamplingProfiler(settings.PROFILE_INTERVAL_MS, settings.PROFILE_DIR) if settings.PROFILE_SLOW_REQUESTS else None
+)
+
+def _route_template(scope) -> str:
+    """
+    Path template of the matched route ("/api/v1/documents/jobs/{job_id}"),
+    so label values stay bounded. Depending on the FastAPI version,
+    scope["route"].path of a route from an included router may be relative
+    to that router; the prefix is then taken from the request path.
+    """
+    template = getattr(scope.get("route"), "path", None)
+    if not template:
+        return "unmatched"
+    path = scope["path"]
+    try:
+        rendered = template.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return template
+    if path.endswith(rendered):
+        return path[:len(path) - len(rendered)] + template
+    return template
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that traces each HTTP request: its duration (streamed
+    bodies included) goes into app_request_duration_seconds by route
+    template, spans opened while serving it are collected, and requests
+    slower than SLOW_REQUEST_MS are logged with their stage breakdown (and
+    profiled, with PROFILE_SLOW_REQUESTS).
+    """
+    def __init__(self, app, exclude: Sequence[str] = ("/metrics", "/health")):
+        self.app = app
+        self.exclude = set(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope["path"])
+        token = _current_trace.set(trace)
+        if profiler is not None:
+            profiler.begin(trace)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            try:
+                _current_trace.reset(token)
+            except ValueError:
+                pass
+            elapsed = time.perf_counter() - trace.started
+            route = _route_template(scope)
+            request_seconds.observe(elapsed, scope["method"], route, str(status[0]))
+            slow = elapsed * 1000 >= settings.SLOW_REQUEST_MS
+            if slow:
+                print(f"Slow request {scope['method']} {route} ({status[0]}) {elapsed * 1000:.0f}ms: {trace.breakdown()}")
+            if profiler is not None:
+                path = profiler.end(trace, slow, route)
+                if path:
+                    print(f"Profile of slow request written to {path}")
@@ -0,0 +1,57 @@
+import math
+from functools import lru_cache
+from typing import List, Dict, Optional
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a length-based estimate
+    tiktoken = None
+
+# Fixed per-message cost of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+@lru_cache(maxsize=16)
+def _encoding(model: Optional[str]):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+    except KeyError:
+        pass  # model tiktoken doesn't know
+    except Exception as e:
+        # Encodings are downloaded on first use, which fails offline
+        print(f"tiktoken unavailable, estimating token counts: {e}")
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"tiktoken unavailable, estimating token counts: {e}")
+        return None
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Token count of text for model. Exact with tiktoken installed, otherwise
+    the usual ~4 characters per token estimate (rounded up).
+    """
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages: List[Dict[str, str]], model: Optional[str] = None) -> int:
+    return sum(count_tokens(m.get("content") or "", model) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+def truncate_tokens(text: str, max_tokens: int, model: Optional[str] = None, keep_end: bool = False) -> str:
+    """Cut text to at most max_tokens, keeping the start (or the end)."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding(model)
+    if encoding is None:
+        limit = max_tokens * 4
+        if len(text) <= limit:
+            return text
+        return text[-limit:] if keep_end else text[:limit]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[-max_tokens:] if keep_end else tokens[:max_tokens])
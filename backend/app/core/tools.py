@@ -1,8 +1,91 @@
-from typing import Dict, Any
+import inspect
+import re
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Union, get_args, get_origin, get_type_hints
 
-def create_servicenow_ticket(description: str, urgency: str = "medium") -> Dict[str, Any]:
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+def _json_schema(annotation) -> Dict[str, Any]:
+    origin = get_origin(annotation)
+    if origin is Literal:
+        values = list(get_args(annotation))
+        return {"type": _JSON_TYPES.get(type(values[0]), "string"), "enum": values}
+    if origin is Union:
+        # Optional[X] -> X
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        return _json_schema(args[0]) if len(args) == 1 else {}
+    if origin in (list, List):
+        args = get_args(annotation)
+        return {"type": "array", "items": _json_schema(args[0])} if args else {"type": "array"}
+    return {"type": _JSON_TYPES[origin or annotation]} if (origin or annotation) in _JSON_TYPES else {}
+
+def _docstring_parts(fn: Callable) -> Tuple[str, Dict[str, str]]:
+    """Summary and per-argument descriptions from a Google-style docstring."""
+    doc = inspect.getdoc(fn) or ""
+    summary, _, rest = doc.partition("Args:")
+    descriptions = {}
+    for line in rest.splitlines():
+        match = re.match(r"\s*(\w+)(?: \(.*?\))?: (.+)", line)
+        if match:
+            descriptions[match.group(1)] = match.group(2).strip()
+    return " ".join(summary.split()), descriptions
+
+class Tool:
+    """
+    A function agents can let the model call, with the JSON schema sent to
+    the model generated from its signature and docstring.
+
+    Async functions are awaited; plain functions are treated as blocking and
+    run on a thread pool. cache_ttl_seconds > 0 marks the tool as an
+    idempotent lookup whose results may be reused for that long.
+    """
+    def __init__(self, fn: Callable, cache_ttl_seconds: float = 0.0, timeout_seconds: Optional[float] = None):
+        self.fn = fn
+        self.name = fn.__name__
+        self.is_async = inspect.iscoroutinefunction(fn)
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.timeout_seconds = timeout_seconds
+        self.description, arg_descriptions = _docstring_parts(fn)
+
+        hints = get_type_hints(fn)
+        properties, required = {}, []
+        for name, param in inspect.signature(fn).parameters.items():
+            schema = _json_schema(hints.get(name, str))
+            if name in arg_descriptions:
+                schema["description"] = arg_descriptions[name]
+            properties[name] = schema
+            if param.default is inspect.Parameter.empty:
+                required.append(name)
+        self.parameters = {"type": "object", "properties": properties, "required": required}
+
+    def schema(self) -> Dict[str, Any]:
+        """OpenAI `tools` entry."""
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters},
+        }
+
+TOOL_REGISTRY: Dict[str, Tool] = {}
+
+def register_tool(fn: Optional[Callable] = None, *, cache_ttl_seconds: float = 0.0, timeout_seconds: Optional[float] = None):
+    """Add a function to TOOL_REGISTRY; usable as @register_tool or @register_tool(...)."""
+    def register(fn: Callable) -> Callable:
+        TOOL_REGISTRY[fn.__name__] = Tool(fn, cache_ttl_seconds=cache_ttl_seconds, timeout_seconds=timeout_seconds)
+        return fn
+    return register(fn) if fn is not None else register
+
+def tool_schemas(names: List[str], registry: Optional[Dict[str, Tool]] = None) -> List[Dict[str, Any]]:
+    """OpenAI `tools` entries for the named tools; unknown names are skipped."""
+    registry = TOOL_REGISTRY if registry is None else registry
+    return [registry[name].schema() for name in names if name in registry]
+
+@register_tool
+def create_servicenow_ticket(description: str, urgency: Literal["low", "medium", "high"] = "medium") -> Dict[str, Any]:
     """
     Mock tool to create a ServiceNow ticket.
+
+    Args:
+        description: What the user needs help with, in their own words.
+        urgency: How urgent the issue is for the user.
     """
     return {
         "ticket_id": "INC123456",
@@ -11,9 +94,13 @@ def create_servicenow_ticket(description: str, urgency: str = "medium") -> Dict[
         "urgency": urgency
     }
 
+@register_tool(cache_ttl_seconds=60.0)
 def lookup_user_status(user_id: str) -> Dict[str, Any]:
     """
     Mock tool to look up user status.
+
+    Args:
+        user_id: The user's id or username.
     """
     return {
         "user_id": user_id,
@@ -21,7 +108,4 @@ def lookup_user_status(user_id: str) -> Dict[str, Any]:
         "last_login": "2023-10-27T09:00:00Z"
     }
 
-AVAILABLE_TOOLS = {
-    "create_servicenow_ticket": create_servicenow_ticket,
-    "lookup_user_status": lookup_user_status
-}
+AVAILABLE_TOOLS = {name: tool.fn for name, tool in TOOL_REGISTRY.items()}
@@ -0,0 +1,80 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Sequence, Union
+
+# Applied to every connection. WAL lets readers run alongside the single
+# writer; NORMAL sync is durable across app crashes in WAL mode and only
+# fsyncs at checkpoints.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",  # 64 MiB page cache
+    "PRAGMA mmap_size=268435456",  # 256 MiB
+)
+
+Migration = Union[str, Sequence[str]]
+
+class SQLiteDatabase:
+    """
+    Thread-local pool of tuned SQLite connections to one database file.
+
+    Each thread reuses a single connection instead of opening one per call;
+    sqlite3 connections can't be shared across threads, so this is the
+    natural pool for code that runs on the event loop and in to_thread
+    workers alike.
+    """
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; transactions are opened explicitly below
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """BEGIN IMMEDIATE ... COMMIT, rolled back on error."""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def migrate(self, migrations: List[Migration]):
+        """
+        Apply migrations[user_version:] in order, each in its own transaction,
+        bumping PRAGMA user_version as they succeed.
+        """
+        conn = self.connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(migrations[version:], start=version + 1):
+            statements = [migration] if isinstance(migration, str) else migration
+            with self.transaction() as tx:
+                for statement in statements:
+                    tx.execute(statement)
+                tx.execute(f"PRAGMA user_version = {number}")
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
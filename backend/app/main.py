@@ -1,10 +1,36 @@
 # FastAPI entrypoint
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from app.core.config import settings
+from app.core.metrics import metrics, MetricsMiddleware
 from app.api.v1.api import api_router
+from app.services.llm_service import llm_service
+from app.services.chat_storage import chat_storage
+from app.services.conversation import conversation_memory
+from app.services.document_registry import document_registry
+from app.services.ingestion import ingestion_service
+from app.services.embedding import embedding_service
+from app.services.agent_service import tool_executor
+from app.services.retrieval_service import retrieval_service
+from app.workers.tasks_ingestion import ingestion_jobs
 
-app = FastAPI(title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ingestion_jobs.start()
+    yield
+    await ingestion_jobs.stop()
+    await conversation_memory.aclose()
+    ingestion_service.shutdown()
+    embedding_service.close()
+    tool_executor.shutdown()
+    chat_storage.close()
+    document_registry.close()
+    # Release pooled connections to the LLM provider
+    await llm_service.aclose()
+
+app = FastAPI(title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json", lifespan=lifespan)
 
 # Set all CORS enabled origins
 if settings.BACKEND_CORS_ORIGINS:
@@ -14,10 +40,52 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+def _service_metrics():
+    """Counts the services already keep, read at scrape time."""
+    hits, misses, items = [], [], []
+    if retrieval_service.cache is not None:
+        cache = retrieval_service.cache
+        hits.append(({"cache": "retrieval"}, cache.hits))
+        hits.append(({"cache": "retrieval_semantic"}, cache.semantic_hits))
+        misses.append(({"cache": "retrieval"}, cache.misses))
+        items.append(({"cache": "retrieval"}, len(cache)))
+    if embedding_service.cache is not None:
+        cache = embedding_service.cache
+        hits.append(({"cache": "embedding_memory"}, cache.memory_hits))
+        hits.append(({"cache": "embedding_disk"}, cache.disk_hits))
+        misses.append(({"cache": "embedding"}, cache.misses))
+        items.append(({"cache": "embedding_memory"}, len(cache)))
+    hits.append(({"cache": "tools"}, tool_executor.cache.hits))
+    misses.append(({"cache": "tools"}, tool_executor.cache.misses))
+    items.append(({"cache": "tools"}, len(tool_executor.cache)))
+    yield "cache_hits_total", "counter", "Cache lookups answered from the cache", hits
+    yield "cache_misses_total", "counter", "Cache lookups that missed", misses
+    yield "cache_items", "gauge", "Entries held in the cache", items
+
+    batcher = embedding_service.query_batcher
+    if batcher is not None:
+        yield "embedding_query_batches_total", "counter", "Query-embedding micro-batches sent", [({}, batcher.batches)]
+        yield "embedding_query_batch_items_total", "counter", "Queries embedded through the micro-batcher", [({}, batcher.items)]
+
+    jobs = {}
+    for job in list(ingestion_jobs.jobs.values()):
+        jobs[job.status] = jobs.get(job.status, 0) + 1
+    yield "ingest_jobs", "gauge", "Ingestion jobs by status (finished ones up to INGEST_JOB_HISTORY)", [({"status": status}, n) for status, n in jobs.items()]
+    yield "chat_storage_pending_writes", "gauge", "Chat rows queued for the write-behind writer", [({}, chat_storage.pending_writes())]
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    metrics.add_collector(_service_metrics)
+
+    @app.get("/metrics", include_in_schema=False)
+    def prometheus_metrics():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
\ No newline at end of file
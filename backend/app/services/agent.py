@@ -9,12 +9,15 @@ class AgentConfig(BaseModel):
     system_prompt: str
     tools: List[str]
     document_ids: List[str]
+    # Search a dedicated vector collection holding only this agent's
+    # documents instead of filtering the shared one (for large corpora)
+    dedicated_collection: bool = False
 
 class AgentService:
     def __init__(self):
         self.agents: Dict[str, AgentConfig] = {}
 
-    def create_agent(self, name: str, model: str, system_prompt: str, tools: List[str], document_ids: List[str]) -> AgentConfig:
+    def create_agent(self, name: str, model: str, system_prompt: str, tools: List[str], document_ids: List[str], dedicated_collection: bool = False) -> AgentConfig:
         agent_id = str(uuid.uuid4())
         agent = AgentConfig(
             id=agent_id,
@@ -22,7 +25,8 @@ class AgentService:
             model=model,
             system_prompt=system_prompt,
             tools=tools,
-            document_ids=document_ids
+            document_ids=document_ids,
+            dedicated_collection=dedicated_collection
         )
         self.agents[agent_id] = agent
         return agent
@@ -33,4 +37,7 @@ class AgentService:
     def list_agents(self) -> List[AgentConfig]:
         return list(self.agents.values())
 
+    def delete_agent(self, agent_id: str) -> Optional[AgentConfig]:
+        return self.agents.pop(agent_id, None)
+
 agent_service = AgentService()
@@ -1 +1,185 @@
 # tool-calling / orchestration logic
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import span
+from app.core.tools import TOOL_REGISTRY, Tool, tool_schemas
+from app.services.llm_service import llm_service
+
+class ToolResultCache:
+    """TTL + LRU cache of tool results, keyed on (tool, canonical JSON arguments)."""
+    def __init__(self, max_items: int = 1024):
+        self.max_items = max_items
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(name: str, arguments: Dict[str, Any]) -> Tuple[str, str]:
+        return name, json.dumps(arguments, sort_keys=True, separators=(",", ":"))
+
+    def get(self, key: Tuple[str, str]) -> Optional[Tuple[Any]]:
+        """(result,) on a hit, None on a miss (a result may itself be None)."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return (entry[1],)
+
+    def put(self, key: Tuple[str, str], result: Any, ttl_seconds: float):
+        self._entries[key] = (time.monotonic() + ttl_seconds, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_items:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class ToolExecutor:
+    """
+    Function-calling loop for agents with tools.
+
+    Every tool call of a model turn runs concurrently: async tools on the
+    event loop, blocking ones on a thread pool, each bounded by its own
+    timeout (the tool's timeout_seconds, else TOOL_TIMEOUT_SECONDS), so a
+    turn costs as much as its slowest call rather than the sum. Results of
+    cacheable tools are reused until their TTL expires, and identical calls
+    in flight at the same time share one execution. Errors, timeouts and
+    unknown tools are reported back to the model as {"error": ...} so it
+    can recover. After TOOL_MAX_ITERATIONS rounds the model has to answer
+    without tools.
+
+    A timed-out blocking tool keeps its worker thread until it returns;
+    only the model stops waiting for it.
+    """
+    def __init__(self, registry: Optional[Dict[str, Tool]] = None, max_workers: Optional[int] = None, cache_max_items: Optional[int] = None):
+        self.registry = TOOL_REGISTRY if registry is None else registry
+        self.max_workers = max_workers or settings.TOOL_MAX_WORKERS
+        self.cache = ToolResultCache(cache_max_items or settings.TOOL_CACHE_MAX_ITEMS)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+        return self._pool
+
+    async def _invoke(self, tool: Tool, arguments: Dict[str, Any]) -> Any:
+        timeout = tool.timeout_seconds or settings.TOOL_TIMEOUT_SECONDS
+        with span(f"tool.{tool.name}"):
+            if tool.is_async:
+                return await asyncio.wait_for(tool.fn(**arguments), timeout)
+            loop = asyncio.get_running_loop()
+            return await asyncio.wait_for(loop.run_in_executor(self._executor(), lambda: tool.fn(**arguments)), timeout)
+
+    async def _invoke_cached(self, tool: Tool, arguments: Dict[str, Any]) -> Tuple[Any, bool]:
+        key = self.cache.key(tool.name, arguments)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return hit[0], True
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._invoke(tool, arguments)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved by the waiters, if any; don't warn when there are none
+            future.exception()
+            raise
+        else:
+            self.cache.put(key, result, tool.cache_ttl_seconds)
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._inflight[key]
+
+    async def call(self, call_id: str, name: str, arguments: str) -> Dict[str, Any]:
+        """Run one tool call; never raises, failures are in the record's "error"."""
+        started = time.perf_counter()
+        record: Dict[str, Any] = {"id": call_id, "name": name, "arguments": arguments, "result": None, "error": None, "cached": False}
+        tool = self.registry.get(name)
+        try:
+            if tool is None:
+                raise LookupError(f"Unknown tool: {name}")
+            try:
+                parsed = json.loads(arguments or "{}")
+            except ValueError as e:
+                raise ValueError(f"Arguments are not valid JSON: {e}")
+            if not isinstance(parsed, dict):
+                raise ValueError("Arguments must be a JSON object")
+            record["arguments"] = parsed
+            if tool.cache_ttl_seconds > 0:
+                record["result"], record["cached"] = await self._invoke_cached(tool, parsed)
+            else:
+                record["result"] = await self._invoke(tool, parsed)
+        except asyncio.TimeoutError:
+            record["error"] = f"Tool {name} timed out"
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if record["error"]:
+            print(f"Tool call {name} failed: {record['error']}")
+        return record
+
+    async def execute(self, tool_calls) -> List[Dict[str, Any]]:
+        """Run a model turn's tool calls concurrently; records in call order."""
+        return await asyncio.gather(*(
+            self.call(tool_call.id, tool_call.function.name, tool_call.function.arguments)
+            for tool_call in tool_calls
+        ))
+
+    async def run(self, model: str, messages: List[Dict[str, Any]], tool_names: List[str], temperature: float = 0.7) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Let the model call the named tools until it answers. Returns the
+        answer and a record of every tool call made on the way.
+        """
+        tools = tool_schemas(tool_names, self.registry)
+        messages = list(messages)
+        records: List[Dict[str, Any]] = []
+        for _ in range(settings.TOOL_MAX_ITERATIONS):
+            message = await llm_service.complete_with_tools(model, messages, tools, temperature=temperature)
+            if not message.tool_calls:
+                return message.content or "", records
+            messages.append({
+                "role": "assistant",
+                "content": message.content,
+                "tool_calls": [
+                    {"id": tc.id, "type": "function", "function": {"name": tc.function.name, "arguments": tc.function.arguments}}
+                    for tc in message.tool_calls
+                ],
+            })
+            results = await self.execute(message.tool_calls)
+            for record in results:
+                content = {"error": record["error"]} if record["error"] else record["result"]
+                messages.append({"role": "tool", "tool_call_id": record["id"], "content": json.dumps(content, default=str)})
+            records.extend(results)
+
+        print(f"Tool loop hit TOOL_MAX_ITERATIONS ({settings.TOOL_MAX_ITERATIONS}); asking for a final answer")
+        message = await llm_service.complete_with_tools(model, messages, tools, temperature=temperature, tool_choice="none")
+        return message.content or "", records
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+tool_executor = ToolExecutor()
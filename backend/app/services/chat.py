@@ -1,34 +1,56 @@
-from typing import List, Dict, Any, Optional
-from app.services.agent import agent_service
-from app.services.vector_store import vector_store
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from app.services.agent import agent_service, AgentConfig
+from app.services.retrieval_service import retrieval_service
 from app.services.chat_storage import chat_storage
-from app.core.tools import AVAILABLE_TOOLS
-from openai import OpenAI
-import json
-import os
+from app.services.conversation import conversation_memory
+from app.services.context_assembler import context_assembler
+from app.services.llm_service import llm_service
+from app.services.agent_service import tool_executor
+import time
 from app.core.config import settings
+from app.core.metrics import metrics, span
 
-class ChatService:
-    def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+MISSING_KEY_RESPONSE = "I'm sorry, but I can't process your request right now because the OpenAI API key is missing. Please configure it in the backend .env file."
 
-    async def chat(self, agent_id: str, message: str, history: List[Dict[str, str]], session_id: Optional[str] = None) -> Dict[str, Any]:
+stream_ttfb_seconds = metrics.histogram("chat_stream_ttfb_seconds", "Time from request to the first streamed answer token", ("model",))
+
+class ChatService:
+    async def _prepare(self, agent_id: str, message: str, history: List[Dict[str, str]], session_id: Optional[str]) -> Tuple[AgentConfig, str, List[Dict[str, str]], List[str]]:
+        """
+        Resolve the agent and session, persist the user message, retrieve
+        context and build the prompt. Shared by the blocking and streaming paths.
+        """
         agent = agent_service.get_agent(agent_id)
         if not agent:
             raise ValueError("Agent not found")
 
-        # 0. Manage Session
-        if not session_id:
-            session_id = chat_storage.create_session(agent_id, title=message[:50])
-        
+        # 0. Manage Session. Prior turns come from storage (a token-budgeted
+        # window plus a rolling summary); a client-sent history is only used
+        # for sessions the server has no messages for.
+        with span("chat.history"):
+            await chat_storage.wait_for_room()
+            if session_id:
+                stored_history = await conversation_memory.build_history(session_id, agent.model)
+            else:
+                session_id = chat_storage.create_session(agent_id, title=message[:50], block=False)
+                stored_history = []
+            if not stored_history and history:
+                stored_history = conversation_memory.fit_client_history(history, agent.model)
+
         # Save user message
-        chat_storage.add_message(session_id, "user", message)
+        with span("chat.store"):
+            chat_storage.add_message(session_id, "user", message, block=False)
 
         # 1. Retrieve context
         try:
-            search_results = vector_store.query(message, n_results=3)
-            documents = search_results.get("documents", [[]])[0]
-            context = "\n\n".join(documents)
+            with span("chat.retrieval"):
+                search_results = await retrieval_service.retrieve(
+                    message,
+                    n_results=settings.RAG_CANDIDATES,
+                    document_ids=agent.document_ids
+                )
+            with span("chat.context"):
+                context, documents = context_assembler.assemble(search_results, model=agent.model)
         except Exception as e:
             print(f"Vector store query failed: {e}")
             documents = []
@@ -36,31 +58,41 @@ class ChatService:
 
         # 2. Construct Prompt
         system_prompt = f"{agent.system_prompt}\n\nContext:\n{context}"
-        
+
         messages = [{"role": "system", "content": system_prompt}]
         # Add history
-        for msg in history:
+        for msg in stored_history:
             messages.append(msg)
         messages.append({"role": "user", "content": message})
 
+        return agent, session_id, messages, documents
+
+    async def chat(self, agent_id: str, message: str, history: List[Dict[str, str]], session_id: Optional[str] = None) -> Dict[str, Any]:
+        agent, session_id, messages, documents = await self._prepare(agent_id, message, history, session_id)
+
         # 3. Call LLM
         if not settings.OPENAI_API_KEY:
             # Fallback for demo if no key
             print("WARNING: No OpenAI API Key found. Returning mock response.")
             return {
-                "response": "I'm sorry, but I can't process your request right now because the OpenAI API key is missing. Please configure it in the backend .env file.",
+                "response": MISSING_KEY_RESPONSE,
                 "citations": [],
                 "tool_calls": [],
                 "session_id": session_id
             }
 
+        tool_calls: List[Dict[str, Any]] = []
         try:
-            response = self.client.chat.completions.create(
-                model=agent.model,
-                messages=messages,
-                temperature=0.7
-            )
-            answer = response.choices[0].message.content
+            if agent.tools:
+                with span("chat.tool_loop"):
+                    answer, tool_calls = await tool_executor.run(agent.model, messages, agent.tools, temperature=0.7)
+            else:
+                with span("chat.llm"):
+                    answer = await llm_service.complete(
+                        model=agent.model,
+                        messages=messages,
+                        temperature=0.7
+                    )
         except Exception as e:
             print(f"OpenAI API call failed: {e}")
             # Return a friendly error to the user instead of crashing
@@ -70,34 +102,107 @@ class ChatService:
                 "tool_calls": [],
                 "session_id": session_id
             }
-        
+
         # Save assistant response
-        chat_storage.add_message(session_id, "assistant", answer)
+        with span("chat.store"):
+            await chat_storage.wait_for_room()
+            chat_storage.add_message(session_id, "assistant", answer, block=False)
+
+            # Log for fine-tuning
+            self._log_for_finetuning(agent, message, answer)
 
-        # Log for fine-tuning
-        try:
-            log_entry = {
-                "messages": [
-                    {"role": "system", "content": agent.system_prompt},
-                    {"role": "user", "content": message},
-                    {"role": "assistant", "content": answer}
-                ]
-            }
-            
-            # Ensure directory exists
-            log_dir = os.path.join(os.getcwd(), "..", "ml", "data", "raw")
-            os.makedirs(log_dir, exist_ok=True)
-            
-            with open(os.path.join(log_dir, "chat_logs.jsonl"), "a", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry) + "\n")
-        except Exception as e:
-            print(f"Failed to log chat: {e}")
-        
         return {
             "response": answer,
             "citations": documents,
-            "tool_calls": [],
+            "tool_calls": tool_calls,
             "session_id": session_id
         }
 
+    async def chat_stream(self, agent_id: str, message: str, history: List[Dict[str, str]], session_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of chat(). Yields events as {"event": ..., "data": ...}:
+        one "meta" event with the session id and citations, a "token" event per
+        delta from the model, then "done" (or "error") with timing info.
+
+        ValueError for an unknown agent is raised before the first event so the
+        endpoint can still answer with a 404.
+        """
+        started = time.perf_counter()
+        agent, session_id, messages, documents = await self._prepare(agent_id, message, history, session_id)
+        return self._stream_events(agent, session_id, message, messages, documents, started)
+
+    async def _stream_events(self, agent: AgentConfig, session_id: str, message: str, messages: List[Dict[str, str]], documents: List[str], started: float) -> AsyncIterator[Dict[str, Any]]:
+        yield {"event": "meta", "data": {"session_id": session_id, "citations": documents, "tool_calls": []}}
+
+        if not settings.OPENAI_API_KEY:
+            print("WARNING: No OpenAI API Key found. Returning mock response.")
+            yield {"event": "token", "data": {"delta": MISSING_KEY_RESPONSE}}
+            yield {"event": "done", "data": {"ttfb_ms": self._elapsed_ms(started), "total_ms": self._elapsed_ms(started)}}
+            return
+
+        # Deltas are kept only here and joined once when the stream ends
+        parts: List[str] = []
+        ttfb_ms: Optional[float] = None
+        tool_calls: List[Dict[str, Any]] = []
+        completed = False
+        try:
+            async for delta in self._answer_deltas(agent, messages, tool_calls):
+                if ttfb_ms is None:
+                    ttfb_ms = self._elapsed_ms(started)
+                    stream_ttfb_seconds.observe(ttfb_ms / 1000, agent.model)
+                parts.append(delta)
+                yield {"event": "token", "data": {"delta": delta}}
+            completed = True
+        except Exception as e:
+            print(f"OpenAI API call failed: {e}")
+            yield {"event": "error", "data": {"detail": f"I encountered an error communicating with the AI provider: {str(e)}"}}
+        finally:
+            # Runs on normal completion and on client disconnect; persist
+            # whatever the user has already seen. This may run during
+            # cancellation, so it doesn't wait for queue room.
+            if parts:
+                answer = "".join(parts)
+                chat_storage.add_message(session_id, "assistant", answer, block=False)
+                if completed:
+                    self._log_for_finetuning(agent, message, answer)
+
+        if completed:
+            total_ms = self._elapsed_ms(started)
+            print(f"Chat stream {session_id}: ttfb={ttfb_ms}ms total={total_ms}ms")
+            done = {"ttfb_ms": ttfb_ms, "total_ms": total_ms}
+            if agent.tools:
+                done["tool_calls"] = tool_calls
+            yield {"event": "done", "data": done}
+
+    async def _answer_deltas(self, agent: AgentConfig, messages: List[Dict[str, str]], tool_calls: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """
+        Token deltas of the answer. Agents with tools go through the tool
+        loop first and their answer arrives as a single delta; the calls
+        made are appended to tool_calls.
+        """
+        if not agent.tools:
+            async for delta in llm_service.stream(model=agent.model, messages=messages, temperature=0.7):
+                yield delta
+            return
+        with span("chat.tool_loop"):
+            answer, records = await tool_executor.run(agent.model, messages, agent.tools, temperature=0.7)
+        tool_calls.extend(records)
+        if answer:
+            yield answer
+
+    @staticmethod
+    def _elapsed_ms(started: float) -> float:
+        return round((time.perf_counter() - started) * 1000, 1)
+
+    def _log_for_finetuning(self, agent: AgentConfig, message: str, answer: str):
+        # Appended to ml/data/raw/chat_logs.jsonl by the storage writer.
+        # Called on the event loop, after the caller's wait_for_room()
+        chat_storage.append_finetune_log({
+            "messages": [
+                {"role": "system", "content": agent.system_prompt},
+                {"role": "user", "content": message},
+                {"role": "assistant", "content": answer}
+            ]
+        }, block=False)
+
 chat_service = ChatService()
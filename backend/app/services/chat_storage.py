@@ -1,100 +1,350 @@
-import sqlite3
+import asyncio
+import atexit
 import uuid
-from typing import List, Dict, Optional
+import os
+import threading
+import time
+from typing import List, Dict, Optional, Tuple, Iterator
 from pathlib import Path
 import json
-from datetime import datetime
+from datetime import datetime, timezone
+from app.core.config import settings
+from app.core.metrics import span
+from app.db.session import SQLiteDatabase
+
+# Append-only; applying entry N brings the schema to version N (PRAGMA user_version)
+MIGRATIONS = [
+    # 1: original schema (a no-op for databases created before migrations)
+    [
+        """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            agent_id TEXT NOT NULL,
+            title TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            id TEXT PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES sessions (id)
+        )
+        """,
+    ],
+    # 2: history reads seek by session in time order; session listing is
+    # answered from the (covering) index alone
+    [
+        "CREATE INDEX IF NOT EXISTS idx_messages_session_created ON messages (session_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_agent_created ON sessions (agent_id, created_at, id, title)",
+    ],
+    # 3: history is paginated by the (created_at, id) keyset. Replaces the
+    # index from 2, a prefix of this one that inserts would still have to
+    # maintain. Not covering: role and content are read from the table.
+    [
+        "DROP INDEX IF EXISTS idx_messages_session_created",
+        "CREATE INDEX IF NOT EXISTS idx_messages_session_created_id ON messages (session_id, created_at, id)",
+    ],
+    # 4: rolling summary of the turns that fell out of a session's context
+    # window; covers every message up to (covered_created_at, covered_id)
+    [
+        """
+        CREATE TABLE IF NOT EXISTS session_summaries (
+            session_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            covered_created_at TEXT NOT NULL,
+            covered_id TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """,
+    ],
+]
+
+def _now() -> str:
+    # Same format as CURRENT_TIMESTAMP (UTC) plus microseconds, so old and new
+    # rows sort together and messages within one second keep their order
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
 
 class ChatStorageService:
-    def __init__(self, db_path: str = "data/chat.db"):
+    """
+    Chat sessions and messages in SQLite.
+
+    With write_behind enabled (CHAT_WRITE_BEHIND) create_session/add_message
+    only append to an in-memory queue and return; a background thread writes
+    the queue in group commits when it reaches CHAT_FLUSH_BATCH_SIZE rows or
+    CHAT_FLUSH_INTERVAL_MS after the first queued row. Reads merge rows that
+    are queued or being written, so callers always see their own writes.
+    The queue is bounded (CHAT_MAX_PENDING_WRITES): when it is full, writers
+    wait for the next flush. Callers on the event loop must not block, so
+    they await wait_for_room() (which waits on a worker thread) and then
+    write with block=False. close() drains everything.
+    """
+    def __init__(self, db_path: str = "data/chat.db", write_behind: Optional[bool] = None, finetune_log_path: Optional[str] = None):
         self.db_path = Path(db_path)
-        self.db_path.parent.mkdir(exist_ok=True)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = SQLiteDatabase(self.db_path)
+        self.write_behind = settings.CHAT_WRITE_BEHIND if write_behind is None else write_behind
+        self.finetune_log_path = finetune_log_path or os.path.join(os.getcwd(), "..", "ml", "data", "raw", "chat_logs.jsonl")
+        # Queued rows as (kind, row); _inflight is the batch being committed
+        self._pending: List[Tuple[str, tuple]] = []
+        self._inflight: List[Tuple[str, tuple]] = []
+        self._cond = threading.Condition()
+        self._writer: Optional[threading.Thread] = None
+        self._stopping = False
         self._init_db()
 
-    def _get_conn(self):
-        return sqlite3.connect(self.db_path)
-
     def _init_db(self):
-        conn = self._get_conn()
-        cursor = conn.cursor()
-        
-        # Create sessions table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sessions (
-                id TEXT PRIMARY KEY,
-                agent_id TEXT NOT NULL,
-                title TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create messages table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS messages (
-                id TEXT PRIMARY KEY,
-                session_id TEXT NOT NULL,
-                role TEXT NOT NULL,
-                content TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (session_id) REFERENCES sessions (id)
-            )
-        """)
-        
-        conn.commit()
-        conn.close()
+        self.db.migrate(MIGRATIONS)
 
-    def create_session(self, agent_id: str, title: Optional[str] = None) -> str:
+    def create_session(self, agent_id: str, title: Optional[str] = None, block: bool = True) -> str:
         session_id = str(uuid.uuid4())
-        conn = self._get_conn()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO sessions (id, agent_id, title) VALUES (?, ?, ?)",
-            (session_id, agent_id, title)
-        )
-        conn.commit()
-        conn.close()
+        self._submit("session", (session_id, agent_id, title, _now()), block)
         return session_id
 
-    def add_message(self, session_id: str, role: str, content: str):
+    def add_message(self, session_id: str, role: str, content: str, block: bool = True):
         message_id = str(uuid.uuid4())
-        conn = self._get_conn()
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO messages (id, session_id, role, content) VALUES (?, ?, ?, ?)",
-            (message_id, session_id, role, content)
-        )
-        conn.commit()
-        conn.close()
+        self._submit("message", (message_id, session_id, role, content, _now()), block)
         return message_id
 
-    def get_session_history(self, session_id: str) -> List[Dict]:
-        conn = self._get_conn()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT role, content, created_at FROM messages WHERE session_id = ? ORDER BY created_at ASC",
-            (session_id,)
-        )
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [
-            {"role": row[0], "content": row[1], "created_at": row[2]}
-            for row in rows
+    def append_finetune_log(self, entry: Dict, block: bool = True):
+        """Queue one JSONL line for the fine-tuning chat log."""
+        self._submit("log", (json.dumps(entry),), block)
+
+    async def wait_for_room(self):
+        """
+        Backpressure for callers on the event loop: returns once the write
+        queue is below CHAT_MAX_PENDING_WRITES, waiting on a worker thread
+        (not the loop) when it is full.
+        """
+        if self.write_behind and len(self._pending) >= settings.CHAT_MAX_PENDING_WRITES:
+            await asyncio.to_thread(self._wait_for_room)
+
+    def _wait_for_room(self):
+        with self._cond:
+            while len(self._pending) >= settings.CHAT_MAX_PENDING_WRITES and self._writer is not None:
+                self._cond.wait()
+
+    def get_session_history(self, session_id: str, limit: Optional[int] = None, after: Optional[Tuple[str, str]] = None) -> List[Dict]:
+        """
+        Messages of a session in (created_at, id) order. With limit, returns one
+        keyset page starting after the (created_at, id) of the previous page's
+        last row.
+        """
+        queued = [
+            {"id": row[0], "role": row[2], "content": row[3], "created_at": row[4]}
+            for kind, row in self._unflushed() if kind == "message" and row[1] == session_id
+        ]
+        sql = "SELECT id, role, content, created_at FROM messages WHERE session_id = ?"
+        params: list = [session_id]
+        if after:
+            sql += " AND (created_at, id) > (?, ?)"
+            params += list(after)
+        sql += " ORDER BY created_at ASC, id ASC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = [
+            {"id": row[0], "role": row[1], "content": row[2], "created_at": row[3]}
+            for row in self.db.connection().execute(sql, params)
         ]
+        return self._merge(rows, queued, limit, after, descending=False)
 
-    def get_agent_sessions(self, agent_id: str) -> List[Dict]:
-        conn = self._get_conn()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT id, title, created_at FROM sessions WHERE agent_id = ? ORDER BY created_at DESC",
-            (agent_id,)
-        )
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [
+    def get_agent_sessions(self, agent_id: str, limit: Optional[int] = None, after: Optional[Tuple[str, str]] = None) -> List[Dict]:
+        """Sessions of an agent, newest first; paginated like get_session_history."""
+        queued = [
+            {"id": row[0], "title": row[2], "created_at": row[3]}
+            for kind, row in self._unflushed() if kind == "session" and row[1] == agent_id
+        ]
+        sql = "SELECT id, title, created_at FROM sessions WHERE agent_id = ?"
+        params: list = [agent_id]
+        if after:
+            sql += " AND (created_at, id) < (?, ?)"
+            params += list(after)
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = [
             {"id": row[0], "title": row[1], "created_at": row[2]}
-            for row in rows
+            for row in self.db.connection().execute(sql, params)
+        ]
+        return self._merge(rows, queued, limit, after, descending=True)
+
+    def get_recent_messages(self, session_id: str, limit: int, before: Optional[Tuple[str, str]] = None) -> List[Dict]:
+        """Newest-first page of a session's messages, for building context windows."""
+        queued = [
+            {"id": row[0], "role": row[2], "content": row[3], "created_at": row[4]}
+            for kind, row in self._unflushed() if kind == "message" and row[1] == session_id
+        ]
+        sql = "SELECT id, role, content, created_at FROM messages WHERE session_id = ?"
+        params: list = [session_id]
+        if before:
+            sql += " AND (created_at, id) < (?, ?)"
+            params += list(before)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+        rows = [
+            {"id": row[0], "role": row[1], "content": row[2], "created_at": row[3]}
+            for row in self.db.connection().execute(sql, params)
         ]
+        return self._merge(rows, queued, limit, before, descending=True)
+
+    def get_summary(self, session_id: str) -> Optional[Dict]:
+        row = self.db.connection().execute(
+            "SELECT summary, covered_created_at, covered_id FROM session_summaries WHERE session_id = ?",
+            (session_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {"summary": row[0], "covered_until": (row[1], row[2])}
+
+    def save_summary(self, session_id: str, summary: str, covered_until: Tuple[str, str]):
+        with self.db.transaction() as conn:
+            conn.execute(
+                """
+                INSERT INTO session_summaries (session_id, summary, covered_created_at, covered_id, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (session_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    covered_created_at = excluded.covered_created_at,
+                    covered_id = excluded.covered_id,
+                    updated_at = excluded.updated_at
+                """,
+                (session_id, summary, covered_until[0], covered_until[1], _now())
+            )
+
+    def iter_session_history(self, session_id: str, batch_size: int = 500) -> Iterator[Dict]:
+        """Every message of a session, fetched a page at a time."""
+        return self._iter_pages(lambda after: self.get_session_history(session_id, batch_size, after), batch_size)
+
+    def iter_agent_sessions(self, agent_id: str, batch_size: int = 500) -> Iterator[Dict]:
+        return self._iter_pages(lambda after: self.get_agent_sessions(agent_id, batch_size, after), batch_size)
+
+    @staticmethod
+    def page_key(row: Dict) -> Tuple[str, str]:
+        return (row["created_at"], row["id"])
+
+    def _iter_pages(self, fetch, batch_size: int) -> Iterator[Dict]:
+        after = None
+        while True:
+            page = fetch(after)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = self.page_key(page[-1])
+
+    def _merge(self, rows: List[Dict], queued: List[Dict], limit: Optional[int], after: Optional[Tuple[str, str]], descending: bool) -> List[Dict]:
+        # Fold in rows still waiting for the writer. A queued row may also have
+        # been committed between the two reads, hence the id check.
+        if after:
+            queued = [row for row in queued if (self.page_key(row) < tuple(after) if descending else self.page_key(row) > tuple(after))]
+        if not queued:
+            return rows
+        stored = {row["id"] for row in rows}
+        rows += [row for row in queued if row["id"] not in stored]
+        rows.sort(key=self.page_key, reverse=descending)
+        return rows[:limit] if limit else rows
+
+    def pending_writes(self) -> int:
+        return len(self._pending) + len(self._inflight)
+
+    def _unflushed(self) -> List[Tuple[str, tuple]]:
+        with self._cond:
+            return self._inflight + self._pending
+
+    def _submit(self, kind: str, row: tuple, block: bool = True):
+        """
+        Queue a row. With block=False the queue bound is not enforced here;
+        the caller has applied backpressure itself (wait_for_room).
+        """
+        if not self.write_behind:
+            self._write([(kind, row)])
+            return
+        with self._cond:
+            if self._writer is None:
+                self._stopping = False
+                self._writer = threading.Thread(target=self._run_writer, name="chat-storage-writer", daemon=True)
+                self._writer.start()
+            while block and len(self._pending) >= settings.CHAT_MAX_PENDING_WRITES:
+                self._cond.wait()
+            self._pending.append((kind, row))
+            self._cond.notify_all()
+
+    def _run_writer(self):
+        interval = settings.CHAT_FLUSH_INTERVAL_MS / 1000
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                # Give the batch until the interval elapses (or it fills up)
+                deadline = time.monotonic() + interval
+                while len(self._pending) < settings.CHAT_FLUSH_BATCH_SIZE and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._pending:
+                    return
+                batch = self._pending
+                self._pending = []
+                self._inflight = batch
+                self._cond.notify_all()
+
+            for attempt in range(3):
+                try:
+                    with span("chat_storage.flush"):
+                        self._write(batch)
+                    break
+                except Exception as e:
+                    print(f"Chat storage flush failed (attempt {attempt + 1}): {e}")
+                    time.sleep(0.1 * 2 ** attempt)
+            else:
+                print(f"Dropping {len(batch)} chat storage writes")
+
+            with self._cond:
+                self._inflight = []
+                self._cond.notify_all()
+
+    def _write(self, batch: List[Tuple[str, tuple]]):
+        sessions = [row for kind, row in batch if kind == "session"]
+        messages = [row for kind, row in batch if kind == "message"]
+        logs = [row[0] for kind, row in batch if kind == "log"]
+        if sessions or messages:
+            with self.db.transaction() as conn:
+                if sessions:
+                    conn.executemany("INSERT INTO sessions (id, agent_id, title, created_at) VALUES (?, ?, ?, ?)", sessions)
+                if messages:
+                    conn.executemany("INSERT INTO messages (id, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)", messages)
+        if logs:
+            try:
+                os.makedirs(os.path.dirname(self.finetune_log_path), exist_ok=True)
+                with open(self.finetune_log_path, "a", encoding="utf-8") as f:
+                    f.write("".join(line + "\n" for line in logs))
+            except Exception as e:
+                print(f"Failed to log chat: {e}")
+
+    def flush(self):
+        """Block until everything queued so far is committed."""
+        with self._cond:
+            while self._pending or self._inflight:
+                self._cond.notify_all()
+                self._cond.wait(0.05)
+
+    def close(self):
+        """Drain the write queue, stop the writer and close connections."""
+        with self._cond:
+            writer = self._writer
+            self._stopping = True
+            self._cond.notify_all()
+        if writer is not None:
+            writer.join()
+        with self._cond:
+            self._writer = None
+        self.db.close()
 
-chat_storage = ChatStorageService()
+chat_storage = ChatStorageService(settings.CHAT_DB_PATH)
+# Don't lose queued writes if the process exits without the app shutdown hook
+atexit.register(chat_storage.close)
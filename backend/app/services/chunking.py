@@ -0,0 +1,179 @@
+import bisect
+import re
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.core.tokens import count_tokens
+
+# Segment ends, strongest first: blank line (paragraph), sentence-ending
+# punctuation (plus closing quotes/brackets), line break. Trailing
+# whitespace belongs to the segment it ends.
+_BOUNDARY = re.compile(r"\n[ \t]*\n\s*|[.!?][\"')\]]*\s+|\n")
+_WORD = re.compile(r"\S+\s*")
+
+class Chunk:
+    """
+    A chunk as a [start, end) span of `source`, the text it was cut from;
+    the chunk's own string is only built when .text is read. `offset` is
+    where the span starts in the whole document and `page`/`page_end` are
+    the 1-based pages it starts and ends on, for citations.
+    """
+    __slots__ = ("source", "start", "end", "tokens", "offset", "page", "page_end")
+
+    def __init__(self, source: str, start: int, end: int, tokens: int, offset: int = 0, page: int = 1, page_end: int = 1):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.tokens = tokens
+        self.offset = offset
+        self.page = page
+        self.page_end = page_end
+
+    @property
+    def text(self) -> str:
+        return self.source[self.start:self.end]
+
+    def metadata(self) -> Dict[str, int]:
+        return {
+            "page": self.page,
+            "page_end": self.page_end,
+            "start_char": self.offset,
+            "end_char": self.offset + self.end - self.start,
+        }
+
+class TokenChunker:
+    """
+    Splits text into chunks of at most target_tokens tokens (as counted by
+    count_tokens, ideally the embedding model's own tokenizer) without
+    cutting through sentences:
+
+    1. the text is segmented at paragraph, sentence and line ends; a
+       segment longer than the target is split between words (and a single
+       over-long "word" by characters);
+    2. segments are packed greedily up to the target. If that would cut a
+       paragraph, the chunk ends at the last paragraph end instead, as long
+       as it is still at least half full;
+    3. a chunk that ends mid-paragraph is followed by one that repeats its
+       last sentences, up to overlap_tokens, so no sentence loses its
+       context at the seam.
+
+    iter_chunks streams over page texts, holding roughly one page plus a
+    few chunks of text at a time. count_tokens_batch, if given, counts a
+    list of texts in one call (much faster with Rust tokenizers).
+    """
+    def __init__(self, target_tokens: int = 256, overlap_tokens: int = 32, count_tokens: Callable[[str], int] = count_tokens, count_tokens_batch: Optional[Callable[[List[str]], List[int]]] = None):
+        if target_tokens < 1:
+            raise ValueError("target_tokens must be positive")
+        self.target_tokens = target_tokens
+        self.overlap_tokens = min(overlap_tokens, target_tokens // 2)
+        self.count_tokens = count_tokens
+        self.count_tokens_batch = count_tokens_batch or (lambda texts: [count_tokens(t) for t in texts])
+
+    def _segments(self, text: str) -> List[Tuple[int, int, int, bool]]:
+        """(start, end, tokens, ends_paragraph) spans covering text."""
+        spans: List[Tuple[int, int, bool]] = []
+        start = 0
+        for match in _BOUNDARY.finditer(text):
+            end = match.end()
+            if end > start:
+                spans.append((start, end, match.group().count("\n") >= 2))
+            start = end
+        if start < len(text):
+            spans.append((start, len(text), False))
+
+        segments: List[Tuple[int, int, int, bool]] = []
+        counts = self.count_tokens_batch([text[start:end] for start, end, _ in spans])
+        for (start, end, paragraph), tokens in zip(spans, counts):
+            self._add_segment(segments, text, start, end, tokens, paragraph)
+        return segments
+
+    def _add_segment(self, segments, text: str, start: int, end: int, tokens: int, paragraph: bool):
+        if tokens <= self.target_tokens:
+            segments.append((start, end, tokens, paragraph))
+            return
+        # Too long for one chunk: pack its words instead
+        piece_start, piece_tokens = start, 0
+        for word in _WORD.finditer(text, start, end):
+            word_tokens = self.count_tokens(word.group())
+            if piece_tokens and piece_tokens + word_tokens > self.target_tokens:
+                segments.append((piece_start, word.start(), piece_tokens, False))
+                piece_start, piece_tokens = word.start(), 0
+            if word_tokens > self.target_tokens:
+                # A "word" of its own over the limit (base64, a long URL, ...)
+                step = max(1, (word.end() - word.start()) * self.target_tokens // word_tokens)
+                for cut in range(word.start(), word.end(), step):
+                    piece_end = min(cut + step, word.end())
+                    segments.append((cut, piece_end, self.count_tokens(text[cut:piece_end]), False))
+                piece_start, piece_tokens = word.end(), 0
+                continue
+            piece_tokens += word_tokens
+        if piece_start < end:
+            segments.append((piece_start, end, piece_tokens, paragraph))
+        elif segments:
+            segments[-1] = segments[-1][:3] + (paragraph,)
+
+    def _pack(self, segments: List[Tuple[int, int, int, bool]]) -> List[Tuple[int, int, int]]:
+        """(first segment, end segment, tokens) of each chunk."""
+        spans = []
+        n = len(segments)
+        i = 0
+        while i < n:
+            j, tokens = i, 0
+            last_paragraph, paragraph_tokens = None, 0
+            while j < n and (j == i or tokens + segments[j][2] <= self.target_tokens):
+                tokens += segments[j][2]
+                j += 1
+                if segments[j - 1][3]:
+                    last_paragraph, paragraph_tokens = j, tokens
+            if j < n and last_paragraph is not None and last_paragraph < j and paragraph_tokens * 2 >= self.target_tokens:
+                j, tokens = last_paragraph, paragraph_tokens
+            spans.append((i, j, tokens))
+            if j >= n:
+                break
+            if segments[j - 1][3]:
+                i = j
+                continue
+            k, back = j, 0
+            while k - 1 > i and back + segments[k - 1][2] <= self.overlap_tokens:
+                k -= 1
+                back += segments[k][2]
+            i = k
+        return spans
+
+    def chunks(self, text: str) -> List[Chunk]:
+        return list(self.iter_chunks([text]))
+
+    def iter_chunks(self, pages: Iterable[str]) -> Iterator[Chunk]:
+        buffer = ""
+        base = 0  # document offset of buffer[0]
+        page_starts: List[int] = []
+
+        def emit(segments, spans):
+            for first, last, tokens in spans:
+                start, end = segments[first][0], segments[last - 1][1]
+                if not buffer[start:end].strip():
+                    continue
+                yield Chunk(
+                    buffer, start, end, tokens,
+                    offset=base + start,
+                    page=bisect.bisect_right(page_starts, base + start),
+                    page_end=bisect.bisect_right(page_starts, base + end - 1)
+                )
+
+        for page in pages:
+            page_starts.append(base + len(buffer))
+            buffer += page
+            # Once a few chunks' worth is buffered, emit all but the last
+            # chunk, which may still grow with the next page's text
+            if len(buffer) < 8 * 4 * self.target_tokens:
+                continue
+            segments = self._segments(buffer)
+            spans = self._pack(segments)
+            if len(spans) < 2:
+                continue
+            yield from emit(segments, spans[:-1])
+            keep = segments[spans[-1][0]][0]
+            buffer = buffer[keep:]
+            base += keep
+        if buffer:
+            segments = self._segments(buffer)
+            yield from emit(segments, self._pack(segments))
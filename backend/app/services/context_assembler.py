@@ -0,0 +1,125 @@
+import re
+from typing import List, Dict, Any, Optional, Tuple, Set
+from app.core.config import settings
+from app.core.tokens import count_tokens, truncate_tokens
+
+SEPARATOR = "\n\n"
+
+# Below this many tokens a truncated passage isn't worth including
+MIN_PARTIAL_TOKENS = 50
+
+class Passage:
+    def __init__(self, text: str, rank: int, doc_id: Optional[str] = None, chunk_index: Optional[int] = None):
+        self.text = text
+        self.rank = rank
+        self.doc_id = doc_id
+        self.first_index = chunk_index
+        self.last_index = chunk_index
+
+class ContextAssembler:
+    """
+    Turns raw retrieval results into the context block of the prompt:
+
+    1. neighbouring chunks of the same document (consecutive chunk_index) are
+       merged into one passage, with the text they share through the
+       chunker's overlap included once;
+    2. passages that are near-duplicates of a better-ranked one are dropped
+       (word-shingle containment >= RAG_DEDUP_THRESHOLD);
+    3. passages are packed best-first into RAG_CONTEXT_MAX_TOKENS, truncating
+       the last one if enough room is left.
+    """
+    def assemble(self, results: Dict[str, Any], max_tokens: Optional[int] = None, model: Optional[str] = None) -> Tuple[str, List[str]]:
+        """Returns the context string and the passages it is made of (for citations)."""
+        passages = self._passages(results)
+        passages = self._merge_neighbours(passages)
+        passages = self._drop_near_duplicates(passages)
+        packed = self._pack(passages, settings.RAG_CONTEXT_MAX_TOKENS if max_tokens is None else max_tokens, model)
+        return SEPARATOR.join(packed), packed
+
+    @staticmethod
+    def _passages(results: Dict[str, Any]) -> List[Passage]:
+        documents = (results.get("documents") or [[]])[0] or []
+        metadatas = (results.get("metadatas") or [[]])[0] or []
+        passages = []
+        for rank, text in enumerate(documents):
+            if not text:
+                continue
+            meta = (metadatas[rank] if rank < len(metadatas) else None) or {}
+            chunk_index = meta.get("chunk_index")
+            passages.append(Passage(text, rank, meta.get("doc_id"), int(chunk_index) if chunk_index is not None else None))
+        return passages
+
+    def _merge_neighbours(self, passages: List[Passage]) -> List[Passage]:
+        by_doc: Dict[str, List[Passage]] = {}
+        merged: List[Passage] = []
+        for passage in passages:
+            if passage.doc_id is None or passage.first_index is None:
+                merged.append(passage)
+            else:
+                by_doc.setdefault(passage.doc_id, []).append(passage)
+
+        for group in by_doc.values():
+            group.sort(key=lambda p: p.first_index)
+            current = group[0]
+            for nxt in group[1:]:
+                if nxt.first_index == current.last_index:
+                    continue  # same chunk retrieved twice
+                if nxt.first_index == current.last_index + 1:
+                    current.text = self._join_overlapping(current.text, nxt.text)
+                    current.last_index = nxt.last_index
+                    current.rank = min(current.rank, nxt.rank)
+                else:
+                    merged.append(current)
+                    current = nxt
+            merged.append(current)
+
+        merged.sort(key=lambda p: p.rank)
+        return merged
+
+    @staticmethod
+    def _join_overlapping(left: str, right: str) -> str:
+        """Concatenate left and right, writing the longest suffix of left that is a prefix of right once."""
+        probe = right[:min(len(right), 32)]
+        start = left.find(probe, max(0, len(left) - len(right)))
+        while start != -1:
+            if right.startswith(left[start:]):
+                return left + right[len(left) - start:]
+            start = left.find(probe, start + 1)
+        return left + SEPARATOR + right
+
+    @staticmethod
+    def _shingles(text: str, size: int = 3) -> Set[Tuple[str, ...]]:
+        words = re.findall(r"\w+", text.lower())
+        if len(words) < size:
+            return {tuple(words)} if words else set()
+        return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+    def _drop_near_duplicates(self, passages: List[Passage]) -> List[Passage]:
+        threshold = settings.RAG_DEDUP_THRESHOLD
+        kept: List[Tuple[Passage, Set]] = []
+        for passage in passages:
+            shingles = self._shingles(passage.text)
+            if not shingles:
+                continue
+            # Share of this passage already covered by a better-ranked one
+            if any(len(shingles & other) / len(shingles) >= threshold for _, other in kept):
+                continue
+            kept.append((passage, shingles))
+        return [passage for passage, _ in kept]
+
+    @staticmethod
+    def _pack(passages: List[Passage], max_tokens: int, model: Optional[str]) -> List[str]:
+        separator_tokens = count_tokens(SEPARATOR, model)
+        budget = max_tokens
+        packed: List[str] = []
+        for passage in passages:
+            cost = count_tokens(passage.text, model) + (separator_tokens if packed else 0)
+            if cost <= budget:
+                packed.append(passage.text)
+                budget -= cost
+            elif budget - separator_tokens >= MIN_PARTIAL_TOKENS:
+                packed.append(truncate_tokens(passage.text, budget - separator_tokens, model))
+                break
+        return packed
+
+context_assembler = ContextAssembler()
@@ -0,0 +1,165 @@
+import asyncio
+from typing import List, Dict, Optional, Tuple
+from app.core.config import settings
+from app.core.tokens import count_tokens, count_message_tokens, truncate_tokens, MESSAGE_OVERHEAD_TOKENS
+from app.services.chat_storage import chat_storage
+from app.services.llm_service import llm_service
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a customer support conversation. "
+    "Update the summary with the new messages. Keep facts, names, identifiers, "
+    "open questions and anything already promised to the user. "
+    "Reply with the updated summary only, at most {max_tokens} tokens."
+)
+
+class ConversationMemory:
+    """
+    Builds the conversation part of the prompt from stored history instead of
+    the client resending it: the most recent turns that fit in
+    CHAT_HISTORY_MAX_TOKENS, preceded by a rolling summary of everything older.
+
+    The summary is cached per session (session_summaries) together with the
+    last message it covers, and is brought up to date in the background after
+    a turn pushes messages out of the window, so a turn never waits on it.
+    """
+    def __init__(self):
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    async def build_history(self, session_id: str, model: Optional[str] = None) -> List[Dict[str, str]]:
+        window, window_start = await asyncio.to_thread(self._load_window, session_id, model)
+        summary = await asyncio.to_thread(chat_storage.get_summary, session_id)
+
+        if window_start is not None and (summary is None or summary["covered_until"] < window_start):
+            self._schedule_refresh(session_id, window_start, model)
+
+        history = [{"role": m["role"], "content": m["content"]} for m in window]
+        if summary:
+            history.insert(0, {"role": "system", "content": f"Summary of the earlier conversation:\n{summary['summary']}"})
+        return history
+
+    def fit_client_history(self, history: List[Dict[str, str]], model: Optional[str] = None) -> List[Dict[str, str]]:
+        """Newest turns of a client-supplied history that fit the same budget."""
+        budget = settings.CHAT_HISTORY_MAX_TOKENS
+        kept: List[Dict[str, str]] = []
+        for msg in reversed(history):
+            budget -= count_message_tokens([msg], model)
+            if budget < 0:
+                break
+            kept.append(msg)
+        return kept[::-1]
+
+    def _load_window(self, session_id: str, model: Optional[str]) -> Tuple[List[Dict], Optional[Tuple[str, str]]]:
+        """
+        Walk the session newest-first until the token budget is spent. Returns
+        the window in chronological order and, if older messages were left
+        out, the (created_at, id) of the oldest message kept.
+        """
+        budget = settings.CHAT_HISTORY_MAX_TOKENS
+        page_size = 50
+        window: List[Dict] = []
+        before = None
+        while True:
+            page = chat_storage.get_recent_messages(session_id, page_size, before)
+            for msg in page:
+                cost = count_tokens(msg["content"], model) + MESSAGE_OVERHEAD_TOKENS
+                if cost > budget:
+                    if not window:
+                        # The newest message alone is over budget: keep its tail
+                        window.append(dict(msg, content=truncate_tokens(msg["content"], budget - MESSAGE_OVERHEAD_TOKENS, model, keep_end=True)))
+                    window.reverse()
+                    return window, chat_storage.page_key(window[0])
+                budget -= cost
+                window.append(msg)
+            if len(page) < page_size:
+                window.reverse()
+                return window, None
+            before = chat_storage.page_key(page[-1])
+
+    def _schedule_refresh(self, session_id: str, window_start: Tuple[str, str], model: Optional[str]):
+        task = self._refreshing.get(session_id)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            return
+        task = asyncio.ensure_future(self._refresh(session_id, window_start, model))
+        self._refreshing[session_id] = task
+        task.add_done_callback(lambda t: self._refreshing.pop(session_id, None) if self._refreshing.get(session_id) is t else None)
+
+    async def _refresh(self, session_id: str, window_start: Tuple[str, str], model: Optional[str]):
+        """
+        Fold the messages between the summary's high-water mark and the start
+        of the window into the summary, a bounded slice per step so each
+        summarization prompt stays small.
+        """
+        try:
+            summary = await asyncio.to_thread(chat_storage.get_summary, session_id)
+            text = summary["summary"] if summary else ""
+            after = summary["covered_until"] if summary else None
+            while True:
+                batch = await asyncio.to_thread(self._next_batch, session_id, after, window_start)
+                if not batch:
+                    return
+                text = await self._summarize(text, batch, model)
+                after = chat_storage.page_key(batch[-1])
+                await asyncio.to_thread(chat_storage.save_summary, session_id, text, after)
+        except Exception as e:
+            print(f"Summary refresh failed for session {session_id}: {e}")
+
+    def _next_batch(self, session_id: str, after: Optional[Tuple[str, str]], until: Tuple[str, str]) -> List[Dict]:
+        budget = settings.CHAT_SUMMARY_INPUT_TOKENS
+        batch: List[Dict] = []
+        for msg in chat_storage.get_session_history(session_id, 50, after):
+            if chat_storage.page_key(msg) >= until:
+                break
+            budget -= count_tokens(msg["content"])
+            if batch and budget < 0:
+                break
+            batch.append(msg)
+        return batch
+
+    async def _summarize(self, summary: str, messages: List[Dict], model: Optional[str]) -> str:
+        max_tokens = settings.CHAT_SUMMARY_MAX_TOKENS
+        if settings.OPENAI_API_KEY:
+            transcript = "\n".join(
+                f"{m['role']}: {truncate_tokens(m['content'], settings.CHAT_SUMMARY_INPUT_TOKENS, model)}"
+                for m in messages
+            )
+            try:
+                updated = await llm_service.complete(
+                    model=settings.CHAT_SUMMARY_MODEL or model,
+                    messages=[
+                        {"role": "system", "content": SUMMARY_PROMPT.format(max_tokens=max_tokens)},
+                        {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"}
+                    ],
+                    temperature=0
+                )
+                if updated:
+                    return truncate_tokens(updated.strip(), max_tokens, model)
+            except Exception as e:
+                print(f"LLM summarization failed, using extractive summary: {e}")
+        return self._extractive_summary(summary, messages, model)
+
+    @staticmethod
+    def _extractive_summary(summary: str, messages: List[Dict], model: Optional[str]) -> str:
+        # Offline fallback: one clipped line per message appended to the old
+        # summary, keeping the most recent part when over budget
+        lines = [summary] if summary else []
+        lines += [f"{m['role']}: {truncate_tokens(' '.join(m['content'].split()), 60, model)}" for m in messages]
+        return truncate_tokens("\n".join(lines), settings.CHAT_SUMMARY_MAX_TOKENS, model, keep_end=True)
+
+    def _pending_tasks(self) -> List[asyncio.Task]:
+        loop = asyncio.get_running_loop()
+        return [t for t in self._refreshing.values() if not t.done() and t.get_loop() is loop]
+
+    async def wait_idle(self):
+        """Wait for background summary refreshes to finish."""
+        tasks = self._pending_tasks()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def aclose(self):
+        # Summaries are only a cache; a cancelled refresh is redone next turn
+        for task in self._pending_tasks():
+            task.cancel()
+        await self.wait_idle()
+        self._refreshing.clear()
+
+conversation_memory = ConversationMemory()
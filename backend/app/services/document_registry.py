@@ -0,0 +1,155 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+from app.db.session import SQLiteDatabase
+
+# Append-only; applying entry N brings the schema to version N (PRAGMA user_version)
+MIGRATIONS = [
+    [
+        """
+        CREATE TABLE IF NOT EXISTS documents (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            filename TEXT NOT NULL,
+            status TEXT NOT NULL,
+            chunks INTEGER NOT NULL DEFAULT 0,
+            content_hash TEXT,
+            size_bytes INTEGER,
+            job_id TEXT,
+            uploaded_at TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_documents_filename ON documents (filename)",
+        "CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents (content_hash)",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    ],
+    # 2: caller-supplied key for re-uploads of the same document
+    [
+        "ALTER TABLE documents ADD COLUMN external_id TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_documents_external_id ON documents (external_id)",
+    ],
+]
+
+COLUMNS = ("id", "filename", "status", "chunks", "content_hash", "size_bytes", "job_id", "uploaded_at", "external_id")
+UPDATABLE = {"filename", "status", "chunks", "content_hash", "size_bytes", "job_id", "external_id"}
+
+class DocumentRegistry:
+    """
+    Uploaded documents and their ingestion state, in SQLite.
+
+    Replaces data/documents.json, which was parsed and rewritten in full on
+    every upload, delete and listing (and could lose concurrent updates).
+    Each change is now a single-row statement, and listings are keyset
+    paginated by upload order (`seq`). An existing documents.json is
+    imported once; the file itself is left untouched.
+    """
+    def __init__(self, db_path: str = "data/documents.db", legacy_json_path: Optional[str] = "data/documents.json"):
+        self.db = SQLiteDatabase(db_path)
+        self.db.migrate(MIGRATIONS)
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            self._import_json(Path(legacy_json_path))
+
+    def _import_json(self, path: Path):
+        conn = self.db.connection()
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_json_imported'").fetchone():
+            return
+        try:
+            with open(path) as f:
+                docs = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not import {path}: {e}")
+            return
+        with self.db.transaction() as conn:
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO documents (id, filename, status, chunks, job_id, uploaded_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (doc["id"], doc.get("filename", ""), doc.get("status", "indexed"), doc.get("chunks", 0), doc.get("job_id"), str(doc.get("uploaded_at", "")), time.time())
+                    for doc in docs if "id" in doc
+                ]
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('legacy_json_imported', ?)", (str(path),))
+        print(f"Imported {len(docs)} documents from {path}")
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        return dict(zip(("seq",) + COLUMNS, row))
+
+    def add(self, doc_id: str, filename: str, job_id: Optional[str] = None, content_hash: Optional[str] = None, size_bytes: Optional[int] = None, uploaded_at: Optional[str] = None, status: str = "processing", external_id: Optional[str] = None) -> Dict[str, Any]:
+        uploaded_at = uploaded_at or str(time.time())
+        cursor = self.db.connection().execute(
+            """
+            INSERT INTO documents (id, filename, status, chunks, content_hash, size_bytes, job_id, uploaded_at, external_id, updated_at)
+            VALUES (?, ?, ?, 0, ?, ?, ?, ?, ?, ?)
+            """,
+            (doc_id, filename, status, content_hash, size_bytes, job_id, uploaded_at, external_id, time.time())
+        )
+        return self._row((cursor.lastrowid, doc_id, filename, status, 0, content_hash, size_bytes, job_id, uploaded_at, external_id))
+
+    def update(self, doc_id: str, **fields) -> bool:
+        """Set some of the document's columns; False if the document is gone."""
+        unknown = set(fields) - UPDATABLE
+        if unknown:
+            raise ValueError(f"Unknown document fields: {sorted(unknown)}")
+        if not fields:
+            return False
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        cursor = self.db.connection().execute(
+            f"UPDATE documents SET {assignments}, updated_at = ? WHERE id = ?",
+            (*fields.values(), time.time(), doc_id)
+        )
+        return cursor.rowcount > 0
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        row = self.db.connection().execute(
+            f"SELECT seq, {', '.join(COLUMNS)} FROM documents WHERE id = ?", (doc_id,)
+        ).fetchone()
+        return self._row(row) if row else None
+
+    def find_by_filename(self, filename: str) -> List[Dict[str, Any]]:
+        rows = self.db.connection().execute(
+            f"SELECT seq, {', '.join(COLUMNS)} FROM documents WHERE filename = ? ORDER BY seq", (filename,)
+        )
+        return [self._row(row) for row in rows]
+
+    def find_by_external_id(self, external_id: str) -> List[Dict[str, Any]]:
+        rows = self.db.connection().execute(
+            f"SELECT seq, {', '.join(COLUMNS)} FROM documents WHERE external_id = ? ORDER BY seq", (external_id,)
+        )
+        return [self._row(row) for row in rows]
+
+    def delete(self, doc_id: str) -> bool:
+        cursor = self.db.connection().execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        return cursor.rowcount > 0
+
+    def count(self) -> int:
+        return self.db.connection().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def list(self, limit: int = 50, after: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Documents in upload order, starting after the `seq` of the previous page's last row."""
+        rows = self.db.connection().execute(
+            f"SELECT seq, {', '.join(COLUMNS)} FROM documents WHERE seq > ? ORDER BY seq LIMIT ?",
+            (after or 0, limit)
+        )
+        return [self._row(row) for row in rows]
+
+    def iter_documents(self, batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        after = None
+        while True:
+            page = self.list(batch_size, after)
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = page[-1]["seq"]
+
+    def close(self):
+        self.db.close()
+
+document_registry = DocumentRegistry(settings.DOCUMENT_DB_PATH)
@@ -1,23 +1,72 @@
-from typing import List
-from openai import OpenAI
+import asyncio
+from typing import List, Optional, Dict
 from app.core.config import settings
+from app.services.embedding_backends import EmbeddingBackend, create_backend
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_cache import EmbeddingCache
 
 class EmbeddingService:
+    """
+    Embeddings for ingestion and queries, computed by the backend selected
+    with EMBEDDING_BACKEND (openai / local / hash) and fronted by the
+    content-addressed EmbeddingCache.
+    """
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.cache: Optional[EmbeddingCache] = None
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MEMORY_ITEMS)
+        self._backends: Dict[str, EmbeddingBackend] = {}
+        # Coalesces the single-query embeddings of concurrent chats
+        self.query_batcher: Optional[EmbeddingBatcher] = None
+        if settings.EMBEDDING_QUERY_BATCHING:
+            self.query_batcher = EmbeddingBatcher(
+                self.get_embeddings,
+                max_batch_size=settings.EMBEDDING_QUERY_BATCH_MAX_SIZE,
+                max_wait_ms=settings.EMBEDDING_QUERY_BATCH_WAIT_MS,
+            )
 
-    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+    @property
+    def backend(self) -> EmbeddingBackend:
+        # Resolved per call: "auto" follows whether an API key is configured
+        name = settings.EMBEDDING_BACKEND
+        if name == "auto":
+            name = "openai" if settings.OPENAI_API_KEY else "hash"
+        backend = self._backends.get(name)
+        if backend is None:
+            backend = self._backends[name] = create_backend(name)
+        return backend
+
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         if not texts:
             return []
-        # Mock embedding for now if no key, or use real one
-        if not settings.OPENAI_API_KEY:
-            # Return dummy embeddings of size 1536 (OpenAI standard)
-            return [[0.1] * 1536 for _ in texts]
-            
-        response = self.client.embeddings.create(
-            input=texts,
-            model="text-embedding-ada-002"
-        )
-        return [data.embedding for data in response.data]
+        backend = self.backend
+        if self.cache is None or not backend.cacheable:
+            return await backend.embed(texts)
+
+        # Only cache misses (deduplicated) go to the backend
+        keys = [EmbeddingCache.make_key(backend.model_id, text) for text in texts]
+        found = await asyncio.to_thread(self.cache.get_many, keys)
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            embeddings = await backend.embed(list(missing.values()))
+            fresh = dict(zip(missing.keys(), embeddings))
+            await asyncio.to_thread(self.cache.put_many, fresh)
+            found.update(fresh)
+
+        return [found[key] for key in keys]
+
+    async def embed_query(self, text: str) -> List[float]:
+        if self.query_batcher is not None:
+            return await self.query_batcher.embed(text)
+        return (await self.get_embeddings([text]))[0]
+
+    def close(self):
+        for backend in self._backends.values():
+            backend.close()
+        self._backends.clear()
 
 embedding_service = EmbeddingService()
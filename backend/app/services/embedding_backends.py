@@ -0,0 +1,273 @@
+import asyncio
+import base64
+import hashlib
+import os
+import re
+import sys
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.tokens import count_tokens
+from app.services.llm_service import llm_service
+
+class EmbeddingBackend:
+    """
+    Turns texts into vectors. model_id names the vector space: it keys the
+    embedding cache, and vectors from different model_ids must not be mixed
+    in one collection.
+    """
+    model_id: str = ""
+    # Whether results are worth keeping in the embedding cache
+    cacheable: bool = True
+    # Longest input the model embeds in full (None: no limit)
+    max_input_tokens: Optional[int] = None
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def count_tokens(self, text: str) -> int:
+        """Tokens text takes up in this model's input; sizes chunks at ingest."""
+        return count_tokens(text)
+
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        return [self.count_tokens(text) for text in texts]
+
+    def close(self):
+        pass
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """OpenAI-compatible /embeddings API, batched by input count and tokens."""
+    max_input_tokens = 8191
+
+    def __init__(self, model: str):
+        self.model = model
+        # Same cache keys as before backends existed
+        self.model_id = model
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        """
+        Split texts into requests that respect the provider's per-request
+        input count and (approximate, ~4 chars/token) token limits.
+        """
+        batches: List[List[str]] = []
+        batch: List[str] = []
+        batch_tokens = 0
+        for text in texts:
+            tokens = len(text) // 4 + 1
+            if batch and (len(batch) >= settings.EMBEDDING_BATCH_SIZE or batch_tokens + tokens > settings.EMBEDDING_BATCH_MAX_TOKENS):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Shared across concurrent uploads so the total number of embedding
+        # requests in flight stays bounded, not just the ones per document.
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+            self._loop = loop
+        return self._semaphore
+
+    async def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        async with self._get_semaphore():
+            # base64 float32 is ~4x smaller on the wire than JSON floats and
+            # avoids building a Python object per float while parsing
+            response = await llm_service.client.embeddings.create(
+                input=batch,
+                model=self.model,
+                encoding_format="base64"
+            )
+        return [self._decode(data.embedding) for data in response.data]
+
+    @staticmethod
+    def _decode(embedding) -> List[float]:
+        if isinstance(embedding, str):
+            vector = array("f", base64.b64decode(embedding))
+            if sys.byteorder == "big":
+                vector.byteswap()
+            return vector.tolist()
+        return embedding
+
+    def count_tokens(self, text: str) -> int:
+        return count_tokens(text, self.model)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        results = await asyncio.gather(*(self._embed_batch(batch) for batch in self._batches(texts)))
+        return [embedding for batch in results for embedding in batch]
+
+class HashEmbeddingBackend(EmbeddingBackend):
+    """
+    Dependency-free fallback: signed feature hashing of word unigrams and
+    bigrams into dim buckets, L2-normalized. Not semantic, but texts sharing
+    words land close together, so retrieval still works offline (unlike a
+    constant dummy vector).
+    """
+    cacheable = False
+    _WORD = re.compile(r"\w+")
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self.model_id = f"hash:{dim}"
+
+    def _embed_one(self, text: str) -> List[float]:
+        words = self._WORD.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in features:
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = 1.0
+        else:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_sync(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed_one(text) for text in texts]
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) <= 8:
+            return self.embed_sync(texts)
+        return await asyncio.to_thread(self.embed_sync, texts)
+
+class LocalEmbeddingBackend(EmbeddingBackend):
+    """
+    Sentence-embedding model run on the CPU with ONNX Runtime (already a
+    chromadb dependency) - no network round-trip per ingest or query.
+
+    model_dir holds a sentence-transformers style export: model.onnx and
+    tokenizer.json (e.g. all-MiniLM-L6-v2). The model is loaded lazily on
+    first use; with quantize, its weights are converted once to int8
+    (model.int8.onnx, dynamic quantization) which is markedly faster on CPU
+    for a negligible loss in retrieval quality.
+
+    Inputs are sorted by length and run in batches of batch_size so each
+    batch is padded only to its own longest text. Batches run one at a time
+    on a dedicated thread; ONNX Runtime parallelizes inside each batch over
+    `threads` cores.
+    """
+    def __init__(self, model_dir: str, quantize: bool = True, threads: int = 1, batch_size: int = 32, max_length: int = 256):
+        self.model_dir = model_dir
+        self.quantize = quantize
+        self.threads = threads
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.model_id = f"local:{os.path.basename(os.path.normpath(model_dir))}{':int8' if quantize else ''}"
+        # Room for the [CLS]/[SEP] special tokens
+        self.max_input_tokens = max_length - 2
+        self._session = None
+        self._tokenizer = None
+        self._count_tokenizer = None
+        self._input_names: List[str] = []
+        self._load_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-embedding")
+
+    def _model_path(self) -> str:
+        path = os.path.join(self.model_dir, "model.onnx")
+        if not self.quantize:
+            return path
+        quantized = os.path.join(self.model_dir, "model.int8.onnx")
+        if os.path.exists(quantized):
+            return quantized
+        try:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(path, quantized, weight_type=QuantType.QInt8)
+            return quantized
+        except Exception as e:  # onnx not installed, read-only model dir, ...
+            print(f"int8 quantization unavailable, using the fp32 model: {e}")
+            return path
+
+    def _load(self):
+        if self._session is not None:
+            return
+        with self._load_lock:
+            if self._session is not None:
+                return
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self.max_length)
+            tokenizer.enable_padding()  # to the longest text in each batch
+
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = ort.InferenceSession(self._model_path(), options, providers=["CPUExecutionProvider"])
+
+            self._input_names = [i.name for i in session.get_inputs()]
+            self._tokenizer = tokenizer
+            self._session = session
+
+    def _get_count_tokenizer(self):
+        if self._count_tokenizer is None:
+            from tokenizers import Tokenizer
+            # Separate instance: the embedding one truncates and pads
+            self._count_tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+        return self._count_tokenizer
+
+    def count_tokens(self, text: str) -> int:
+        return len(self._get_count_tokenizer().encode(text, add_special_tokens=False).ids)
+
+    def count_tokens_batch(self, texts: List[str]) -> List[int]:
+        return [len(e.ids) for e in self._get_count_tokenizer().encode_batch(texts, add_special_tokens=False)]
+
+    def _run_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        output = self._session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+        if output.ndim == 3:
+            # Mean pooling over real (non-padding) tokens
+            weights = mask[:, :, None].astype(np.float32)
+            output = (output * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return output / np.maximum(norms, 1e-12)
+
+    def embed_sync(self, texts: List[str]) -> List[List[float]]:
+        self._load()
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            indexes = order[start:start + self.batch_size]
+            vectors = self._run_batch([texts[i] for i in indexes])
+            for i, vector in zip(indexes, vectors):
+                results[i] = vector.tolist()
+        return results
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self.embed_sync, texts)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+def create_backend(name: str) -> EmbeddingBackend:
+    if name == "openai":
+        return OpenAIEmbeddingBackend(settings.EMBEDDING_MODEL)
+    if name == "local":
+        return LocalEmbeddingBackend(
+            settings.LOCAL_EMBEDDING_MODEL_DIR,
+            quantize=settings.LOCAL_EMBEDDING_QUANTIZE,
+            threads=settings.LOCAL_EMBEDDING_THREADS,
+            batch_size=settings.LOCAL_EMBEDDING_BATCH_SIZE,
+            max_length=settings.LOCAL_EMBEDDING_MAX_LENGTH,
+        )
+    if name == "hash":
+        return HashEmbeddingBackend(settings.HASH_EMBEDDING_DIM)
+    raise ValueError(f"Unknown embedding backend: {name}")
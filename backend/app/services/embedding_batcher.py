@@ -0,0 +1,93 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from app.core.metrics import metrics
+
+queue_wait_seconds = metrics.histogram("embedding_query_queue_wait_seconds", "Time a query embedding waited in the micro-batch queue before its batch was sent")
+
+class EmbeddingBatcher:
+    """
+    Micro-batcher for single-text embedding requests.
+
+    Concurrent callers of embed() are queued; the queue is sent as one batch
+    to embed_many once it holds max_batch_size texts or max_wait_ms after the
+    first one arrived, and each caller's future gets its own vector. Trades
+    at most max_wait_ms of latency for one provider round-trip (or model
+    forward pass) per batch instead of per query.
+    """
+    def __init__(self, embed_many: Callable[[List[str]], Awaitable[List[List[float]]]], max_batch_size: int = 64, max_wait_ms: float = 5.0):
+        self.embed_many = embed_many
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._pending: List[Tuple[str, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.batches = 0
+        self.items = 0
+        self._waits_ms: Deque[float] = deque(maxlen=10_000)
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Pending work of a previous (closed) loop can't be resumed
+            self._pending, self._timer, self._tasks, self._loop = [], None, set(), loop
+
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self._loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future, float]]):
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            wait = started - enqueued
+            self._waits_ms.append(wait * 1000)
+            queue_wait_seconds.observe(wait)
+        self.batches += 1
+        self.items += len(batch)
+
+        # Identical concurrent queries are embedded once
+        positions: Dict[str, int] = {}
+        for text, _, _ in batch:
+            positions.setdefault(text, len(positions))
+        try:
+            vectors = await self.embed_many(list(positions))
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, future, _ in batch:
+            if not future.done():  # the caller may have been cancelled
+                future.set_result(vectors[positions[text]])
+
+    def stats(self) -> Dict[str, float]:
+        waits = sorted(self._waits_ms)
+
+        def percentile(p: float) -> float:
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 3) if waits else 0.0
+
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "queue_wait_p50_ms": percentile(0.5),
+            "queue_wait_p95_ms": percentile(0.95),
+            "queue_wait_max_ms": round(waits[-1], 3) if waits else 0.0,
+        }
@@ -1,45 +1,334 @@
+import asyncio
+import codecs
+import hashlib
+import multiprocessing
 import os
-from typing import List
+import queue
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Iterable, Iterator, Callable, Optional, Dict, Any, Set, Tuple
 from fastapi import UploadFile
 import fitz  # PyMuPDF
 # import docx
+from app.core.config import settings
+from app.core.metrics import span
+from app.services import pdf_extract
+from app.services.chunking import TokenChunker
+from app.services.embedding import embedding_service
+from app.services.vector_store import vector_store
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt")
+
+# Marks the end of a stage's output in the pipeline queues
+_DONE = object()
 
 class IngestionService:
     def __init__(self):
-        pass
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
+        """
+        Fixed-size character windows (CHUNK_STRATEGY="fixed").
+        """
+        return list(self.iter_chunks([text], chunk_size, overlap))
+
+    def iter_chunks(self, pages: Iterable[str], chunk_size: int = 1000, overlap: int = 200) -> Iterator[str]:
+        """
+        Incremental version of chunk_text over a stream of page texts. Produces
+        exactly the chunks chunk_text would for the concatenated text, while
+        only holding about one page plus one chunk in memory.
+        """
+        step = chunk_size - overlap
+        buffer = ""
+        for page in pages:
+            buffer += page
+            start = 0
+            while len(buffer) - start >= chunk_size:
+                yield buffer[start:start + chunk_size]
+                start += step
+            buffer = buffer[start:]
+        start = 0
+        while start < len(buffer):
+            yield buffer[start:start + chunk_size]
+            start += step
 
-    async def process_file(self, file: UploadFile) -> str:
+    def chunker(self) -> TokenChunker:
+        """Token chunker sized for the active embedding model."""
+        backend = embedding_service.backend
+        target = settings.CHUNK_TARGET_TOKENS
+        if backend.max_input_tokens:
+            target = min(target, backend.max_input_tokens)
+        return TokenChunker(target, settings.CHUNK_OVERLAP_TOKENS, backend.count_tokens, backend.count_tokens_batch)
+
+    def iter_document_chunks(self, pages: Iterable[str]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(text, extra metadata) of each chunk, per CHUNK_STRATEGY."""
+        if settings.CHUNK_STRATEGY == "fixed":
+            for chunk in self.iter_chunks(pages):
+                yield chunk, {}
+            return
+        for chunk in self.chunker().iter_chunks(pages):
+            yield chunk.text, chunk.metadata()
+
+    async def spool_upload(self, file: UploadFile, hasher=None) -> str:
         """
-        Extract text from uploaded file.
+        Copy an upload to a temp file in fixed-size blocks instead of reading
+        it into memory, feeding each block to `hasher` (a hashlib object) if
+        given. The caller owns (and must remove) the returned path.
         """
-        content = await file.read()
         filename = file.filename.lower()
-        
-        if filename.endswith(".pdf"):
-            return self._extract_from_pdf(content)
-        elif filename.endswith(".txt"):
-            return content.decode("utf-8")
-        # Add docx support later
-        else:
+        if not filename.endswith(SUPPORTED_EXTENSIONS):
             raise ValueError("Unsupported file type")
 
-    def _extract_from_pdf(self, content: bytes) -> str:
-        doc = fitz.open(stream=content, filetype="pdf")
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        return text
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(filename)[1])
+        try:
+            with span("upload.spool"), os.fdopen(fd, "wb") as out:
+                while True:
+                    block = await file.read(settings.INGEST_READ_BLOCK_BYTES)
+                    if not block:
+                        break
+                    if hasher is not None:
+                        hasher.update(block)
+                    await asyncio.to_thread(out.write, block)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path
 
-    def chunk_text(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
+    def iter_pages(self, path: str) -> Iterator[str]:
         """
-        Simple chunking strategy.
+        Yield the text of a spooled file one page at a time (fixed-size
+        blocks for plain text).
         """
-        chunks = []
-        start = 0
-        while start < len(text):
-            end = start + chunk_size
-            chunks.append(text[start:end])
-            start += chunk_size - overlap
-        return chunks
+        if path.lower().endswith(".pdf"):
+            yield from self._iter_pdf_pages(path)
+        else:
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            with open(path, "rb") as f:
+                while True:
+                    block = f.read(settings.INGEST_READ_BLOCK_BYTES)
+                    if not block:
+                        break
+                    yield decoder.decode(block)
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=settings.PDF_EXTRACT_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def _iter_pdf_pages(self, path: str) -> Iterator[str]:
+        """
+        PDF parsing is CPU-bound, so large documents are split into page
+        ranges and parsed by a process pool. Workers open the spooled file by
+        path rather than receiving the bytes, results are yielded in page
+        order, and only a few ranges are in flight at a time so memory stays
+        bounded.
+        """
+        total = pdf_extract.page_count(path)
+        if settings.PDF_EXTRACT_WORKERS < 1 or total < settings.PDF_PARALLEL_MIN_PAGES:
+            with fitz.open(path) as doc:
+                for page in doc:
+                    yield page.get_text()
+            return
+
+        pool = self._get_pool()
+        ranges = deque(pdf_extract.page_ranges(total, settings.PDF_PAGES_PER_TASK))
+        in_flight = deque()
+        try:
+            while ranges or in_flight:
+                while ranges and len(in_flight) < settings.PDF_EXTRACT_WORKERS * 2:
+                    start, end = ranges.popleft()
+                    in_flight.append(pool.submit(pdf_extract.extract_page_range, path, start, end))
+                yield from in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+    @staticmethod
+    def chunk_ids(doc_id: str, chunks: List[str], occurrences: Dict[str, int]) -> List[str]:
+        """
+        Content-addressed chunk ids: a chunk whose text is unchanged keeps its
+        id (and stored vector) across re-uploads of the document. occurrences
+        counts digests seen so far in the document, so repeated identical
+        chunks still get distinct ids.
+        """
+        ids = []
+        for chunk in chunks:
+            digest = hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:32]
+            n = occurrences.get(digest, 0)
+            occurrences[digest] = n + 1
+            ids.append(f"{doc_id}_{digest}" if n == 0 else f"{doc_id}_{digest}_{n}")
+        return ids
+
+    async def _embed_with_retry(self, batch: List[str], on_retry: Optional[Callable[[], None]]) -> List[List[float]]:
+        for attempt in range(settings.INGEST_EMBED_RETRIES + 1):
+            try:
+                return await embedding_service.get_embeddings(batch)
+            except Exception as e:
+                if attempt == settings.INGEST_EMBED_RETRIES:
+                    raise
+                print(f"Embedding batch failed ({e}), retrying")
+                if on_retry:
+                    on_retry()
+                await asyncio.sleep(settings.INGEST_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+    async def ingest(self, path: str, filename: str, doc_id: str, progress: Optional[Callable[[int, int], None]] = None, on_retry: Optional[Callable[[], None]] = None, incremental: bool = False) -> Dict[str, Any]:
+        """
+        Extract -> chunk -> embed -> store a spooled file as a pipeline of
+        bounded stages:
+
+            extract+chunk (thread) -> queue -> embed -> queue -> upsert (thread)
+
+        Chunks move in batches of INGEST_BATCH_SIZE and each queue holds at most
+        INGEST_QUEUE_DEPTH batches, so a slow stage stalls the ones before it
+        and memory stays flat however long the document is. Failed embedding
+        batches are retried with exponential backoff (INGEST_EMBED_RETRIES).
+
+        With incremental, doc_id is an existing document being replaced by
+        a new version: only chunks whose content is new are
+        embedded and added, unchanged chunks keep their vectors (their
+        metadata is rewritten if their position moved), and chunks missing
+        from the new version are deleted at the end. If that fails, the
+        chunks added so far are removed again and rewritten metadata is put
+        back, so the old version stays.
+        """
+        batch_size = settings.INGEST_BATCH_SIZE
+        chunk_queue: "queue.Queue" = queue.Queue(maxsize=settings.INGEST_QUEUE_DEPTH)
+        embedded_queue: "asyncio.Queue" = asyncio.Queue(maxsize=settings.INGEST_QUEUE_DEPTH)
+        cancelled = threading.Event()
+        counts = {"pages": 0, "chunks": 0, "embedded": 0, "removed": 0}
+        existing: Dict[str, Dict[str, Any]] = {}
+        if incremental:
+            existing = await asyncio.to_thread(vector_store.get_chunk_metadatas, doc_id)
+        occurrences: Dict[str, int] = {}
+        seen: Set[str] = set()
+        added: List[str] = []
+        moved_ids: List[str] = []
+
+        def put(item):
+            # Blocking put that gives up once the consumer side has failed
+            while not cancelled.is_set():
+                try:
+                    chunk_queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def produce():
+            try:
+                def pages():
+                    for page in self.iter_pages(path):
+                        counts["pages"] += 1
+                        yield page
+
+                batch: List[Tuple[str, Dict[str, Any]]] = []
+                for chunk in self.iter_document_chunks(pages()):
+                    if cancelled.is_set():
+                        return
+                    batch.append(chunk)
+                    if len(batch) >= batch_size:
+                        put(batch)
+                        batch = []
+                if batch:
+                    put(batch)
+                put(_DONE)
+            except BaseException as e:
+                put(e)
+
+        def get():
+            while not cancelled.is_set():
+                try:
+                    return chunk_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        async def embed_stage():
+            start_index = 0
+            while True:
+                batch = await asyncio.to_thread(get)
+                if batch is _DONE or isinstance(batch, BaseException):
+                    await embedded_queue.put(batch)
+                    return
+                batch, extras = [text for text, _ in batch], [extra for _, extra in batch]
+                ids = self.chunk_ids(doc_id, batch, occurrences)
+                metadatas = [{"doc_id": doc_id, "filename": filename, "chunk_index": start_index + i, **extra} for i, extra in enumerate(extras)]
+                fresh = [i for i, chunk_id in enumerate(ids) if chunk_id not in existing]
+                with span("ingest.embed"):
+                    embeddings = await self._embed_with_retry([batch[i] for i in fresh], on_retry) if fresh else []
+                await embedded_queue.put((batch, ids, metadatas, fresh, embeddings))
+                start_index += len(batch)
+
+        async def store_stage():
+            while True:
+                item = await embedded_queue.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                batch, ids, metadatas, fresh, embeddings = item
+                with span("ingest.store"):
+                    if fresh:
+                        await asyncio.to_thread(
+                            vector_store.add_documents,
+                            documents=[batch[i] for i in fresh],
+                            metadatas=[metadatas[i] for i in fresh],
+                            ids=[ids[i] for i in fresh],
+                            embeddings=embeddings
+                        )
+                        added.extend(ids[i] for i in fresh)
+                    moved = [i for i, chunk_id in enumerate(ids) if chunk_id in existing and existing[chunk_id] != metadatas[i]]
+                    if moved:
+                        # Recorded first: a failed update may have applied in part
+                        moved_ids.extend(ids[i] for i in moved)
+                        await asyncio.to_thread(vector_store.update_metadatas, [ids[i] for i in moved], [metadatas[i] for i in moved])
+                seen.update(ids)
+                counts["chunks"] += len(batch)
+                counts["embedded"] += len(fresh)
+                if progress:
+                    progress(counts["pages"], counts["chunks"])
+
+        producer = asyncio.get_running_loop().run_in_executor(None, produce)
+        stages = [asyncio.ensure_future(embed_stage()), asyncio.ensure_future(store_stage())]
+        try:
+            await asyncio.gather(*stages)
+            stale = [chunk_id for chunk_id in existing if chunk_id not in seen]
+            if stale:
+                await asyncio.to_thread(vector_store.delete_chunks, doc_id, stale)
+            counts["removed"] = len(stale)
+        except BaseException:
+            cancelled.set()
+            for stage in stages:
+                stage.cancel()
+            # Unblock the producer if it is waiting on a full queue
+            while not chunk_queue.empty():
+                chunk_queue.get_nowait()
+            if incremental and (added or moved_ids):
+                await asyncio.shield(asyncio.to_thread(self._roll_back, doc_id, added, {chunk_id: existing[chunk_id] for chunk_id in moved_ids}))
+            raise
+        finally:
+            await producer
+        return dict(counts)
+
+    @staticmethod
+    def _roll_back(doc_id: str, added: List[str], previous_metadatas: Dict[str, Dict[str, Any]]):
+        """Undo a failed incremental ingest: drop new chunks, restore moved chunks' metadata."""
+        vector_store.delete_chunks(doc_id, added)
+        vector_store.update_metadatas(list(previous_metadatas), list(previous_metadatas.values()))
 
 ingestion_service = IngestionService()
@@ -0,0 +1,109 @@
+import json
+import re
+from typing import List, Dict, Any, Optional
+from app.db.session import SQLiteDatabase
+
+# '-' and '_' are word characters so identifiers like ERR-1042 or SKU_998
+# are indexed (and matched) as single terms
+TOKENIZER = "unicode61 remove_diacritics 2 tokenchars '-_'"
+
+MIGRATIONS = [
+    [
+        """
+        CREATE TABLE IF NOT EXISTS chunks (
+            rowid INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE,
+            doc_id TEXT,
+            metadata TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_chunks_doc_id ON chunks (doc_id)",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(text, tokenize=\"{TOKENIZER}\")",
+    ],
+]
+
+_TERM = re.compile(r"[\w\-]+")
+
+class LexicalIndex:
+    """
+    BM25 keyword index (SQLite FTS5) over the same chunks as the vector
+    store, for queries that hinge on exact terms - error codes, SKUs, KB
+    article numbers - which embeddings tend to blur. Results use the same
+    shape as a Chroma query so they can be fused with vector hits.
+    """
+    def __init__(self, db_path: str):
+        self.db = SQLiteDatabase(db_path)
+        self.db.migrate(MIGRATIONS)
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+        """Index chunks, replacing any already indexed under the same ids."""
+        with self.db.transaction() as conn:
+            self._delete_ids(conn, ids)
+            for chunk_id, text, meta in zip(ids, documents, metadatas):
+                cursor = conn.execute(
+                    "INSERT INTO chunks (id, doc_id, metadata) VALUES (?, ?, ?)",
+                    (chunk_id, meta.get("doc_id"), json.dumps(meta))
+                )
+                conn.execute("INSERT INTO chunks_fts (rowid, text) VALUES (?, ?)", (cursor.lastrowid, text))
+
+    def delete_document(self, doc_id: str):
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM chunks_fts WHERE rowid IN (SELECT rowid FROM chunks WHERE doc_id = ?)", (doc_id,))
+            conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        with self.db.transaction() as conn:
+            conn.executemany(
+                "UPDATE chunks SET doc_id = ?, metadata = ? WHERE id = ?",
+                [(meta.get("doc_id"), json.dumps(meta), chunk_id) for chunk_id, meta in zip(ids, metadatas)]
+            )
+
+    def delete_ids(self, ids: List[str]):
+        with self.db.transaction() as conn:
+            self._delete_ids(conn, ids)
+
+    @staticmethod
+    def _delete_ids(conn, ids: List[str]):
+        for start in range(0, len(ids), 500):
+            part = ids[start:start + 500]
+            marks = ",".join("?" * len(part))
+            conn.execute(f"DELETE FROM chunks_fts WHERE rowid IN (SELECT rowid FROM chunks WHERE id IN ({marks}))", part)
+            conn.execute(f"DELETE FROM chunks WHERE id IN ({marks})", part)
+
+    def count(self) -> int:
+        return self.db.connection().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    @staticmethod
+    def match_expression(query: str) -> Optional[str]:
+        """Any of the query's terms, each quoted so FTS5 syntax in user input is inert."""
+        terms = dict.fromkeys(term.lower() for term in _TERM.findall(query))
+        if not terms:
+            return None
+        return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+    def search(self, query: str, n_results: int = 5, doc_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        expression = self.match_expression(query)
+        if expression is None:
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        sql = (
+            "SELECT c.id, f.text, c.metadata, bm25(chunks_fts) AS score "
+            "FROM chunks_fts f JOIN chunks c ON c.rowid = f.rowid "
+            "WHERE chunks_fts MATCH ?"
+        )
+        params: list = [expression]
+        if doc_ids:
+            sql += f" AND c.doc_id IN ({','.join('?' * len(doc_ids))})"
+            params += list(doc_ids)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(n_results)
+        rows = self.db.connection().execute(sql, params).fetchall()
+        # bm25() is lower-is-better, like a distance
+        return {
+            "ids": [[row[0] for row in rows]],
+            "documents": [[row[1] for row in rows]],
+            "metadatas": [[json.loads(row[2]) for row in rows]],
+            "distances": [[row[3] for row in rows]],
+        }
+
+    def close(self):
+        self.db.close()
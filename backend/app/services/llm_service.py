@@ -1 +1,146 @@
-# wraps vLLM/OpenAI/etc.
+import asyncio
+from typing import Any, List, Dict, Optional, AsyncIterator
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, Timeout
+from app.core.config import settings
+from app.core.metrics import llm_tokens, span
+
+class LLMService:
+    """
+    Async wrapper around the OpenAI-compatible chat completions API.
+
+    One AsyncOpenAI client (and its HTTP connection pool) is shared by every
+    request on the worker, and a semaphore caps the number of completions in
+    flight so bursts queue here instead of piling onto the provider.
+    """
+    def __init__(self):
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closer: Optional[asyncio.Task] = None
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        # The pool is bound to the event loop it was first used on, so build it
+        # lazily and rebuild it if we are now running on a different loop
+        # (e.g. each TestClient or benchmark run starts its own).
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            timeout = Timeout(settings.LLM_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS)
+            http_client = DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                timeout=timeout,
+            )
+            self._client = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                base_url=settings.OPENAI_BASE_URL or None,
+                max_retries=settings.LLM_MAX_RETRIES,
+                timeout=timeout,
+                http_client=http_client,
+            )
+            self._semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+            self._loop = loop
+            # The pool can only be closed on its own loop, which is usually
+            # gone by the time a new loop needs a client, so close it when
+            # that loop shuts down
+            self._closer = loop.create_task(self._close_on_shutdown(self._client))
+        return self._client
+
+    @staticmethod
+    async def _close_on_shutdown(client: AsyncOpenAI):
+        # asyncio.run (and uvicorn, TestClient) cancel leftover tasks before
+        # closing the loop
+        try:
+            await asyncio.get_running_loop().create_future()
+        finally:
+            await client.close()
+
+    @staticmethod
+    def _count_usage(model: str, response):
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            llm_tokens.inc(usage.prompt_tokens or 0, model, "prompt")
+            llm_tokens.inc(usage.completion_tokens or 0, model, "completion")
+
+    async def complete(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, timeout: Optional[float] = None) -> str:
+        client = self.client
+        with span("llm.queue"):
+            await self._semaphore.acquire()
+        try:
+            with span("llm.complete"):
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    timeout=timeout or settings.LLM_TIMEOUT_SECONDS
+                )
+        finally:
+            self._semaphore.release()
+        self._count_usage(model, response)
+        return response.choices[0].message.content
+
+    async def complete_with_tools(self, model: str, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]], temperature: float = 0.7, tool_choice: str = "auto", timeout: Optional[float] = None):
+        """
+        Completion with function calling enabled. Returns the assistant
+        message itself: either content or tool_calls for the caller to run.
+        """
+        client = self.client
+        with span("llm.queue"):
+            await self._semaphore.acquire()
+        try:
+            with span("llm.complete"):
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    tools=tools,
+                    tool_choice=tool_choice,
+                    timeout=timeout or settings.LLM_TIMEOUT_SECONDS
+                )
+        finally:
+            self._semaphore.release()
+        self._count_usage(model, response)
+        return response.choices[0].message
+
+    async def stream(self, model: str, messages: List[Dict[str, str]], temperature: float = 0.7, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Yield content deltas as the model produces them. The concurrency slot
+        is held until the stream is exhausted or closed.
+        """
+        client = self.client
+        with span("llm.queue"):
+            await self._semaphore.acquire()
+        chunks = 0
+        try:
+            with span("llm.stream"):
+                stream = await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True,
+                    timeout=timeout or settings.LLM_TIMEOUT_SECONDS
+                )
+                try:
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            chunks += 1
+                            yield chunk.choices[0].delta.content
+                finally:
+                    await stream.close()
+        finally:
+            self._semaphore.release()
+            llm_tokens.inc(chunks, model, "completion")
+
+    async def aclose(self):
+        if self._client is not None:
+            if self._loop is asyncio.get_running_loop():
+                self._closer.cancel()
+                await self._client.close()
+            self._client = None
+            self._loop = None
+
+llm_service = LLMService()
@@ -0,0 +1,331 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.db.session import SQLiteDatabase
+
+MIGRATIONS = [
+    [
+        """
+        CREATE TABLE IF NOT EXISTS rows (
+            row INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE,
+            doc_id TEXT,
+            document TEXT,
+            metadata TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_rows_doc_id ON rows (doc_id)",
+        "CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    ],
+]
+
+DTYPES = {"float16": np.float16, "int8": np.int8}
+
+# Rows converted to float32 and scored per matrix product; small enough for
+# the scratch block to stay in the CPU cache
+SCORE_BLOCK_ROWS = 1024
+
+class NumpyVectorIndex:
+    """
+    Exact (brute-force) vector index over a packed, memory-mapped matrix, for
+    knowledge bases small enough that scanning every vector is cheaper than
+    an ANN index. Mirrors the subset of the Chroma collection API that
+    VectorStoreService uses (add/upsert/query/get/delete/count), including
+    `where` filters on doc_id.
+
+    Storage, in `path`:
+    - vectors.bin: one row per chunk, float16 or int8 (per-row symmetric
+      scale), appended to as chunks are added and opened with np.memmap, so
+      the OS page cache - not the Python heap - holds the matrix;
+    - aux.bin: float32 (scale, squared norm) per row;
+    - rows.db: SQLite table of chunk id, doc_id, text and metadata per row.
+
+    Deleting or replacing a chunk only drops its row from rows.db (a
+    tombstone). Once tombstones exceed compact_ratio of the matrix it is
+    rewritten without them.
+
+    Distances are squared L2, like Chroma's default space.
+    """
+    def __init__(self, path: str, dtype: str = "float16", compact_ratio: float = 0.2):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.db = SQLiteDatabase(os.path.join(path, "rows.db"))
+        self.db.migrate(MIGRATIONS)
+        self._lock = threading.Lock()
+
+        stored = dict(self.db.connection().execute("SELECT key, value FROM settings").fetchall())
+        self.dtype = np.dtype(DTYPES[stored.get("dtype", dtype)])
+        self.dim: Optional[int] = int(stored["dim"]) if "dim" in stored else None
+        self._load()
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.bin")
+
+    @property
+    def _aux_path(self) -> str:
+        return os.path.join(self.path, "aux.bin")
+
+    def _open_matrix(self, n_rows: int):
+        if not n_rows:
+            return np.zeros((0, self.dim or 0), dtype=self.dtype), np.zeros((0, 2), dtype=np.float32)
+        return (
+            np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(n_rows, self.dim)),
+            np.memmap(self._aux_path, dtype=np.float32, mode="r", shape=(n_rows, 2)),
+        )
+
+    def _load(self):
+        """Open the matrix files and rebuild the per-row lookups from rows.db."""
+        n_rows = 0
+        if self.dim and os.path.exists(self._vectors_path) and os.path.exists(self._aux_path):
+            n_rows = min(
+                os.path.getsize(self._vectors_path) // (self.dim * self.dtype.itemsize),
+                os.path.getsize(self._aux_path) // 8
+            )
+            # Drop a partially written trailing row left by a crash mid-append
+            os.truncate(self._vectors_path, n_rows * self.dim * self.dtype.itemsize)
+            os.truncate(self._aux_path, n_rows * 8)
+
+        row_ids: List[Optional[str]] = [None] * n_rows
+        doc_of_row = np.full(n_rows, -1, dtype=np.int32)
+        self._row_of: Dict[str, int] = {}
+        self._doc_codes: Dict[Optional[str], int] = {}
+        for row, chunk_id, doc_id in self.db.connection().execute("SELECT row, id, doc_id FROM rows"):
+            if row >= n_rows:
+                continue
+            row_ids[row] = chunk_id
+            self._row_of[chunk_id] = row
+            doc_of_row[row] = self._doc_codes.setdefault(doc_id, len(self._doc_codes))
+        vectors, aux = self._open_matrix(n_rows)
+        # Swapped as one tuple so concurrent queries see a consistent snapshot
+        self._state = (vectors, aux, doc_of_row, row_ids)
+
+    def _quantize(self, embeddings: np.ndarray):
+        squared_norms = (embeddings * embeddings).sum(axis=1)
+        if self.dtype == np.int8:
+            scales = np.abs(embeddings).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            packed = np.round(embeddings / scales[:, None]).astype(np.int8)
+        else:
+            scales = np.ones(len(embeddings), dtype=np.float32)
+            packed = embeddings.astype(np.float16)
+        return packed, np.stack([scales, squared_norms], axis=1).astype(np.float32)
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], embeddings: List[List[float]]):
+        """Append chunks; an id that already exists replaces the old chunk."""
+        if not ids:
+            return
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                with self.db.transaction() as conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                        [("dim", str(self.dim)), ("dtype", self.dtype.name)]
+                    )
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match index dimension {self.dim}")
+
+            packed, aux = self._quantize(matrix)
+            _, _, doc_of_row, row_ids = self._state
+            first_row = len(row_ids)
+            with open(self._vectors_path, "ab") as f:
+                f.write(packed.tobytes())
+            with open(self._aux_path, "ab") as f:
+                f.write(aux.tobytes())
+            with self.db.transaction() as conn:
+                conn.executemany("DELETE FROM rows WHERE id = ?", [(i,) for i in ids])
+                conn.executemany(
+                    "INSERT INTO rows (row, id, doc_id, document, metadata) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (first_row + i, chunk_id, (meta or {}).get("doc_id"), document, json.dumps(meta or {}))
+                        for i, (chunk_id, document, meta) in enumerate(zip(ids, documents, metadatas))
+                    ]
+                )
+
+            doc_of_row = doc_of_row.copy()
+            row_ids = list(row_ids)
+            for i, (chunk_id, meta) in enumerate(zip(ids, metadatas)):
+                replaced = self._row_of.get(chunk_id)
+                if replaced is not None:
+                    doc_of_row[replaced] = -1
+                    row_ids[replaced] = None
+                self._row_of[chunk_id] = first_row + i
+            codes = [self._doc_codes.setdefault((meta or {}).get("doc_id"), len(self._doc_codes)) for meta in metadatas]
+            doc_of_row = np.concatenate([doc_of_row, np.asarray(codes, dtype=np.int32)])
+            row_ids.extend(ids)
+            vectors, aux = self._open_matrix(len(row_ids))
+            self._state = (vectors, aux, doc_of_row, row_ids)
+            self._maybe_compact()
+
+    upsert = add
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        """Tombstone chunks by id and/or doc_id filter."""
+        with self._lock:
+            vectors, aux, doc_of_row, row_ids = self._state
+            doomed = [self._row_of[i] for i in ids or [] if i in self._row_of]
+            if where:
+                codes = [self._doc_codes[d] for d in self._where_doc_ids(where) if d in self._doc_codes]
+                doomed += np.flatnonzero(np.isin(doc_of_row, codes)).tolist()
+            if not doomed:
+                return
+            with self.db.transaction() as conn:
+                conn.executemany("DELETE FROM rows WHERE row = ?", [(row,) for row in doomed])
+
+            doc_of_row = doc_of_row.copy()
+            row_ids = list(row_ids)
+            for row in doomed:
+                self._row_of.pop(row_ids[row], None)
+                row_ids[row] = None
+                doc_of_row[row] = -1
+            self._state = (vectors, aux, doc_of_row, row_ids)
+            self._maybe_compact()
+
+    def update(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Replace the metadata of existing chunks, keeping their vectors."""
+        with self._lock:
+            pairs = [(chunk_id, meta or {}) for chunk_id, meta in zip(ids, metadatas) if chunk_id in self._row_of]
+            with self.db.transaction() as conn:
+                conn.executemany(
+                    "UPDATE rows SET doc_id = ?, metadata = ? WHERE id = ?",
+                    [(meta.get("doc_id"), json.dumps(meta), chunk_id) for chunk_id, meta in pairs]
+                )
+            vectors, aux, doc_of_row, row_ids = self._state
+            doc_of_row = doc_of_row.copy()
+            for chunk_id, meta in pairs:
+                doc_of_row[self._row_of[chunk_id]] = self._doc_codes.setdefault(meta.get("doc_id"), len(self._doc_codes))
+            self._state = (vectors, aux, doc_of_row, row_ids)
+
+    def count(self) -> int:
+        return len(self._row_of)
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10, where: Optional[Dict[str, Any]] = None, include=None) -> Dict[str, Any]:
+        vectors, aux, doc_of_row, row_ids = self._state
+        candidates = None
+        if where:
+            # Score only the matching rows: a filter over a few documents
+            # reads a small slice of the matrix instead of all of it
+            codes = [self._doc_codes[d] for d in self._where_doc_ids(where) if d in self._doc_codes]
+            candidates = np.flatnonzero(np.isin(doc_of_row, codes))
+            vectors, aux = vectors[candidates], aux[candidates]
+            alive = np.ones(len(candidates), dtype=bool)
+        else:
+            alive = doc_of_row >= 0
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query in np.asarray(query_embeddings, dtype=np.float32):
+            distances = self._distances(vectors, aux, query)
+            distances[~alive] = np.inf
+            k = min(n_results, int(alive.sum()))
+            if k == 0:
+                top = np.zeros(0, dtype=np.int64)
+            else:
+                top = np.argpartition(distances, k - 1)[:k]
+                top = top[np.argsort(distances[top])]
+            top_ids = [row_ids[r] for r in (candidates[top] if candidates is not None else top)]
+            rows = self._rows(top_ids)
+            # The snapshot is read without the lock: chunks deleted (or
+            # compacted away) since then are gone from the rows table
+            found = [(chunk_id, r) for chunk_id, r in zip(top_ids, top) if chunk_id in rows]
+            result["ids"].append([chunk_id for chunk_id, _ in found])
+            result["documents"].append([rows[chunk_id][0] for chunk_id, _ in found])
+            result["metadatas"].append([rows[chunk_id][1] for chunk_id, _ in found])
+            result["distances"].append([float(distances[r]) for _, r in found])
+        return result
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None, include=None, limit: Optional[int] = None, offset: int = 0) -> Dict[str, Any]:
+        include = ["documents", "metadatas"] if include is None else include
+        sql = "SELECT row, id, document, metadata FROM rows"
+        params: list = []
+        clauses = []
+        if ids:
+            clauses.append(f"id IN ({','.join('?' * len(ids))})")
+            params += list(ids)
+        if where:
+            doc_ids = self._where_doc_ids(where)
+            clauses.append(f"doc_id IN ({','.join('?' * len(doc_ids))})")
+            params += doc_ids
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY row"
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        rows = self.db.connection().execute(sql, params).fetchall()
+
+        result: Dict[str, Any] = {"ids": [row[1] for row in rows]}
+        if "documents" in include:
+            result["documents"] = [row[2] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(row[3]) for row in rows]
+        if "embeddings" in include:
+            vectors, aux = self._state[0], self._state[1]
+            result["embeddings"] = [(vectors[row[0]].astype(np.float32) * aux[row[0], 0]).tolist() for row in rows]
+        return result
+
+    @staticmethod
+    def _where_doc_ids(where: Dict[str, Any]) -> List[str]:
+        condition = where.get("doc_id")
+        if len(where) != 1 or condition is None:
+            raise ValueError("The numpy vector index only supports filtering on doc_id")
+        if isinstance(condition, dict):
+            if set(condition) != {"$in"}:
+                raise ValueError("Only {'doc_id': value} and {'doc_id': {'$in': [...]}} filters are supported")
+            return list(condition["$in"])
+        return [condition]
+
+    @staticmethod
+    def _distances(vectors: np.ndarray, aux: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # ||x - q||^2 = ||x||^2 + ||q||^2 - 2 x.q, with x = packed * scale.
+        # Scored in blocks so the float32 copy of the packed rows stays small.
+        dots = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+            block = vectors[start:start + SCORE_BLOCK_ROWS]
+            dots[start:start + len(block)] = block.astype(np.float32) @ query
+        dots *= aux[:, 0]
+        return aux[:, 1] + float(query @ query) - 2.0 * dots
+
+    def _rows(self, chunk_ids: List[str]) -> Dict[str, tuple]:
+        if not chunk_ids:
+            return {}
+        marks = ",".join("?" * len(chunk_ids))
+        found = self.db.connection().execute(f"SELECT id, document, metadata FROM rows WHERE id IN ({marks})", chunk_ids)
+        return {row[0]: (row[1], json.loads(row[2])) for row in found}
+
+    def _maybe_compact(self):
+        total = len(self._state[3])
+        dead = total - len(self._row_of)
+        if total and dead / total > self.compact_ratio:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the matrix without tombstoned rows and renumber the live ones."""
+        vectors, aux, doc_of_row, _ = self._state
+        live = np.flatnonzero(doc_of_row >= 0)
+        vectors_tmp, aux_tmp = self._vectors_path + ".tmp", self._aux_path + ".tmp"
+        with open(vectors_tmp, "wb") as vf, open(aux_tmp, "wb") as af:
+            for start in range(0, len(live), SCORE_BLOCK_ROWS):
+                part = live[start:start + SCORE_BLOCK_ROWS]
+                vf.write(np.ascontiguousarray(vectors[part]).tobytes())
+                af.write(np.ascontiguousarray(aux[part]).tobytes())
+        renumber = [(new, int(old)) for new, old in enumerate(live)]
+        # Queries still holding the old maps keep reading the replaced files
+        with self.db.transaction() as conn:
+            # Two passes so new row numbers never collide with old ones
+            conn.executemany("UPDATE rows SET row = ? WHERE row = ?", [(-1 - new, old) for new, old in renumber])
+            conn.execute("UPDATE rows SET row = -1 - row WHERE row < 0")
+            os.replace(vectors_tmp, self._vectors_path)
+            os.replace(aux_tmp, self._aux_path)
+        self._load()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,36 @@
+"""
+PDF text extraction worker functions.
+
+Kept free of app imports so process-pool workers (spawned, not forked) only
+load PyMuPDF, not the vector store, caches and clients.
+"""
+from typing import List, Tuple
+import os
+import fitz  # PyMuPDF
+
+def page_count(path: str) -> int:
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+# Each worker keeps the document it last opened, since consecutive ranges it
+# receives usually come from the same file
+# (keyed on size/mtime too, as temp file names can be reused)
+_open_doc = {"key": None, "doc": None}
+
+def _open(path: str):
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if _open_doc["key"] != key:
+        if _open_doc["doc"] is not None:
+            _open_doc["doc"].close()
+        _open_doc["doc"] = fitz.open(path)
+        _open_doc["key"] = key
+    return _open_doc["doc"]
+
+def extract_page_range(path: str, start: int, end: int) -> List[str]:
+    """Text of pages [start, end). Each worker opens the shared file itself."""
+    doc = _open(path)
+    return [doc[i].get_text() for i in range(start, end)]
+
+def page_ranges(total: int, pages_per_task: int) -> List[Tuple[int, int]]:
+    return [(start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
@@ -0,0 +1,123 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+class RetrievalCache:
+    """
+    Cache of vector-store results for RAG retrieval.
+
+    Exact tier: keyed on (scope, n_results, normalized query) with TTL and LRU
+    eviction. Optional semantic tier: reuses a result when a new query's
+    embedding has cosine similarity >= semantic_threshold with a cached one.
+
+    Every entry belongs to a collection generation; when the caller passes a
+    newer generation (documents were added or deleted) the whole cache is
+    dropped, so results never outlive the data they were computed from.
+    Generations only count writes made in this process, so that holds for a
+    single worker process: with several, another worker's writes are only
+    picked up when entries expire (ttl_seconds).
+    """
+    def __init__(self, max_items: int = 1024, ttl_seconds: float = 300.0, semantic_threshold: float = 0.0, semantic_max_items: int = 512):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+        self.semantic_max_items = semantic_max_items
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._semantic: "OrderedDict[Tuple, Tuple[float, np.ndarray, Any]]" = OrderedDict()
+        self._generation: Optional[int] = None
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split()).rstrip("?!. ")
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.semantic_threshold > 0
+
+    def _check_generation(self, generation: int):
+        if generation != self._generation:
+            if self._generation is not None:
+                self.invalidations += 1
+            self._entries.clear()
+            self._semantic.clear()
+            self._generation = generation
+
+    def get(self, scope: str, n_results: int, query: str, generation: int) -> Optional[Any]:
+        self._check_generation(generation)
+        key = (scope, n_results, self.normalize(query))
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def get_similar(self, scope: str, n_results: int, embedding: List[float], generation: int) -> Optional[Any]:
+        self._check_generation(generation)
+        if not self.semantic_enabled or not self._semantic:
+            return None
+        now = time.monotonic()
+        candidates = [
+            (key, vector, result)
+            for key, (expires_at, vector, result) in self._semantic.items()
+            if key[0] == scope and key[1] == n_results and expires_at >= now
+        ]
+        if not candidates:
+            return None
+        query = self._unit(embedding)
+        scores = np.stack([vector for _, vector, _ in candidates]) @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        self._semantic.move_to_end(candidates[best][0])
+        self.semantic_hits += 1
+        return candidates[best][2]
+
+    def put(self, scope: str, n_results: int, query: str, generation: int, result: Any, embedding: Optional[List[float]] = None):
+        self._check_generation(generation)
+        expires_at = time.monotonic() + self.ttl_seconds
+        key = (scope, n_results, self.normalize(query))
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_items:
+            self._entries.popitem(last=False)
+
+        if self.semantic_enabled and embedding is not None:
+            self._semantic[key] = (expires_at, self._unit(embedding), result)
+            self._semantic.move_to_end(key)
+            while len(self._semantic) > self.semantic_max_items:
+                self._semantic.popitem(last=False)
+
+    def record_miss(self):
+        self.misses += 1
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def __len__(self) -> int:
+        """Cached results (exact-key entries)."""
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "items": len(self._entries),
+            "semantic_items": len(self._semantic),
+            "generation": self._generation,
+        }
@@ -1 +1,118 @@
 # semantic search over KB
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import span
+from app.services.embedding import embedding_service
+from app.services.retrieval_cache import RetrievalCache
+from app.services.vector_store import vector_store
+
+class RetrievalService:
+    """
+    Retrieval for RAG: query embedding + vector search, fronted by a
+    RetrievalCache that is invalidated through the vector store's
+    generation counter.
+    """
+    def __init__(self):
+        self.cache: Optional[RetrievalCache] = None
+        if settings.RETRIEVAL_CACHE_ENABLED:
+            self.cache = RetrievalCache(
+                max_items=settings.RETRIEVAL_CACHE_MAX_ITEMS,
+                ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS,
+                semantic_threshold=settings.RETRIEVAL_CACHE_SEMANTIC_THRESHOLD,
+                semantic_max_items=settings.RETRIEVAL_CACHE_SEMANTIC_MAX_ITEMS,
+            )
+
+    @staticmethod
+    def scope_for(document_ids: List[str]) -> str:
+        """Cache scope for an agent: agents with the same documents share entries."""
+        if not document_ids:
+            return "*"
+        return hashlib.sha1(",".join(sorted(document_ids)).encode("utf-8")).hexdigest()
+
+    async def retrieve(self, query: str, n_results: int = 3, document_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Top chunks for query. With document_ids (an agent's corpus) only those
+        documents are searched; without, the whole knowledge base.
+
+        With hybrid search on, the BM25 keyword search runs in a worker
+        thread while the query is embedded and the vector search runs, and
+        the two rankings are merged with reciprocal rank fusion.
+        """
+        scope = self.scope_for(document_ids or [])
+        doc_ids = document_ids or None
+        cache = self.cache
+        generation = vector_store.generation
+        if cache is not None:
+            cached = cache.get(scope, n_results, query, generation)
+            if cached is not None:
+                return cached
+
+        lexical = None
+        candidates = n_results
+        if vector_store.lexical is not None:
+            candidates = max(n_results, settings.HYBRID_CANDIDATES)
+            lexical = asyncio.ensure_future(asyncio.to_thread(self._lexical_search, query, candidates, doc_ids))
+
+        try:
+            with span("retrieval.embed_query"):
+                query_embedding = await embedding_service.embed_query(query)
+
+            if cache is not None:
+                cached = cache.get_similar(scope, n_results, query_embedding, generation)
+                if cached is not None:
+                    cache.put(scope, n_results, query, generation, cached)
+                    return cached
+                cache.record_miss()
+
+            with span("retrieval.vector_search"):
+                result = await asyncio.to_thread(vector_store.query, query_embedding, candidates, doc_ids)
+            if lexical is not None:
+                with span("retrieval.lexical_wait"):
+                    lexical_result = await lexical
+                result = self.fuse([result, lexical_result], n_results)
+        finally:
+            if lexical is not None and not lexical.done():
+                lexical.cancel()
+
+        # Don't cache a result computed against a collection that changed meanwhile
+        if cache is not None and vector_store.generation == generation:
+            cache.put(scope, n_results, query, generation, result, embedding=query_embedding)
+        return result
+
+    @staticmethod
+    def _lexical_search(query: str, candidates: int, doc_ids: Optional[List[str]]) -> Dict[str, Any]:
+        with span("retrieval.lexical_search"):
+            return vector_store.lexical.search(query, candidates, doc_ids)
+
+    @staticmethod
+    def fuse(results: List[Dict[str, Any]], n_results: int) -> Dict[str, Any]:
+        """
+        Reciprocal rank fusion of Chroma-shaped results: each hit scores
+        sum(1 / (RRF_K + rank)) over the rankings it appears in. The fused
+        scores are returned under "scores".
+        """
+        scores: Dict[str, float] = {}
+        hits: Dict[str, tuple] = {}
+        for result in results:
+            ids = (result.get("ids") or [[]])[0]
+            documents = (result.get("documents") or [[]])[0] or []
+            metadatas = (result.get("metadatas") or [[]])[0] or []
+            for rank, chunk_id in enumerate(ids):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (settings.RRF_K + rank + 1)
+                if chunk_id not in hits:
+                    hits[chunk_id] = (
+                        documents[rank] if rank < len(documents) else None,
+                        metadatas[rank] if rank < len(metadatas) else None,
+                    )
+        ranked = sorted(scores, key=scores.get, reverse=True)[:n_results]
+        return {
+            "ids": [ranked],
+            "documents": [[hits[i][0] for i in ranked]],
+            "metadatas": [[hits[i][1] for i in ranked]],
+            "scores": [[scores[i] for i in ranked]],
+        }
+
+retrieval_service = RetrievalService()
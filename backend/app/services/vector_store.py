@@ -1,31 +1,235 @@
+import hashlib
+import json
+import os
+import threading
 import chromadb
 from chromadb.config import Settings
 from app.core.config import settings
-from typing import List, Dict, Any
+from app.services.lexical_index import LexicalIndex
+from app.services.numpy_index import NumpyVectorIndex
+from typing import List, Dict, Any, Optional, Tuple
+
+SCOPED_COLLECTION_PREFIX = "kb_scope_"
 
 class VectorStoreService:
+    """
+    All chunks live in the shared "knowledge_base" collection. Queries can be
+    restricted to a set of documents with a doc_id metadata filter, and a
+    document set (an agent's corpus) can additionally get its own collection
+    holding a copy of just its chunks, so its queries search a small index
+    instead of filtering a large one. Scoped collections are kept in sync by
+    add_documents / delete_document and dropped when the last agent using
+    them is deleted. Agents only live in memory, so scoped collections left
+    by a previous run have no agent and are dropped at startup.
+
+    With VECTOR_STORE_BACKEND="numpy" the chunks live in a NumpyVectorIndex
+    instead. Its exact scan filters on doc_id as cheaply as it searches, so
+    scoped collections are not used there.
+    """
     def __init__(self):
-        self.client = chromadb.PersistentClient(path=settings.CHROMA_DB_DIR)
-        self.collection = self.client.get_or_create_collection(name="knowledge_base")
-
-    def add_documents(self, documents: List[str], metadatas: List[Dict[str, Any]], ids: List[str]):
-        self.collection.add(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids
-        )
+        self.client = None
+        if settings.VECTOR_STORE_BACKEND == "numpy":
+            self.collection = NumpyVectorIndex(
+                os.path.join(settings.CHROMA_DB_DIR, "numpy_index"),
+                dtype=settings.NUMPY_INDEX_DTYPE,
+                compact_ratio=settings.NUMPY_INDEX_COMPACT_RATIO
+            )
+        elif settings.VECTOR_STORE_BACKEND == "chroma":
+            self.client = chromadb.PersistentClient(path=settings.CHROMA_DB_DIR)
+            # Vectors always come from EmbeddingService; don't let Chroma embed
+            # documents or queries again with its own default model.
+            self.collection = self.client.get_or_create_collection(name="knowledge_base", embedding_function=None)
+        else:
+            raise ValueError(f"Unknown vector store backend: {settings.VECTOR_STORE_BACKEND}")
+        # Bumped on every write so caches of query results can tell they are
+        # stale. Counts this process's writes only.
+        self.generation = 0
+        # collection name -> (doc_ids, collection)
+        self._scoped: Dict[str, Tuple[frozenset, Any]] = {}
+        # Held by writes while they update scoped collections and generation
+        # (writes run on worker threads), and by scoped-collection backfills
+        self._write_lock = threading.Lock()
+        if self.client is not None:
+            for existing in self.client.list_collections():
+                if existing.name.startswith(SCOPED_COLLECTION_PREFIX):
+                    self.client.delete_collection(existing.name)
+        # Keyword index over the same chunks, for hybrid retrieval
+        self.lexical: Optional[LexicalIndex] = None
+        if settings.HYBRID_SEARCH_ENABLED:
+            self.lexical = LexicalIndex(settings.LEXICAL_INDEX_PATH or os.path.join(settings.CHROMA_DB_DIR, "lexical.db"))
+            if self.lexical.count() == 0 and self.collection.count() > 0:
+                self._backfill_lexical()
+
+    def _max_batch_size(self) -> int:
+        return self.client.get_max_batch_size() if self.client is not None else 5000
+
+    def _backfill_lexical(self):
+        # Chunks ingested before the keyword index existed
+        batch_size = self._max_batch_size()
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            if not page["ids"]:
+                break
+            self.lexical.add(page["ids"], page["documents"], page["metadatas"])
+            offset += len(page["ids"])
+
+    @staticmethod
+    def scoped_collection_name(doc_ids: List[str]) -> str:
+        digest = hashlib.sha1(",".join(sorted(set(doc_ids))).encode("utf-8")).hexdigest()
+        return f"{SCOPED_COLLECTION_PREFIX}{digest[:40]}"
+
+    def ensure_scoped_collection(self, doc_ids: List[str]):
+        """
+        Create (once) the dedicated collection for this document set and copy
+        the documents' existing chunks into it. The numpy backend has no
+        collections; its filtered queries are already exact and fast.
+        """
+        if self.client is None:
+            return self.collection
+        name = self.scoped_collection_name(doc_ids)
+        with self._write_lock:
+            if name in self._scoped:
+                return self._scoped[name][1]
+            collection = self.client.get_or_create_collection(
+                name=name,
+                metadata={"doc_ids": json.dumps(sorted(set(doc_ids)))},
+                embedding_function=None
+            )
+            batch_size = self._max_batch_size()
+            offset = 0
+            while True:
+                page = self.collection.get(
+                    where=self._doc_filter(doc_ids),
+                    include=["documents", "metadatas", "embeddings"],
+                    limit=batch_size,
+                    offset=offset
+                )
+                if not page["ids"]:
+                    break
+                collection.upsert(ids=page["ids"], documents=page["documents"], metadatas=page["metadatas"], embeddings=page["embeddings"])
+                offset += len(page["ids"])
+            self._scoped[name] = (frozenset(doc_ids), collection)
+            return collection
 
-    def query(self, query_text: str, n_results: int = 5) -> Dict[str, Any]:
+    def drop_scoped_collection(self, doc_ids: List[str]):
+        name = self.scoped_collection_name(doc_ids)
+        with self._write_lock:
+            if self._scoped.pop(name, None) is not None:
+                self.client.delete_collection(name)
+
+    def _scoped_containing(self, doc_ids) -> List[Tuple[frozenset, Any]]:
+        """Scoped collections holding any of doc_ids; call with _write_lock held."""
+        doc_ids = set(doc_ids)
+        return [scoped for scoped in self._scoped.values() if scoped[0] & doc_ids]
+
+    @staticmethod
+    def _doc_filter(doc_ids: List[str]) -> Dict[str, Any]:
+        doc_ids = sorted(set(doc_ids))
+        if len(doc_ids) == 1:
+            return {"doc_id": doc_ids[0]}
+        return {"doc_id": {"$in": doc_ids}}
+
+    def add_documents(self, documents: List[str], metadatas: List[Dict[str, Any]], ids: List[str], embeddings: List[List[float]]):
+        batch_size = self._max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            self.collection.add(
+                documents=documents[start:end],
+                metadatas=metadatas[start:end],
+                embeddings=embeddings[start:end],
+                ids=ids[start:end]
+            )
+        if self.lexical is not None:
+            self.lexical.add(ids, documents, metadatas)
+        # Under the lock so a concurrent backfill can't miss these chunks;
+        # upsert because the backfill may already have copied them
+        with self._write_lock:
+            for scoped_doc_ids, collection in self._scoped_containing(meta.get("doc_id") for meta in metadatas):
+                keep = [i for i, meta in enumerate(metadatas) if meta.get("doc_id") in scoped_doc_ids]
+                for start in range(0, len(keep), batch_size):
+                    part = keep[start:start + batch_size]
+                    collection.upsert(
+                        documents=[documents[i] for i in part],
+                        metadatas=[metadatas[i] for i in part],
+                        embeddings=[embeddings[i] for i in part],
+                        ids=[ids[i] for i in part]
+                    )
+            self.generation += 1
+
+    def query(self, query_embedding: List[float], n_results: int = 5, doc_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Nearest chunks, restricted to doc_ids when given: from the document
+        set's own collection if it has one, otherwise by filtering the shared
+        collection on doc_id.
+        """
+        if not doc_ids:
+            return self.collection.query(query_embeddings=[query_embedding], n_results=n_results)
+        scoped = self._scoped.get(self.scoped_collection_name(doc_ids))
+        if scoped is not None:
+            return scoped[1].query(query_embeddings=[query_embedding], n_results=n_results)
         return self.collection.query(
-            query_texts=[query_text],
-            n_results=n_results
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            where=self._doc_filter(doc_ids)
         )
 
+    def get_chunk_metadatas(self, doc_id: str) -> Dict[str, Dict[str, Any]]:
+        """Chunk id -> metadata of every stored chunk of a document."""
+        metadatas: Dict[str, Dict[str, Any]] = {}
+        batch_size = self._max_batch_size()
+        offset = 0
+        while True:
+            page = self.collection.get(where={"doc_id": doc_id}, include=["metadatas"], limit=batch_size, offset=offset)
+            if not page["ids"]:
+                return metadatas
+            for chunk_id, meta in zip(page["ids"], page["metadatas"]):
+                metadatas[chunk_id] = meta or {}
+            offset += len(page["ids"])
+
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]):
+        """Rewrite the metadata of existing chunks (e.g. a shifted chunk_index) without re-embedding them."""
+        if not ids:
+            return
+        batch_size = self._max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            self.collection.update(ids=ids[start:start + batch_size], metadatas=metadatas[start:start + batch_size])
+        if self.lexical is not None:
+            self.lexical.update_metadata(ids, metadatas)
+        with self._write_lock:
+            for scoped_doc_ids, collection in self._scoped_containing(meta.get("doc_id") for meta in metadatas):
+                keep = [i for i, meta in enumerate(metadatas) if meta.get("doc_id") in scoped_doc_ids]
+                for start in range(0, len(keep), batch_size):
+                    part = keep[start:start + batch_size]
+                    collection.update(ids=[ids[i] for i in part], metadatas=[metadatas[i] for i in part])
+            self.generation += 1
+
+    def delete_chunks(self, doc_id: str, ids: List[str]):
+        """Delete chunks of one document by id."""
+        if not ids:
+            return
+        batch_size = self._max_batch_size()
+        for start in range(0, len(ids), batch_size):
+            self.collection.delete(ids=ids[start:start + batch_size])
+        if self.lexical is not None:
+            self.lexical.delete_ids(ids)
+        with self._write_lock:
+            for _, collection in self._scoped_containing([doc_id]):
+                for start in range(0, len(ids), batch_size):
+                    collection.delete(ids=ids[start:start + batch_size])
+            self.generation += 1
+
     def delete_document(self, doc_id: str):
         # This is a simplification. In reality, we might need to find all chunks for a doc_id.
         # For now, assuming we store doc_id in metadata
         self.collection.delete(
             where={"doc_id": doc_id}
         )
+        if self.lexical is not None:
+            self.lexical.delete_document(doc_id)
+        with self._write_lock:
+            for _, collection in self._scoped_containing([doc_id]):
+                collection.delete(where={"doc_id": doc_id})
+            self.generation += 1
 
 vector_store = VectorStoreService()
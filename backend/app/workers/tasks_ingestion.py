@@ -1 +1,197 @@
 # async jobs (Celery/RQ)
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.ingestion import ingestion_service
+from app.services.vector_store import vector_store
+
+class IngestionJob(BaseModel):
+    id: str
+    doc_id: str
+    filename: str
+    status: str = "queued"  # queued -> running -> completed | failed; queued -> cancelled
+    # Re-upload of an indexed document: only changed chunks are embedded
+    incremental: bool = False
+    pages_done: int = 0
+    chunks_done: int = 0
+    chunks_embedded: int = 0
+    chunks_removed: int = 0
+    retries: int = 0
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+class QueueFullError(Exception):
+    pass
+
+class IngestionJobQueue:
+    """
+    In-process ingestion job queue: no broker needed.
+
+    Uploads are spooled to disk and enqueued; INGEST_WORKERS coroutines run
+    the ingestion pipeline, so at most that many documents are processed at
+    once no matter how many arrive together. Extraction and storage run on
+    threads inside the pipeline, which keeps the event loop (and chat) free.
+    Jobs live in memory; a restart loses queued jobs along with their
+    spooled files. Jobs for the same document run one after another.
+    """
+    def __init__(self):
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        # doc_id -> [lock, jobs holding or waiting for it]
+        self._doc_locks: Dict[str, list] = {}
+        self._callbacks: Dict[str, Callable[[IngestionJob], None]] = {}
+        self._paths: Dict[str, str] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._doc_locks = {}
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(settings.INGEST_WORKERS)]
+        # Jobs queued on a previous loop (e.g. a finished test client) are re-queued
+        for job in self.jobs.values():
+            if job.status in ("queued", "running"):
+                job.status = "queued"
+                self._queue.put_nowait(job.id)
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, path: str, filename: str, doc_id: str, on_finished: Optional[Callable[[IngestionJob], None]] = None, incremental: bool = False) -> IngestionJob:
+        self.start()
+        pending = sum(1 for job in self.jobs.values() if job.status in ("queued", "running"))
+        if pending >= settings.INGEST_MAX_PENDING_JOBS:
+            raise QueueFullError("Too many documents are being processed, try again later")
+
+        job = IngestionJob(id=str(uuid.uuid4()), doc_id=doc_id, filename=filename, incremental=incremental, created_at=time.time())
+        self.jobs[job.id] = job
+        self._paths[job.id] = path
+        if on_finished:
+            self._callbacks[job.id] = on_finished
+        self._queue.put_nowait(job.id)
+        self._trim_history()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def cancel_queued(self, doc_id: str) -> int:
+        """Cancel doc_id's jobs that haven't started; their spooled files are removed and callbacks dropped."""
+        cancelled = 0
+        for job in list(self.jobs.values()):
+            if job.doc_id != doc_id or job.status != "queued":
+                continue
+            job.status = "cancelled"
+            job.finished_at = time.time()
+            self._callbacks.pop(job.id, None)
+            path = self._paths.pop(job.id, None)
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            cancelled += 1
+        return cancelled
+
+    @asynccontextmanager
+    async def document_lock(self, doc_id: str) -> AsyncIterator[None]:
+        """Hold doc_id's lock: waits for its running job, and none starts inside the block."""
+        entry = self._doc_locks.setdefault(doc_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and self._doc_locks.get(doc_id) is entry:
+                del self._doc_locks[doc_id]
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in ("completed", "failed", "cancelled")]
+        for job_id in finished[:max(0, len(finished) - settings.INGEST_JOB_HISTORY)]:
+            del self.jobs[job_id]
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.status != "queued":
+                continue
+            async with self.document_lock(job.doc_id):
+                # Cancelled while waiting for an earlier job of the document
+                if job.status == "queued":
+                    await self._run(job)
+
+    async def _run(self, job: IngestionJob):
+        job.status = "running"
+        job.started_at = time.time()
+        path = self._paths[job.id]
+
+        def progress(pages: int, chunks: int):
+            job.pages_done = pages
+            job.chunks_done = chunks
+
+        def retried():
+            job.retries += 1
+
+        try:
+            stats = await ingestion_service.ingest(path, job.filename, job.doc_id, progress=progress, on_retry=retried, incremental=job.incremental)
+            job.pages_done = stats["pages"]
+            job.chunks_done = stats["chunks"]
+            job.chunks_embedded = stats["embedded"]
+            job.chunks_removed = stats["removed"]
+            job.status = "completed"
+        except asyncio.CancelledError:
+            # Shutting down mid-job: leave it queued for the next start()
+            job.status = "queued"
+            if not job.incremental:
+                await asyncio.to_thread(vector_store.delete_document, job.doc_id)
+            raise
+        except Exception as e:
+            print(f"Ingestion job {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+            # Don't leave a half-ingested document behind. A failed update
+            # has already rolled back to the previous version.
+            if not job.incremental:
+                await asyncio.to_thread(vector_store.delete_document, job.doc_id)
+
+        job.finished_at = time.time()
+        ingest_job_seconds.observe(job.finished_at - job.started_at, job.status)
+        ingest_chunks.inc(job.chunks_done, "processed")
+        ingest_chunks.inc(job.chunks_embedded, "embedded")
+        self._paths.pop(job.id, None)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        callback = self._callbacks.pop(job.id, None)
+        if callback:
+            # Callbacks write to the document registry: keep them off the loop
+            try:
+                await asyncio.to_thread(callback, job)
+            except Exception as e:
+                print(f"Ingestion job {job.id} callback failed: {e}")
+
+ingest_job_seconds = metrics.histogram("ingest_job_duration_seconds", "Ingestion job run time", ("status",))
+ingest_chunks = metrics.counter("ingest_chunks", "Chunks processed by ingestion jobs (embedded: newly embedded)", ("kind",))
+
+ingestion_jobs = IngestionJobQueue()
@@ -0,0 +1,119 @@
+"""
+Agent-scoped retrieval on a large shared corpus: latency and recall@k of
+
+- unfiltered: the whole knowledge_base (what every agent used to search),
+- filtered:   the shared collection with a doc_id $in pre-filter,
+- dedicated:  a per-agent collection holding only the agent's chunks.
+
+Recall is measured against an exact (brute-force) top-k over the agent's own
+chunks. Each document's chunks are clustered around their own centroid
+(clusters overlap, as topics do in a real shared corpus), and queries are
+drawn near one of the agent's documents. in_scope is the share of returned
+chunks that belong to the agent at all.
+
+    python -m benchmarks.bench_agent_scoping --docs 200 --chunks-per-doc 200 --agents 50
+"""
+import os
+import tempfile
+
+os.environ.setdefault("CHROMA_DB_DIR", tempfile.mkdtemp(prefix="bench_scoping_"))
+
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+
+from app.services.vector_store import vector_store
+
+# Spread of document centroids relative to the within-document noise
+CENTROID_SCALE = 0.15
+
+def build_corpus(n_docs: int, chunks_per_doc: int, dim: int, rng: np.random.Generator):
+    centroids = rng.normal(scale=CENTROID_SCALE, size=(n_docs, dim)).astype(np.float32)
+    vectors = np.repeat(centroids, chunks_per_doc, axis=0) + rng.normal(size=(n_docs * chunks_per_doc, dim)).astype(np.float32)
+    doc_of = np.repeat(np.arange(n_docs), chunks_per_doc)
+    batch = 5000
+    for start in range(0, len(vectors), batch):
+        end = min(start + batch, len(vectors))
+        vector_store.add_documents(
+            documents=[f"chunk {i}" for i in range(start, end)],
+            metadatas=[{"doc_id": f"doc{doc_of[i]}", "chunk_index": int(i % chunks_per_doc)} for i in range(start, end)],
+            ids=[f"doc{doc_of[i]}_{i % chunks_per_doc}" for i in range(start, end)],
+            embeddings=vectors[start:end].tolist()
+        )
+    return centroids, vectors, doc_of
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+def run(args):
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    centroids, vectors, doc_of = build_corpus(args.docs, args.chunks_per_doc, args.dim, rng)
+    print(f"corpus: {len(vectors)} chunks in {args.docs} docs, dim={args.dim} (built in {time.perf_counter() - start:.1f}s)")
+
+    agents = [sorted(rng.choice(args.docs, size=args.docs_per_agent, replace=False).tolist()) for _ in range(args.agents)]
+    start = time.perf_counter()
+    for docs in agents:
+        vector_store.ensure_scoped_collection([f"doc{d}" for d in docs])
+    print(f"dedicated collections for {args.agents} agents built in {time.perf_counter() - start:.1f}s")
+    # Load every index once so the timings below are warm
+    for docs in agents:
+        vector_store.query(centroids[docs[0]].tolist(), args.k, [f"doc{d}" for d in docs])
+
+    modes = {"unfiltered": [], "filtered": [], "dedicated": []}
+    recalls = {mode: [] for mode in modes}
+    in_scope = {mode: [] for mode in modes}
+    k = args.k
+    for q in range(args.queries):
+        docs = agents[q % len(agents)]
+        doc_ids = [f"doc{d}" for d in docs]
+        query = centroids[docs[q % len(docs)]] + rng.normal(size=args.dim).astype(np.float32)
+
+        own = np.flatnonzero(np.isin(doc_of, docs))
+        distances = ((vectors[own] - query) ** 2).sum(axis=1)
+        truth = {f"doc{doc_of[i]}_{i % args.chunks_per_doc}" for i in own[np.argsort(distances)[:k]]}
+
+        for mode in modes:
+            t0 = time.perf_counter()
+            if mode == "unfiltered":
+                result = vector_store.collection.query(query_embeddings=[query.tolist()], n_results=k)
+            elif mode == "filtered":
+                result = vector_store.collection.query(query_embeddings=[query.tolist()], n_results=k, where=vector_store._doc_filter(doc_ids))
+            else:
+                result = vector_store.query(query.tolist(), k, doc_ids)
+            modes[mode].append((time.perf_counter() - t0) * 1000)
+            recalls[mode].append(len(truth & set(result["ids"][0])) / k)
+            in_scope[mode].append(sum(meta["doc_id"] in doc_ids for meta in result["metadatas"][0]) / k)
+
+    results = {"chunks": len(vectors), "docs": args.docs, "agents": args.agents, "docs_per_agent": args.docs_per_agent, "k": k}
+    for mode, latencies in modes.items():
+        row = {
+            "p50_ms": statistics.median(latencies),
+            "p95_ms": percentile(latencies, 0.95),
+            "recall_at_k": statistics.mean(recalls[mode]),
+            "in_scope": statistics.mean(in_scope[mode]),
+        }
+        results[mode] = row
+        print(f"{mode:>10}: p50={row['p50_ms']:7.2f} ms  p95={row['p95_ms']:7.2f} ms  recall@{k}={row['recall_at_k']:.3f}  in_scope={row['in_scope']:.3f}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--chunks-per-doc", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--agents", type=int, default=50)
+    parser.add_argument("--docs-per-agent", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
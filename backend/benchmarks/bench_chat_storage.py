@@ -0,0 +1,125 @@
+"""
+Chat history read latency and message insert throughput on a large chat
+database: the old per-call connection / no-index storage vs. the pooled,
+WAL-mode, indexed ChatStorageService, with and without write-behind.
+Insert throughput includes the final flush, so it counts durable rows.
+
+    python -m benchmarks.bench_chat_storage --messages 1000000 --sessions 50000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import uuid
+
+from app.services.chat_storage import ChatStorageService
+
+class LegacyChatStorage:
+    """The storage layer as it was: a fresh connection and commit per call."""
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, agent_id TEXT NOT NULL, title TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+        conn.execute("CREATE TABLE IF NOT EXISTS messages (id TEXT PRIMARY KEY, session_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, FOREIGN KEY (session_id) REFERENCES sessions (id))")
+        conn.commit()
+        conn.close()
+
+    def add_message(self, session_id: str, role: str, content: str):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO messages (id, session_id, role, content) VALUES (?, ?, ?, ?)", (str(uuid.uuid4()), session_id, role, content))
+        conn.commit()
+        conn.close()
+
+    def get_session_history(self, session_id: str):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute("SELECT role, content, created_at FROM messages WHERE session_id = ? ORDER BY created_at ASC", (session_id,)).fetchall()
+        conn.close()
+        return rows
+
+def fill(db_path: str, n_messages: int, n_sessions: int):
+    sessions = [str(uuid.uuid4()) for _ in range(n_sessions)]
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO sessions (id, agent_id, title, created_at) VALUES (?, ?, ?, ?)",
+        ((sid, f"agent-{i % 100}", "bench", "2025-01-01 00:00:00") for i, sid in enumerate(sessions))
+    )
+    rng = random.Random(0)
+    batch = 100_000
+    for start in range(0, n_messages, batch):
+        conn.executemany(
+            "INSERT INTO messages (id, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+            (
+                (uuid.uuid4().hex, sessions[rng.randrange(n_sessions)], "user" if i % 2 else "assistant",
+                 "How do I reset my password? " * 4, f"2025-01-01 00:{(i // 60) % 60:02d}:{i % 60:02d}.{i % 1000000:06d}")
+                for i in range(start, min(start + batch, n_messages))
+            )
+        )
+        conn.commit()
+    conn.close()
+    return sessions
+
+def measure(storage, sessions, reads: int, writes: int):
+    rng = random.Random(1)
+    latencies = []
+    for _ in range(reads):
+        sid = sessions[rng.randrange(len(sessions))]
+        start = time.perf_counter()
+        storage.get_session_history(sid)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    write_latencies = []
+    start = time.perf_counter()
+    for i in range(writes):
+        t0 = time.perf_counter()
+        storage.add_message(sessions[i % len(sessions)], "user", "bench insert")
+        write_latencies.append((time.perf_counter() - t0) * 1000)
+    if hasattr(storage, "flush"):
+        storage.flush()
+    inserts_per_s = writes / (time.perf_counter() - start)
+    write_latencies.sort()
+    return {
+        "history_p50_ms": statistics.median(latencies),
+        "history_p99_ms": latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))],
+        "insert_p99_ms": write_latencies[min(len(write_latencies) - 1, int(0.99 * len(write_latencies)))],
+        "inserts_per_s": inserts_per_s,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=50_000)
+    parser.add_argument("--reads", type=int, default=200)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_chat_db_")
+    results = {"messages": args.messages, "sessions": args.sessions}
+    variants = (
+        ("legacy", LegacyChatStorage),
+        ("pooled", lambda path: ChatStorageService(path, write_behind=False)),
+        ("behind", lambda path: ChatStorageService(path, write_behind=True)),
+    )
+    for name, factory in variants:
+        db_path = os.path.join(workdir, f"{name}.db")
+        LegacyChatStorage(db_path)  # same base schema for both
+        start = time.perf_counter()
+        sessions = fill(db_path, args.messages, args.sessions)
+        fill_s = time.perf_counter() - start
+        storage = factory(db_path)  # ChatStorageService migrates (adds indexes) here
+        row = measure(storage, sessions, args.reads, args.writes)
+        row["fill_s"] = fill_s
+        print(f"{name:>7}: history p50={row['history_p50_ms']:7.2f} ms  p99={row['history_p99_ms']:7.2f} ms  "
+              f"inserts={row['inserts_per_s']:8.0f}/s  insert p99={row['insert_p99_ms']:6.3f} ms  (fill {fill_s:.1f}s)")
+        results[name] = row
+        if hasattr(storage, "close"):
+            storage.close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
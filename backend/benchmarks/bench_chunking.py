@@ -0,0 +1,102 @@
+"""
+Fixed 1000/200-character windows vs. the token chunker on a large
+support-manual-like document: chunks produced, chunk sizes in tokens
+(and how many exceed the embedding input limit), chunks cut mid-sentence,
+and chunker throughput.
+
+    python -m benchmarks.bench_chunking --mb 20 --target-tokens 256
+
+Tokens are counted with tiktoken if installed (else the ~4 chars/token
+estimate), or with a Hugging Face tokenizer.json via --tokenizer (what
+the local embedding backend uses).
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from app.core.tokens import count_tokens
+from app.services.chunking import TokenChunker
+from app.services.ingestion import ingestion_service
+
+def document(mb: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    vocab = (
+        "the a to your account password reset billing invoice refund login error device sync export "
+        "policy admin settings click select open menu contact support team within days request"
+    ).split()
+    parts, size = [], 0
+    section = 0
+    while size < mb * 1_000_000:
+        section += 1
+        heading = f"Section {section}: {rng.choice(vocab).title()} {rng.choice(vocab)}\n\n"
+        body = []
+        for _ in range(rng.randint(2, 6)):
+            sentences = [
+                " ".join(rng.choice(vocab) for _ in range(rng.randint(6, 24))).capitalize() + rng.choice([".", ".", ".", "?", "!"])
+                for _ in range(rng.randint(1, 7))
+            ]
+            body.append(" ".join(sentences))
+        if rng.random() < 0.3:
+            body.append("\n".join(f"- {rng.choice(vocab)} {rng.choice(vocab)} ERR-{rng.randint(1000, 9999)}" for _ in range(rng.randint(3, 8))))
+        text = heading + "\n\n".join(body) + "\n\n"
+        parts.append(text)
+        size += len(text)
+    return "".join(parts)
+
+def pages_of(text: str, page_chars: int = 3000):
+    return [text[i:i + page_chars] for i in range(0, len(text), page_chars)]
+
+def measure(name: str, chunk_fn, pages, count, limit: int):
+    start = time.perf_counter()
+    chunks = list(chunk_fn(pages))
+    seconds = time.perf_counter() - start
+    tokens = [count(text) for text in chunks]
+    mid_sentence = sum(1 for text in chunks if not text.rstrip().endswith((".", "?", "!", ":")) and not text.endswith("\n"))
+    total_chars = sum(len(p) for p in pages)
+    result = {
+        "chunks": len(chunks),
+        "chunker_mb_per_s": total_chars / 1e6 / seconds,
+        "avg_tokens": statistics.mean(tokens),
+        "max_tokens": max(tokens),
+        "over_limit": sum(1 for t in tokens if t > limit),
+        "mid_sentence_cuts": mid_sentence,
+        "stored_chars": sum(len(text) for text in chunks),
+    }
+    print(
+        f"{name:>6}: {result['chunks']:7d} chunks  {result['chunker_mb_per_s']:6.2f} MB/s  "
+        f"tokens avg {result['avg_tokens']:5.0f} max {result['max_tokens']:5d}  over {limit}: {result['over_limit']:6d}  "
+        f"mid-sentence: {result['mid_sentence_cuts']:6d}  stored chars: {result['stored_chars'] / total_chars:.2f}x"
+    )
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, default=20.0)
+    parser.add_argument("--target-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=32)
+    parser.add_argument("--tokenizer", help="tokenizer.json to count tokens with")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    count, count_batch = count_tokens, None
+    if args.tokenizer:
+        from tokenizers import Tokenizer
+        tokenizer = Tokenizer.from_file(args.tokenizer)
+        count = lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+        count_batch = lambda texts: [len(e.ids) for e in tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+    pages = pages_of(document(args.mb))
+    print(f"document: {args.mb} MB in {len(pages)} pages")
+    chunker = TokenChunker(args.target_tokens, args.overlap_tokens, count, count_batch)
+    results = {
+        "mb": args.mb,
+        "target_tokens": args.target_tokens,
+        "fixed": measure("fixed", ingestion_service.iter_chunks, pages, count, args.target_tokens),
+        "tokens": measure("tokens", lambda p: (c.text for c in chunker.iter_chunks(p)), pages, count, args.target_tokens),
+    }
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
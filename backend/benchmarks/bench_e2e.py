@@ -0,0 +1,438 @@
+"""
+End-to-end load test of the API with local stand-ins for every external
+service, for catching performance regressions before they ship.
+
+    python -m benchmarks.bench_e2e --profile small --json results.json
+    python -m benchmarks.bench_e2e --profile small --baseline benchmarks/baselines/e2e_small.json
+
+Starts the mock OpenAI server (--llm-latency-ms to the first token, then
+--tokens-per-second) and the API in subprocesses, in a throwaway working
+directory. Embeddings come from the deterministic hash backend (or, with
+--embeddings mock, from the mock server over HTTP). Then, in order:
+
+- kb_ingest:   upload a synthetic knowledge base of --kb-docs text documents
+               (seeded, --kb-doc-words each) and wait until all are indexed
+- chat:        POST /chat/ with questions about the KB; --turns per session
+- chat_stream: POST /chat/stream; also time to the first token (ttfb_ms)
+- upload:      small uploads, each timed until its ingestion job finishes
+- history:     session history and session list pages
+
+Each workload runs --concurrency clients and reports throughput, latency
+percentiles, error rate and the server's peak RSS during it (sampled from
+/proc every 50 ms, Linux only). The suite runs --repeat times against fresh
+servers and each metric is the median. Results are JSON; --baseline compares them
+with a stored run (benchmarks/compare.py) and exits 1 on a regression,
+--save-baseline stores this run as the new baseline. Baselines are only
+comparable on the same machine and settings.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.compare import check
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    "small": {"kb_docs": 20, "kb_doc_words": 1500, "chat_requests": 80, "stream_requests": 80, "upload_requests": 24, "history_requests": 400, "concurrency": 8},
+    "medium": {"kb_docs": 200, "kb_doc_words": 3000, "chat_requests": 400, "stream_requests": 400, "upload_requests": 50, "history_requests": 2000, "concurrency": 32},
+}
+
+# Options that don't change what is measured; left out of the stored config
+RUN_OPTIONS = ("json", "baseline", "save_baseline", "tolerance", "memory_tolerance", "keep_workdir")
+
+WORDS = (
+    "account password reset billing invoice refund login error device sync export policy admin "
+    "settings click select open menu contact support team within days request vpn laptop access "
+    "printer network email calendar license install update restart browser certificate token mfa"
+).split()
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def at(q: float) -> float:
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    return {
+        "p50": at(0.50), "p90": at(0.90), "p95": at(0.95), "p99": at(0.99),
+        "max": values[-1], "mean": sum(values) / len(values),
+    }
+
+def synthetic_document(rng: random.Random, index: int, words: int) -> str:
+    """Support-article-like text; each document has its own error code and topic words for retrieval to find."""
+    topic = rng.sample(WORDS, 3)
+    sentences = []
+    for _ in range(words // 12):
+        sentence = [rng.choice(WORDS) for _ in range(11)] + [rng.choice(topic)]
+        rng.shuffle(sentence)
+        sentences.append(" ".join(sentence).capitalize() + ".")
+    sentences.insert(0, f"Article {index}: error E-{index:05d} ({' '.join(topic)}).")
+    return " ".join(sentences)
+
+def question(rng: random.Random, n_docs: int) -> str:
+    index = rng.randrange(n_docs)
+    return f"How do I fix error E-{index:05d} with my {rng.choice(WORDS)} {rng.choice(WORDS)}?"
+
+class RssSampler:
+    """Peak resident set size of a process, polled from /proc (None elsewhere)."""
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.path = f"/proc/{pid}/status"
+        self.interval = interval
+        self.peak_kb = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def _rss_kb(self) -> Optional[int]:
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            return None
+        return None
+
+    async def _run(self):
+        while True:
+            rss = self._rss_kb()
+            if rss is None:
+                return
+            self.peak_kb = max(self.peak_kb, rss)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.peak_kb = 0
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> Optional[float]:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        rss = self._rss_kb()
+        if rss is not None:
+            self.peak_kb = max(self.peak_kb, rss)
+        return round(self.peak_kb / 1024, 1) if self.peak_kb else None
+
+async def run_workload(name: str, request: Callable[[int], Awaitable[Optional[float]]], n: int, concurrency: int, sampler: RssSampler) -> Dict[str, Any]:
+    """
+    Run request(i) for i in range(n) on `concurrency` clients. A request
+    may return a time-to-first-token in ms, reported as ttfb_ms.
+    """
+    latencies: List[float] = []
+    ttfbs: List[float] = []
+    errors = 0
+    counter = iter(range(n))
+
+    async def client():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                ttfb = await request(i)
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    print(f"{name} request {i} failed: {e!r}")
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            if ttfb is not None:
+                ttfbs.append(ttfb)
+
+    sampler.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    peak_rss_mb = await sampler.stop()
+
+    row = {
+        "requests": n,
+        "errors": errors,
+        "error_rate": errors / n if n else 0.0,
+        "duration_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": percentiles(latencies),
+        "peak_rss_mb": peak_rss_mb,
+    }
+    if ttfbs:
+        row["ttfb_ms"] = percentiles(ttfbs)
+    latency = row["latency_ms"]
+    print(
+        f"{name:>12}: {row['throughput_rps']:7.1f} req/s  p50 {latency.get('p50', 0):7.1f} ms  "
+        f"p95 {latency.get('p95', 0):7.1f} ms  p99 {latency.get('p99', 0):7.1f} ms  "
+        f"errors {errors}  peak RSS {peak_rss_mb} MB"
+    )
+    return row
+
+async def wait_for_job(client: httpx.AsyncClient, job_id: str, poll_seconds: float = 0.05, timeout: float = 600) -> Dict[str, Any]:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        job = (await client.get(f"/api/v1/documents/jobs/{job_id}")).json()
+        if job["status"] == "completed":
+            return job
+        if job["status"] == "failed":
+            raise RuntimeError(f"Ingestion job {job_id} failed: {job['error']}")
+        await asyncio.sleep(poll_seconds)
+    raise TimeoutError(f"Ingestion job {job_id} did not finish in {timeout}s")
+
+async def upload_and_wait(client: httpx.AsyncClient, filename: str, text: str) -> Dict[str, Any]:
+    response = await client.post("/api/v1/documents/upload", files={"file": (filename, text.encode("utf-8"), "text/plain")})
+    response.raise_for_status()
+    doc = response.json()
+    job = await wait_for_job(client, doc["job_id"])
+    return {"doc_id": doc["id"], "chunks": job["chunks_done"]}
+
+async def stream_chat(client: httpx.AsyncClient, payload: Dict[str, Any]) -> Optional[float]:
+    start = time.perf_counter()
+    ttfb = None
+    event = None
+    async with client.stream("POST", "/api/v1/chat/stream", json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+                if event == "token" and ttfb is None:
+                    ttfb = (time.perf_counter() - start) * 1000
+                elif event == "error":
+                    raise RuntimeError("stream ended with an error event")
+    if event != "done":
+        raise RuntimeError(f"stream ended without a done event (last: {event})")
+    return ttfb
+
+async def run_suite(base_url: str, server_pid: int, args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    sampler = RssSampler(server_pid)
+    workloads: Dict[str, Any] = {}
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        # Knowledge base
+        documents = [synthetic_document(rng, i, args.kb_doc_words) for i in range(args.kb_docs)]
+        ingested: List[Dict[str, Any]] = [None] * args.kb_docs
+
+        async def ingest(i: int):
+            ingested[i] = await upload_and_wait(client, f"kb_{i:05d}.txt", documents[i])
+
+        workloads["kb_ingest"] = await run_workload("kb_ingest", ingest, args.kb_docs, args.concurrency, sampler)
+        chunks = sum(doc["chunks"] for doc in ingested if doc)
+        workloads["kb_ingest"]["chunks"] = chunks
+        workloads["kb_ingest"]["chunks_per_s"] = chunks / workloads["kb_ingest"]["duration_s"]
+        doc_ids = [doc["doc_id"] for doc in ingested if doc]
+
+        agent = (await client.post("/api/v1/agents/", json={
+            "name": "bench", "model": "mock", "system_prompt": "Answer from the articles.", "document_ids": doc_ids,
+        })).json()
+
+        # Sessions are reused for --turns consecutive requests, so later
+        # turns carry history
+        sessions: Dict[int, str] = {}
+        questions = [question(rng, args.kb_docs) for _ in range(max(args.chat_requests, args.stream_requests))]
+
+        async def chat(i: int):
+            payload = {"agent_id": agent["id"], "message": questions[i], "session_id": sessions.get(i // args.turns)}
+            response = await client.post("/api/v1/chat/", json=payload)
+            response.raise_for_status()
+            sessions.setdefault(i // args.turns, response.json()["session_id"])
+
+        workloads["chat"] = await run_workload("chat", chat, args.chat_requests, args.concurrency, sampler)
+
+        async def chat_stream(i: int):
+            return await stream_chat(client, {"agent_id": agent["id"], "message": questions[i]})
+
+        workloads["chat_stream"] = await run_workload("chat_stream", chat_stream, args.stream_requests, args.concurrency, sampler)
+
+        small_docs = [synthetic_document(rng, args.kb_docs + i, max(50, args.kb_doc_words // 10)) for i in range(args.upload_requests)]
+
+        async def upload(i: int):
+            await upload_and_wait(client, f"upload_{i:05d}.txt", small_docs[i])
+
+        workloads["upload"] = await run_workload("upload", upload, args.upload_requests, args.concurrency, sampler)
+
+        session_ids = list(sessions.values()) or [None]
+
+        async def history(i: int):
+            if i % 4 == 0:
+                response = await client.get(f"/api/v1/chat/sessions/{agent['id']}", params={"limit": 50})
+            else:
+                response = await client.get(f"/api/v1/chat/history/{session_ids[i % len(session_ids)]}", params={"limit": 50})
+            response.raise_for_status()
+
+        workloads["history"] = await run_workload("history", history, args.history_requests, args.concurrency, sampler)
+
+    return workloads
+
+def server_peak_rss_mb(pid: int) -> Optional[float]:
+    """VmHWM: the process's own high-water mark since start."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} during startup")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError(f"{url} did not come up in {timeout}s")
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_once(args) -> Dict[str, Any]:
+    """One pass of the suite against fresh servers and an empty working directory."""
+    # Parent of the API's working directory: chat_storage writes the
+    # fine-tuning log to ../ml/data/raw
+    root = tempfile.mkdtemp(prefix="bench_e2e_")
+    workdir = os.path.join(root, "backend")
+    os.makedirs(workdir)
+    mock_port, api_port = free_port(), free_port()
+    env = dict(
+        os.environ,
+        PYTHONPATH=BACKEND_DIR,
+        OPENAI_API_KEY="mock",
+        OPENAI_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+        EMBEDDING_BACKEND="openai" if args.embeddings == "mock" else "hash",
+        HASH_EMBEDDING_DIM=str(args.embedding_dim),
+        VECTOR_STORE_BACKEND=args.vector_store,
+        SLOW_REQUEST_MS="1e9",
+    )
+    processes = []
+    log = open(os.path.join(root, "servers.log"), "w")
+    try:
+        processes.append(subprocess.Popen([
+            sys.executable, "-m", "benchmarks.mock_openai_server", "--port", str(mock_port),
+            "--latency-ms", str(args.llm_latency_ms), "--tokens-per-second", str(args.tokens_per_second),
+            "--completion-tokens", str(args.completion_tokens), "--embedding-dim", str(args.embedding_dim),
+            "--embedding-latency-ms", str(args.embedding_latency_ms),
+        ], cwd=BACKEND_DIR, stdout=log, stderr=subprocess.STDOUT))
+        wait_until_up(f"http://127.0.0.1:{mock_port}/docs", processes[0])
+
+        api = subprocess.Popen([
+            sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(api_port), "--log-level", "warning",
+        ], cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        processes.append(api)
+        base_url = f"http://127.0.0.1:{api_port}"
+        wait_until_up(base_url + "/health", api)
+
+        workloads = asyncio.run(run_suite(base_url, api.pid, args))
+        return {"workloads": workloads, "server_peak_rss_mb": server_peak_rss_mb(api.pid)}
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        log.close()
+        if args.keep_workdir:
+            print(f"Working directory and server logs kept in {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+def median_of(values: List[Any]) -> Any:
+    """Element-wise median of equally shaped results (nested dicts of numbers)."""
+    first = values[0]
+    if isinstance(first, dict):
+        return {key: median_of([value[key] for value in values]) for key in first}
+    if isinstance(first, (int, float)) and not isinstance(first, bool):
+        return statistics.median(values)
+    return first
+
+def main(args) -> Dict[str, Any]:
+    """
+    The suite run --repeat times, each metric the median over runs, which
+    keeps run-to-run noise on a busy or single-core machine below the
+    comparison tolerance.
+    """
+    started = time.perf_counter()
+    runs = []
+    for run in range(args.repeat):
+        if args.repeat > 1:
+            print(f"Run {run + 1}/{args.repeat}")
+        runs.append(run_once(args))
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "total_s": time.perf_counter() - started,
+            "server_peak_rss_mb": max((run["server_peak_rss_mb"] or 0) for run in runs) or None,
+        },
+        "config": {key: value for key, value in vars(args).items() if key not in RUN_OPTIONS},
+        "workloads": median_of([run["workloads"] for run in runs]),
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small", help="Workload sizes; the options below override it")
+    for name in PROFILES["small"]:
+        parser.add_argument("--" + name.replace("_", "-"), type=int, default=None)
+    parser.add_argument("--turns", type=int, default=3, help="Chat requests per session")
+    parser.add_argument("--llm-latency-ms", type=float, default=100.0)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=50)
+    parser.add_argument("--embeddings", choices=["hash", "mock"], default="hash", help="In-process hash embeddings, or the mock server's /embeddings")
+    parser.add_argument("--embedding-dim", type=int, default=384)
+    parser.add_argument("--embedding-latency-ms", type=float, default=20.0)
+    parser.add_argument("--vector-store", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of the whole suite; metrics are the median")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare with this result file; exit 1 on a regression")
+    parser.add_argument("--save-baseline", help="Also write the results to this file")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--memory-tolerance", type=float, default=0.25)
+    parser.add_argument("--keep-workdir", action="store_true")
+    args = parser.parse_args(argv)
+    for name, value in PROFILES[args.profile].items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = main(args)
+    for path in (args.json, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not check(results, baseline, args.tolerance, args.memory_tolerance):
+            sys.exit(1)
@@ -0,0 +1,74 @@
+"""
+Embedding latency for a first ingest vs. a near-identical re-ingest with the
+content-addressed embedding cache, against the local mock OpenAI server.
+
+    python -m benchmarks.bench_embedding_cache --chunks 4000 --changed 0.02
+
+The re-ingest is run twice: once with the warm in-process LRU and once after
+dropping it, so the SQLite tier (what a restarted worker sees) is measured too.
+"""
+import os
+import tempfile
+
+os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench_cache_"), "embedding_cache.db"))
+
+import argparse
+import asyncio
+import json
+import time
+
+from app.core.config import settings
+from app.services.embedding import embedding_service
+from app.services.llm_service import llm_service
+from benchmarks.bench_ingest_embeddings import synthetic_chunks
+from benchmarks.mock_openai_server import MockConfig, serve_in_thread
+
+async def timed_ingest(chunks):
+    start = time.perf_counter()
+    await embedding_service.get_embeddings(chunks)
+    return time.perf_counter() - start
+
+async def bench(n_chunks: int, changed: float):
+    chunks = synthetic_chunks(n_chunks)
+    step = max(1, int(1 / changed)) if changed else n_chunks + 1
+    revised = [chunk + " (revised)" if i % step == 0 else chunk for i, chunk in enumerate(chunks)]
+
+    cold = await timed_ingest(chunks)
+    warm_memory = await timed_ingest(revised)
+    embedding_service.cache._memory.clear()
+    warm_disk = await timed_ingest(chunks)
+
+    await llm_service.aclose()
+    stats = embedding_service.cache.stats()
+    print(f"chunks={n_chunks} changed={changed:.0%}")
+    print(f"cold ingest:            {cold * 1000:8.1f} ms")
+    print(f"re-ingest (memory LRU): {warm_memory * 1000:8.1f} ms  ({cold / warm_memory:.1f}x)")
+    print(f"re-ingest (disk tier):  {warm_disk * 1000:8.1f} ms  ({cold / warm_disk:.1f}x)")
+    print(f"cache: {stats}")
+    return {"chunks": n_chunks, "changed": changed, "cold_ms": cold * 1000, "memory_ms": warm_memory * 1000, "disk_ms": warm_disk * 1000, "cache": stats}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=4000)
+    parser.add_argument("--changed", type=float, default=0.02)
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--ms-per-input", type=float, default=0.5)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        embedding_dim=args.embedding_dim,
+        embedding_latency_ms=args.latency_ms,
+        embedding_ms_per_input=args.ms_per_input,
+    )
+    with serve_in_thread(config, port=args.port) as base_url:
+        settings.OPENAI_BASE_URL = base_url
+        settings.OPENAI_API_KEY = "mock"
+        settings.EMBEDDING_BATCH_SIZE = 256
+        results = asyncio.run(bench(args.chunks, args.changed))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
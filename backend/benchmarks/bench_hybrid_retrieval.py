@@ -0,0 +1,114 @@
+"""
+Hybrid (BM25 + vector, RRF-fused) retrieval vs. vector-only on queries that
+name an exact identifier (error code / SKU / KB number), against the local
+mock OpenAI server for query embeddings.
+
+Reports how often the chunk carrying the identifier is in the top k, and the
+latency of vector-only, keyword-only, sequential vector+keyword and the
+concurrent hybrid path RetrievalService uses.
+
+    python -m benchmarks.bench_hybrid_retrieval --chunks 20000 --queries 200
+"""
+import os
+import tempfile
+
+os.environ.setdefault("CHROMA_DB_DIR", tempfile.mkdtemp(prefix="bench_hybrid_"))
+os.environ.setdefault("RETRIEVAL_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embedding import embedding_service
+from app.services.llm_service import llm_service
+from app.services.retrieval_service import retrieval_service
+from app.services.vector_store import vector_store
+from benchmarks.bench_ingest_embeddings import synthetic_chunks
+from benchmarks.mock_openai_server import MockConfig, mock_embedding, serve_in_thread
+
+def build_corpus(n_chunks: int, dim: int):
+    rng = random.Random(0)
+    chunks = synthetic_chunks(n_chunks, size=600)
+    identifiers = []
+    for i in range(n_chunks):
+        identifier = rng.choice(["ERR-{}", "SKU_{}", "KB{}"]).format(100000 + i)
+        identifiers.append(identifier)
+        chunks[i] = f"{chunks[i][:300]} see {identifier} {chunks[i][300:]}"
+    batch = 5000
+    for start in range(0, n_chunks, batch):
+        part = chunks[start:start + batch]
+        vector_store.add_documents(
+            documents=part,
+            metadatas=[{"doc_id": f"doc{(start + i) // 100}", "chunk_index": (start + i) % 100} for i in range(len(part))],
+            ids=[f"chunk{start + i}" for i in range(len(part))],
+            embeddings=[mock_embedding(text, dim).tolist() for text in part]
+        )
+    return identifiers
+
+async def bench(identifiers, n_queries: int, k: int):
+    rng = random.Random(1)
+    timings = {"vector": [], "keyword": [], "sequential": [], "hybrid": []}
+    found = {"vector": 0, "hybrid": 0}
+    for _ in range(n_queries):
+        target = rng.randrange(len(identifiers))
+        query = f"customer reports {identifiers[target]} when trying to log in"
+        expected = f"chunk{target}"
+
+        t0 = time.perf_counter()
+        embedding = await embedding_service.embed_query(query)
+        vector = await asyncio.to_thread(vector_store.query, embedding, k)
+        t1 = time.perf_counter()
+        await asyncio.to_thread(vector_store.lexical.search, query, k)
+        t2 = time.perf_counter()
+        timings["vector"].append((t1 - t0) * 1000)
+        timings["keyword"].append((t2 - t1) * 1000)
+        timings["sequential"].append((t2 - t0) * 1000)
+
+        t0 = time.perf_counter()
+        hybrid = await retrieval_service.retrieve(query, k)
+        timings["hybrid"].append((time.perf_counter() - t0) * 1000)
+
+        found["vector"] += expected in vector["ids"][0]
+        found["hybrid"] += expected in hybrid["ids"][0]
+    await llm_service.aclose()
+
+    results = {"queries": n_queries, "k": k}
+    for name, values in timings.items():
+        results[f"{name}_p50_ms"] = statistics.median(values)
+        print(f"{name:>10}: p50={statistics.median(values):7.2f} ms")
+    for name, hits in found.items():
+        results[f"{name}_hit_rate"] = hits / n_queries
+        print(f"{name:>10}: identifier chunk in top {k}: {hits / n_queries:.1%}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--embedding-dim", type=int, default=384)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    identifiers = build_corpus(args.chunks, args.embedding_dim)
+    print(f"corpus: {args.chunks} chunks (built in {time.perf_counter() - start:.1f}s)")
+
+    config = MockConfig(embedding_dim=args.embedding_dim, embedding_latency_ms=args.latency_ms)
+    with serve_in_thread(config, port=args.port) as base_url:
+        settings.OPENAI_BASE_URL = base_url
+        settings.OPENAI_API_KEY = "mock"
+        results = asyncio.run(bench(identifiers, args.queries, args.k))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
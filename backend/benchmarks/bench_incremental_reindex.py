@@ -0,0 +1,99 @@
+"""
+Re-ingesting an updated document: full re-index vs. the incremental path
+(content-addressed chunk ids, only changed chunks embedded).
+
+A manual of --lines lines is ingested, then a new version is produced by
+editing --changed-pct percent of its lines in place (same length, like a
+fixed typo or number) in sections of 40 consecutive lines, the way a doc
+refresh rewrites a few sections, and re-ingested both ways. A third run
+edits the same lines but changes their length, which shifts every later
+fixed-size chunk boundary.
+
+    python -m benchmarks.bench_incremental_reindex --lines 50000 --changed-pct 2
+
+Embeddings come from the local mock OpenAI server (--latency-ms per
+request) and the NumPy vector store in a temp dir.
+"""
+import os
+import tempfile
+
+os.environ.setdefault("CHROMA_DB_DIR", tempfile.mkdtemp(prefix="bench_reindex_"))
+os.environ.setdefault("VECTOR_STORE_BACKEND", "numpy")
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+os.environ.setdefault("EMBEDDING_BACKEND", "openai")
+
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import time
+
+from app.core.config import settings
+from app.services.ingestion import ingestion_service
+from app.services.llm_service import llm_service
+from benchmarks.mock_openai_server import MockConfig, serve_in_thread
+
+def manual(n_lines: int):
+    rng = random.Random(0)
+    words = "reset password account billing invoice refund login error device sync export policy".split()
+    return [f"{i:06d} " + " ".join(rng.choice(words) for _ in range(8)) + "\n" for i in range(n_lines)]
+
+def edited(lines, pct: float, keep_length: bool, seed: int = 1, section: int = 40):
+    rng = random.Random(seed)
+    lines = list(lines)
+    sections = rng.sample(range(len(lines) // section), max(1, int(len(lines) * pct / 100) // section))
+    for i in (s * section + j for s in sections for j in range(section)):
+        line = lines[i]
+        lines[i] = line[:7] + line[7:-1].upper() + "\n" if keep_length else line[:-1] + " (updated)\n"
+    return lines
+
+async def ingest(path: str, lines, doc_id: str, incremental: bool):
+    with open(path, "w") as f:
+        f.writelines(lines)
+    start = time.perf_counter()
+    stats = await ingestion_service.ingest(path, "manual.txt", doc_id, incremental=incremental)
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+async def bench(n_lines: int, pct: float):
+    workdir = tempfile.mkdtemp(prefix="bench_reindex_files_")
+    path = os.path.join(workdir, "manual.txt")
+    v1 = manual(n_lines)
+    runs = {}
+    try:
+        runs["initial"] = await ingest(path, v1, "doc", incremental=False)
+        v2 = edited(v1, pct, keep_length=True)
+        # Full re-index: what an update cost before (new doc, every chunk embedded)
+        runs["full_reindex"] = await ingest(path, v2, "doc_full", incremental=False)
+        runs["incremental"] = await ingest(path, v2, "doc", incremental=True)
+        runs["incremental_shifting_edits"] = await ingest(path, edited(v2, pct, keep_length=False), "doc", incremental=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        await llm_service.aclose()
+    for name, stats in runs.items():
+        print(f"{name:>27}: {stats['seconds']:6.2f}s  chunks={stats['chunks']}  embedded={stats['embedded']}  removed={stats['removed']}")
+    return runs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=50000)
+    parser.add_argument("--changed-pct", type=float, default=2.0)
+    parser.add_argument("--embedding-dim", type=int, default=384)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    config = MockConfig(embedding_dim=args.embedding_dim, embedding_latency_ms=args.latency_ms)
+    with serve_in_thread(config, port=args.port) as base_url:
+        settings.OPENAI_BASE_URL = base_url
+        settings.OPENAI_API_KEY = "mock"
+        # Small requests so embedding cost scales with the chunks sent
+        settings.EMBEDDING_BATCH_SIZE = 64
+        results = asyncio.run(bench(args.lines, args.changed_pct))
+    shutil.rmtree(settings.CHROMA_DB_DIR, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
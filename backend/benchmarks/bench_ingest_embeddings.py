@@ -0,0 +1,114 @@
+"""
+Ingest throughput (chunks/sec) before and after wiring EmbeddingService into
+VectorStoreService, against the local mock OpenAI server.
+
+    python -m benchmarks.bench_ingest_embeddings --chunks 4000 --batch-size 256
+
+"before" reproduces the old upload path: the provider is called with batches
+one after another, the vectors are discarded and the store embeds every chunk
+a second time. Chroma's default model needs a download, so by default that
+second pass is stood in for by another sequential provider pass
+(--legacy-reembed chroma uses the real default embedding function).
+"after" sends batches concurrently (EMBEDDING_MAX_CONCURRENCY in flight) and
+stores the vectors it already has.
+"""
+import os
+import tempfile
+
+os.environ.setdefault("CHROMA_DB_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import chromadb
+
+from app.core.config import settings
+from app.services.embedding import embedding_service
+from app.services.llm_service import llm_service
+from app.services.vector_store import VectorStoreService
+from benchmarks.mock_openai_server import MockConfig, serve_in_thread
+
+def synthetic_chunks(n: int, size: int = 1000):
+    words = "password reset account billing invoice router firmware error code escalation policy".split()
+    return [
+        " ".join(words[(i * 7 + j) % len(words)] for j in range(size // 8))[:size] + f" #{i}"
+        for i in range(n)
+    ]
+
+async def legacy_ingest(chunks, reembed: str):
+    # Old path: batches sent sequentially, result thrown away, store re-embeds
+    for batch in embedding_service.backend._batches(chunks):
+        await embedding_service.backend._embed_batch(batch)
+
+    client = chromadb.PersistentClient(path=tempfile.mkdtemp(prefix="bench_legacy_"))
+    ids = [str(uuid.uuid4()) for _ in chunks]
+    if reembed == "chroma":
+        collection = client.get_or_create_collection(name="legacy_kb")
+        await asyncio.to_thread(collection.add, documents=chunks, ids=ids)
+    else:
+        embeddings = []
+        for batch in embedding_service.backend._batches(chunks):
+            embeddings.extend(await embedding_service.backend._embed_batch(batch))
+        collection = client.get_or_create_collection(name="legacy_kb", embedding_function=None)
+        await asyncio.to_thread(collection.add, documents=chunks, ids=ids, embeddings=embeddings)
+
+async def current_ingest(chunks, store: VectorStoreService):
+    embeddings = await embedding_service.get_embeddings(chunks)
+    doc_id = str(uuid.uuid4())
+    await asyncio.to_thread(
+        store.add_documents,
+        documents=chunks,
+        metadatas=[{"doc_id": doc_id, "chunk_index": i} for i in range(len(chunks))],
+        ids=[f"{doc_id}_{i}" for i in range(len(chunks))],
+        embeddings=embeddings,
+    )
+
+async def bench(n_chunks: int, reembed: str):
+    chunks = synthetic_chunks(n_chunks)
+    store = VectorStoreService()
+
+    start = time.perf_counter()
+    await legacy_ingest(chunks, reembed)
+    before = n_chunks / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await current_ingest(chunks, store)
+    after = n_chunks / (time.perf_counter() - start)
+
+    await llm_service.aclose()
+    print(f"chunks={n_chunks} batch_size={settings.EMBEDDING_BATCH_SIZE} concurrency={settings.EMBEDDING_MAX_CONCURRENCY}")
+    print(f"before: {before:8.1f} chunks/s")
+    print(f"after:  {after:8.1f} chunks/s  ({after / before:.1f}x)")
+    return {"chunks": n_chunks, "before_chunks_per_s": before, "after_chunks_per_s": after}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=4000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--ms-per-input", type=float, default=0.5)
+    parser.add_argument("--legacy-reembed", choices=["provider", "chroma"], default="provider")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        embedding_dim=args.embedding_dim,
+        embedding_latency_ms=args.latency_ms,
+        embedding_ms_per_input=args.ms_per_input,
+    )
+    with serve_in_thread(config, port=args.port) as base_url:
+        settings.OPENAI_BASE_URL = base_url
+        settings.OPENAI_API_KEY = "mock"
+        settings.EMBEDDING_BATCH_SIZE = args.batch_size
+        settings.EMBEDDING_MAX_CONCURRENCY = args.concurrency
+        results = asyncio.run(bench(args.chunks, args.legacy_reembed))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
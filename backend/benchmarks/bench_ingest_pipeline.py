@@ -0,0 +1,126 @@
+"""
+Peak memory and pages/sec for ingesting large synthetic PDFs, comparing the
+old whole-file path with the streaming pipeline.
+
+    python -m benchmarks.bench_ingest_pipeline --pages 100,300,600
+
+Each (mode, size) run happens in a fresh subprocess so ru_maxrss is that run's
+own high-water mark. Embeddings use the offline dummy vectors (no API key)
+and a throwaway Chroma directory, so the numbers isolate the ingest pipeline.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+LINE = "Reset your password from the account settings page. Error E-4021 means the token expired. "
+
+def make_pdf(path: str, pages: int, chars_per_page: int = 3000):
+    import fitz
+
+    doc = fitz.open()
+    lines = [LINE[i % len(LINE):] + LINE[:i % len(LINE)] for i in range(chars_per_page // 90)]
+    for p in range(pages):
+        page = doc.new_page()
+        y = 40
+        for i, line in enumerate(lines):
+            page.insert_text((30, y), f"p{p} {line}", fontsize=6)
+            y += 8
+    doc.save(path)
+    doc.close()
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_worker(mode: str, pdf: str):
+    import asyncio
+    import uuid
+    from app.services.embedding import embedding_service
+    from app.services.ingestion import ingestion_service
+    from app.services.vector_store import vector_store
+
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    doc_id = str(uuid.uuid4())
+
+    if mode == "legacy":
+        async def legacy():
+            with open(pdf, "rb") as f:
+                content = f.read()
+            import fitz
+            text = ""
+            for page in fitz.open(stream=content, filetype="pdf"):
+                text += page.get_text()
+            chunks = ingestion_service.chunk_text(text)
+            embeddings = await embedding_service.get_embeddings(chunks)
+            vector_store.add_documents(
+                documents=chunks,
+                metadatas=[{"doc_id": doc_id, "chunk_index": i} for i in range(len(chunks))],
+                ids=[f"{doc_id}_{i}" for i in range(len(chunks))],
+                embeddings=embeddings,
+            )
+            return len(chunks)
+        chunks = asyncio.run(legacy())
+    else:
+        chunks = asyncio.run(ingestion_service.ingest(pdf, os.path.basename(pdf), doc_id))["chunks"]
+
+    elapsed = time.perf_counter() - start
+    import fitz
+    with fitz.open(pdf) as doc:
+        pages = doc.page_count
+    print(json.dumps({
+        "mode": mode,
+        "pages": pages,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "pages_per_s": pages / elapsed,
+        "peak_rss_mb": _peak_rss_mb(),
+        "rss_growth_mb": _peak_rss_mb() - baseline,
+    }))
+
+def main(sizes, modes):
+    workdir = tempfile.mkdtemp(prefix="bench_ingest_")
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="",
+        EMBEDDING_CACHE_ENABLED="false",
+        PYTHONPATH=os.getcwd(),
+    )
+    results = []
+    for pages in sizes:
+        pdf = os.path.join(workdir, f"synthetic_{pages}.pdf")
+        make_pdf(pdf, pages)
+        for mode in modes:
+            env["CHROMA_DB_DIR"] = tempfile.mkdtemp(dir=workdir)
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_ingest_pipeline", "--worker", mode, "--pdf", pdf],
+                env=env, capture_output=True, text=True, check=True,
+            )
+            row = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{mode:>9} pages={row['pages']:>5} chunks={row['chunks']:>6} "
+                  f"{row['pages_per_s']:8.1f} pages/s  peak_rss={row['peak_rss_mb']:7.1f} MB  growth={row['rss_growth_mb']:6.1f} MB")
+            results.append(row)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", default="100,300,600")
+    parser.add_argument("--modes", default="legacy,streaming")
+    parser.add_argument("--worker", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.pdf)
+    else:
+        results = main([int(x) for x in args.pages.split(",")], args.modes.split(","))
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
@@ -0,0 +1,75 @@
+"""
+Chat completion throughput vs. concurrency against the local mock server.
+
+    python -m benchmarks.bench_llm_concurrency --latency-ms 200
+
+"async" goes through the shared LLMService pool; "blocking" calls the sync
+OpenAI client from inside a coroutine, which is what ChatService used to do.
+With a fixed provider latency the async path should scale roughly linearly
+with concurrency (up to LLM_MAX_CONCURRENCY) while the blocking path stays
+flat at ~1 / latency requests per second.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from openai import OpenAI
+
+from app.core.config import settings
+from app.services.llm_service import llm_service
+from benchmarks.mock_openai_server import MockConfig, serve_in_thread
+
+MESSAGES = [{"role": "user", "content": "How do I reset my password?"}]
+
+async def _run(concurrency: int, requests_per_worker: int, call) -> float:
+    async def worker():
+        for _ in range(requests_per_worker):
+            await call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return concurrency * requests_per_worker / elapsed
+
+async def bench(levels, requests_per_worker: int, base_url: str):
+    sync_client = OpenAI(api_key=settings.OPENAI_API_KEY, base_url=base_url)
+
+    async def async_call():
+        await llm_service.complete(model="mock", messages=MESSAGES)
+
+    async def blocking_call():
+        sync_client.chat.completions.create(model="mock", messages=MESSAGES)
+
+    # Warm up both connection pools so the first row isn't paying for setup
+    await async_call()
+    await blocking_call()
+
+    results = []
+    for concurrency in levels:
+        row = {"concurrency": concurrency}
+        row["async_rps"] = await _run(concurrency, requests_per_worker, async_call)
+        row["blocking_rps"] = await _run(concurrency, requests_per_worker, blocking_call)
+        print(f"c={concurrency:>4}  async={row['async_rps']:8.1f} req/s  blocking={row['blocking_rps']:8.1f} req/s")
+        results.append(row)
+    await llm_service.aclose()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--levels", default="1,4,16,64")
+    parser.add_argument("--requests-per-worker", type=int, default=3)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.levels.split(",")]
+    with serve_in_thread(MockConfig(latency_ms=args.latency_ms), port=args.port) as base_url:
+        settings.OPENAI_BASE_URL = base_url
+        settings.OPENAI_API_KEY = "mock"
+        results = asyncio.run(bench(levels, args.requests_per_worker, base_url))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency_ms": args.latency_ms, "results": results}, f, indent=2)
@@ -0,0 +1,145 @@
+"""
+CPU throughput of the local embedding backend: fp32 vs. int8 weights, batch
+sizes and intra-op thread counts, plus the hash fallback for reference.
+
+    python -m benchmarks.bench_local_embeddings --model-dir models/all-MiniLM-L6-v2
+
+Without --model-dir a synthetic encoder with MiniLM-L6 shapes (6 layers,
+hidden 384, FFN 1536, random weights) is generated, so the numbers reflect
+the compute of a real model even where none can be downloaded. Generating
+it needs the `onnx` package.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.embedding_backends import HashEmbeddingBackend, LocalEmbeddingBackend
+from benchmarks.bench_ingest_embeddings import synthetic_chunks
+
+def make_synthetic_model(model_dir: str, vocab_size: int = 30522, hidden: int = 384, layers: int = 6, intermediate: int = 1536, seed: int = 0):
+    """
+    Write model.onnx + tokenizer.json for a BERT-shaped encoder: token
+    embeddings followed by `layers` blocks of single-head self-attention
+    (padding masked out) and a ReLU feed-forward, each with a residual
+    connection.
+    """
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+    from tokenizers import Tokenizer, models, pre_tokenizers
+
+    rng = np.random.default_rng(seed)
+    scale = 1.0 / np.sqrt(hidden)
+    inits = [numpy_helper.from_array((rng.standard_normal((vocab_size, hidden)) * 0.1).astype(np.float32), "embeddings")]
+    inits += [
+        numpy_helper.from_array(np.array(1.0, dtype=np.float32), "one"),
+        numpy_helper.from_array(np.array(-1e4, dtype=np.float32), "neg"),
+        numpy_helper.from_array(np.array([1], dtype=np.int64), "axis1"),
+    ]
+    nodes = [
+        helper.make_node("Gather", ["embeddings", "input_ids"], ["h0"]),
+        # Additive attention bias: padding positions get -1e4 before softmax
+        helper.make_node("Cast", ["attention_mask"], ["mask_f"], to=TensorProto.FLOAT),
+        helper.make_node("Sub", ["one", "mask_f"], ["inv_mask"]),
+        helper.make_node("Mul", ["inv_mask", "neg"], ["bias2d"]),
+        helper.make_node("Unsqueeze", ["bias2d", "axis1"], ["bias"]),
+    ]
+
+    current = "h0"
+    for layer in range(layers):
+        p = f"l{layer}_"
+        for name, shape in (("wq", (hidden, hidden)), ("wk", (hidden, hidden)), ("wv", (hidden, hidden)), ("wo", (hidden, hidden)), ("w1", (hidden, intermediate)), ("w2", (intermediate, hidden))):
+            inits.append(numpy_helper.from_array((rng.standard_normal(shape) * scale).astype(np.float32), p + name))
+        nodes += [
+            helper.make_node("MatMul", [current, p + "wq"], [p + "q"]),
+            helper.make_node("MatMul", [current, p + "wk"], [p + "k"]),
+            helper.make_node("MatMul", [current, p + "wv"], [p + "v"]),
+            helper.make_node("Transpose", [p + "k"], [p + "kt"], perm=[0, 2, 1]),
+            helper.make_node("MatMul", [p + "q", p + "kt"], [p + "raw_scores"]),
+            helper.make_node("Add", [p + "raw_scores", "bias"], [p + "scores"]),
+            helper.make_node("Softmax", [p + "scores"], [p + "attn"], axis=-1),
+            helper.make_node("MatMul", [p + "attn", p + "v"], [p + "ctx"]),
+            helper.make_node("MatMul", [p + "ctx", p + "wo"], [p + "proj"]),
+            helper.make_node("Add", [current, p + "proj"], [p + "res1"]),
+            helper.make_node("MatMul", [p + "res1", p + "w1"], [p + "ff1"]),
+            helper.make_node("Relu", [p + "ff1"], [p + "act"]),
+            helper.make_node("MatMul", [p + "act", p + "w2"], [p + "ff2"]),
+            helper.make_node("Add", [p + "res1", p + "ff2"], [p + "out"]),
+        ]
+        current = p + "out"
+    nodes.append(helper.make_node("Identity", [current], ["last_hidden_state"]))
+
+    graph = helper.make_graph(
+        nodes,
+        "synthetic_encoder",
+        [
+            helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "sequence"]),
+            helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "sequence"]),
+        ],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "sequence", hidden])],
+        inits,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+    model.ir_version = 8
+    os.makedirs(model_dir, exist_ok=True)
+    onnx.save(model, os.path.join(model_dir, "model.onnx"))
+
+    words = sorted(set(" ".join(synthetic_chunks(50)).split()))
+    vocab = {"[PAD]": 0, "[UNK]": 1}
+    vocab.update({word: i + 2 for i, word in enumerate(words[:vocab_size - 2])})
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.save(os.path.join(model_dir, "tokenizer.json"))
+
+def throughput(backend, texts, repeats: int = 2) -> float:
+    backend.embed_sync(texts[:8])  # load the model / warm up
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        backend.embed_sync(texts)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-dir", help="model.onnx + tokenizer.json; a synthetic model is generated if omitted")
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--text-chars", type=int, default=600)
+    parser.add_argument("--max-length", type=int, default=128)
+    parser.add_argument("--threads", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    texts = synthetic_chunks(args.texts, size=args.text_chars)
+    workdir = None
+    model_dir = args.model_dir
+    if model_dir is None:
+        workdir = tempfile.mkdtemp(prefix="bench_local_embed_")
+        model_dir = os.path.join(workdir, "synthetic-minilm")
+        make_synthetic_model(model_dir)
+
+    results = {"texts": args.texts, "text_chars": args.text_chars, "max_length": args.max_length, "cpus": os.cpu_count(), "runs": []}
+    hash_rate = throughput(HashEmbeddingBackend(384), texts)
+    results["hash_texts_per_s"] = hash_rate
+    print(f"hash backend: {hash_rate:8.0f} texts/s")
+    try:
+        for quantize in (False, True):
+            for threads in args.threads:
+                for batch_size in args.batch_sizes:
+                    backend = LocalEmbeddingBackend(model_dir, quantize=quantize, threads=threads, batch_size=batch_size, max_length=args.max_length)
+                    rate = throughput(backend, texts)
+                    backend.close()
+                    results["runs"].append({"int8": quantize, "threads": threads, "batch_size": batch_size, "texts_per_s": rate})
+                    print(f"{'int8' if quantize else 'fp32'} threads={threads} batch={batch_size:>3}: {rate:8.1f} texts/s")
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,97 @@
+"""
+What the instrumentation costs: a span on its own, and a request through
+MetricsMiddleware (with the sampling profiler on and off) against the same
+app without it.
+
+    python -m benchmarks.bench_metrics_overhead --spans 200000 --requests 5000
+
+Requests go to a small FastAPI app in process (httpx ASGI transport, no
+sockets), whose endpoint opens --spans-per-request spans around no work,
+so the difference between variants is the instrumentation itself. The
+variants take turns for --rounds rounds; the median round is reported.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.core import metrics as metrics_module
+from app.core.metrics import MetricsMiddleware, SamplingProfiler, Trace, _current_trace, span
+
+def span_cost_us(n: int, traced: bool) -> float:
+    token = _current_trace.set(Trace("bench")) if traced else None
+    start = time.perf_counter()
+    for _ in range(n):
+        with span("bench.span"):
+            pass
+    elapsed = time.perf_counter() - start
+    if token is not None:
+        _current_trace.reset(token)
+    return elapsed / n * 1e6
+
+def make_app(spans_per_request: int, middleware: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        for i in range(spans_per_request):
+            with span(f"bench.stage{i}"):
+                pass
+        return {"id": item_id}
+
+    if middleware:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+async def request_cost_us(app: FastAPI, n: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(50):
+            await client.get(f"/items/{i}")
+        start = time.perf_counter()
+        for i in range(n):
+            response = await client.get(f"/items/{i}")
+            assert response.status_code == 200
+        return (time.perf_counter() - start) / n * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spans", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--spans-per-request", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = {
+        "span_us": span_cost_us(args.spans, traced=False),
+        "span_traced_us": span_cost_us(args.spans, traced=True),
+    }
+    print(f"span: {results['span_us']:.2f} us  (inside a traced request: {results['span_traced_us']:.2f} us)")
+
+    variants = {
+        "no_middleware": (False, None),
+        "middleware": (True, None),
+        "middleware+profiler": (True, SamplingProfiler(10, tempfile.mkdtemp(prefix="bench_profiles_"))),
+    }
+    rounds = {name: [] for name in variants}
+    for _ in range(args.rounds):
+        for name, (middleware, profiler) in variants.items():
+            metrics_module.profiler = profiler
+            app = make_app(args.spans_per_request, middleware)
+            rounds[name].append(asyncio.run(request_cost_us(app, args.requests)))
+    metrics_module.profiler = None
+
+    for name in variants:
+        results[name + "_us"] = statistics.median(rounds[name])
+        overhead = results[name + "_us"] - results["no_middleware_us"]
+        print(f"{name:>20}: {results[name + '_us']:8.1f} us/request  ({overhead:+.1f} us)")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
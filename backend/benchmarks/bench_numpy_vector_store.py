@@ -0,0 +1,150 @@
+"""
+Chroma (HNSW) vs. the NumPy brute-force index (float16 and int8) on one
+synthetic knowledge base: build time, size on disk, resident memory after
+loading and querying, query latency (unfiltered and filtered to one agent's
+documents) and recall@k against an exact float32 scan.
+
+    python -m benchmarks.bench_numpy_vector_store --chunks 20000 --dim 768
+
+Each backend is loaded and queried in a fresh subprocess so the memory
+numbers are not polluted by the others.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+DOCS = 200
+
+def corpus(n_chunks: int, dim: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n_chunks, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def queries(vectors: np.ndarray, n_queries: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(0, len(vectors), n_queries)]
+    noisy = picked + 0.5 * rng.standard_normal(picked.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+    return noisy / np.linalg.norm(noisy, axis=1, keepdims=True)
+
+def open_store(backend: str, path: str):
+    if backend == "chroma":
+        import chromadb
+        client = chromadb.PersistentClient(path=path)
+        return client.get_or_create_collection(name="knowledge_base", embedding_function=None), client.get_max_batch_size()
+    from app.services.numpy_index import NumpyVectorIndex
+    return NumpyVectorIndex(path, dtype=backend), 5000
+
+def build(backend: str, path: str, vectors: np.ndarray) -> float:
+    store, batch_size = open_store(backend, path)
+    start = time.perf_counter()
+    for offset in range(0, len(vectors), batch_size):
+        part = vectors[offset:offset + batch_size]
+        store.add(
+            ids=[f"chunk{offset + i}" for i in range(len(part))],
+            documents=[f"chunk text {offset + i}" for i in range(len(part))],
+            metadatas=[{"doc_id": f"doc{(offset + i) % DOCS}"} for i in range(len(part))],
+            embeddings=part.tolist()
+        )
+    return time.perf_counter() - start
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+def rss_mib() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) / 1024
+
+def worker(backend: str, path: str, n_chunks: int, dim: int, n_queries: int, k: int):
+    """Load the store, run the queries, report latency, recall and RSS growth."""
+    vectors = corpus(n_chunks, dim)
+    qs = queries(vectors, n_queries)
+    scope = [f"doc{i}" for i in range(DOCS // 20)]  # 5% of the knowledge base
+    in_scope = (np.arange(n_chunks) % DOCS) < DOCS // 20
+    exact = [set(np.argsort(((vectors - q) ** 2).sum(axis=1))[:k]) for q in qs]
+    exact_scoped = []
+    for q in qs:
+        distances = ((vectors - q) ** 2).sum(axis=1)
+        distances[~in_scope] = np.inf
+        exact_scoped.append(set(np.argsort(distances)[:k]))
+    del vectors
+
+    rss_before = rss_mib()
+    start = time.perf_counter()
+    store, _ = open_store(backend, path)
+    store.query(query_embeddings=[qs[0].tolist()], n_results=k)
+    load_s = time.perf_counter() - start
+
+    results = {}
+    for name, where, truth in (("all", None, exact), ("scoped", {"doc_id": {"$in": scope}}, exact_scoped)):
+        timings, recall = [], []
+        for q, expected in zip(qs, truth):
+            t0 = time.perf_counter()
+            hit = store.query(query_embeddings=[q.tolist()], n_results=k, where=where)
+            timings.append((time.perf_counter() - t0) * 1000)
+            recall.append(len({int(i[5:]) for i in hit["ids"][0]} & expected) / k)
+        timings.sort()
+        results[f"{name}_p50_ms"] = statistics.median(timings)
+        results[f"{name}_p95_ms"] = timings[int(0.95 * (len(timings) - 1))]
+        results[f"{name}_recall"] = statistics.mean(recall)
+    results["load_s"] = load_s
+    # Includes mapped file pages the queries touched (the whole float16/int8
+    # matrix for a brute-force scan)
+    results["rss_mib"] = rss_mib() - rss_before
+    print(json.dumps(results))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--backends", nargs="+", default=["chroma", "float16", "int8"])
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.path, args.chunks, args.dim, args.queries, args.k)
+        sys.exit(0)
+
+    vectors = corpus(args.chunks, args.dim)
+    print(f"{args.chunks} chunks x {args.dim} dims (float32 matrix: {vectors.nbytes / 2**20:.1f} MiB)")
+    workdir = tempfile.mkdtemp(prefix="bench_numpy_store_")
+    results = {"chunks": args.chunks, "dim": args.dim, "k": args.k, "backends": {}}
+    try:
+        for backend in args.backends:
+            path = os.path.join(workdir, backend)
+            build_s = build(backend, path, vectors)
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_numpy_vector_store", "--worker", backend, "--path", path,
+                 "--chunks", str(args.chunks), "--dim", str(args.dim), "--queries", str(args.queries), "--k", str(args.k)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            run = json.loads(output.strip().splitlines()[-1])
+            run.update(build_s=build_s, disk_mib=dir_size(path) / 2**20)
+            results["backends"][backend] = run
+            print(
+                f"{backend:>8}: build {build_s:6.1f}s  disk {run['disk_mib']:7.1f} MiB  rss +{run['rss_mib']:6.1f} MiB  "
+                f"all p50 {run['all_p50_ms']:6.2f} ms (recall {run['all_recall']:.3f})  "
+                f"scoped p50 {run['scoped_p50_ms']:6.2f} ms (recall {run['scoped_recall']:.3f})"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,50 @@
+"""
+PDF text extraction throughput (pages/sec) against process-pool size.
+
+    python -m benchmarks.bench_pdf_extract --pages 800 --workers 0,1,2,4,8
+
+0 workers = inline extraction on the calling thread (the old behaviour).
+Each pool size gets a warm-up pass so process start-up isn't counted.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from app.core.config import settings
+from app.services.ingestion import ingestion_service
+from benchmarks.bench_ingest_pipeline import make_pdf
+
+def run(pdf: str, workers: int) -> float:
+    ingestion_service.shutdown()
+    settings.PDF_EXTRACT_WORKERS = workers
+    for _ in ingestion_service.iter_pages(pdf):
+        pass
+
+    start = time.perf_counter()
+    pages = sum(1 for _ in ingestion_service.iter_pages(pdf))
+    return pages / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=800)
+    parser.add_argument("--workers", default=",".join(str(n) for n in [0, 1, 2, 4, 8, 16] if n <= (os.cpu_count() or 1)))
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    pdf = os.path.join(tempfile.mkdtemp(prefix="bench_pdf_"), "synthetic.pdf")
+    make_pdf(pdf, args.pages)
+
+    results = []
+    baseline = None
+    for workers in [int(x) for x in args.workers.split(",")]:
+        pages_per_s = run(pdf, workers)
+        baseline = baseline or pages_per_s
+        print(f"workers={workers:>3}  {pages_per_s:8.1f} pages/s  ({pages_per_s / baseline:.2f}x)")
+        results.append({"workers": workers, "pages_per_s": pages_per_s})
+    ingestion_service.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"pages": args.pages, "cpu_count": os.cpu_count(), "results": results}, f, indent=2)
@@ -0,0 +1,83 @@
+"""
+Query-embedding throughput under concurrent chats, with and without the
+micro-batcher, against the local mock OpenAI server (fixed per-request
+latency plus a small per-input cost).
+
+    python -m benchmarks.bench_query_batching --concurrency 1 16 64 --queries 600
+"""
+import os
+
+os.environ.setdefault("EMBEDDING_CACHE_ENABLED", "false")
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.core.config import settings
+from app.services.embedding import embedding_service
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.llm_service import llm_service
+from benchmarks.mock_openai_server import MockConfig, serve_in_thread
+
+async def run(concurrency: int, n_queries: int, batched: bool, max_wait_ms: float):
+    embedding_service.query_batcher = EmbeddingBatcher(
+        embedding_service.get_embeddings,
+        max_batch_size=settings.EMBEDDING_QUERY_BATCH_MAX_SIZE,
+        max_wait_ms=max_wait_ms,
+    ) if batched else None
+    latencies = []
+    counter = iter(range(n_queries))
+
+    async def user():
+        for i in counter:
+            start = time.perf_counter()
+            await embedding_service.embed_query(f"how do I reset my password, question {i}")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await llm_service.aclose()
+
+    latencies.sort()
+    row = {
+        "concurrency": concurrency,
+        "batched": batched,
+        "embeddings_per_s": n_queries / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+    }
+    if batched:
+        row.update(embedding_service.query_batcher.stats())
+    return row
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--queries", type=int, default=600)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--ms-per-input", type=float, default=0.2)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.EMBEDDING_QUERY_BATCH_WAIT_MS)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    config = MockConfig(embedding_latency_ms=args.latency_ms, embedding_ms_per_input=args.ms_per_input)
+    results = []
+    with serve_in_thread(config, port=args.port) as base_url:
+        settings.OPENAI_BASE_URL = base_url
+        settings.OPENAI_API_KEY = "mock"
+        settings.EMBEDDING_BACKEND = "openai"
+        for concurrency in args.concurrency:
+            for batched in (False, True):
+                row = asyncio.run(run(concurrency, args.queries, batched, args.max_wait_ms))
+                results.append(row)
+                extra = f"  avg batch={row['avg_batch_size']:5.1f}  queue wait p50={row['queue_wait_p50_ms']:.1f} ms" if batched else ""
+                print(f"c={concurrency:>3} {'batched' if batched else 'single ':>7}: {row['embeddings_per_s']:7.1f} emb/s  "
+                      f"p50={row['p50_ms']:6.1f} ms  p95={row['p95_ms']:6.1f} ms{extra}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
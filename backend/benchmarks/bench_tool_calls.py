@@ -0,0 +1,111 @@
+"""
+Chat turns of an agent whose model calls several tools at once: tool calls
+run one after another (the naive loop) vs. concurrently, and concurrently
+with the TTL cache in front of the idempotent lookups.
+
+    python -m benchmarks.bench_tool_calls --chats 40 --concurrency 8 --users 10
+
+The mock OpenAI server (--latency-ms per completion) asks for every tool
+in the first completion of each chat and answers in the second. The tools
+are simulated: two blocking ones (thread pool) and two async ones, with
+--tool-latency-ms * (1, 1.5, 2, 0.5) latency. Chats cycle through --users
+distinct users, so lookups for a user repeat across chats.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from app.core.config import settings
+from app.core.tools import Tool
+from app.services.agent_service import ToolExecutor
+from app.services.llm_service import llm_service
+from benchmarks.mock_openai_server import MockConfig, serve_in_thread
+
+class SequentialToolExecutor(ToolExecutor):
+    """Baseline: a turn's tool calls run one at a time."""
+    async def execute(self, tool_calls):
+        return [await self.call(tc.id, tc.function.name, tc.function.arguments) for tc in tool_calls]
+
+def tool_registry(latency_ms: float, cache_ttl_seconds: float):
+    seconds = latency_ms / 1000
+
+    def lookup_user_status(user_id: str):
+        """Blocking CRM lookup."""
+        time.sleep(seconds)
+        return {"user_id": user_id, "status": "active"}
+
+    def lookup_entitlements(user_id: str):
+        """Blocking license lookup."""
+        time.sleep(seconds * 1.5)
+        return {"user_id": user_id, "licenses": ["office", "vpn"]}
+
+    async def recent_tickets(user_id: str):
+        """Async ticket search."""
+        await asyncio.sleep(seconds * 2)
+        return {"user_id": user_id, "tickets": ["INC1", "INC2"]}
+
+    async def service_health(user_id: str):
+        """Async status-page check."""
+        await asyncio.sleep(seconds * 0.5)
+        return {"vpn": "degraded"}
+
+    return {
+        fn.__name__: Tool(fn, cache_ttl_seconds=cache_ttl_seconds)
+        for fn in (lookup_user_status, lookup_entitlements, recent_tickets, service_health)
+    }
+
+async def run(executor: ToolExecutor, n_chats: int, concurrency: int, n_users: int):
+    latencies = []
+    counter = iter(range(n_chats))
+
+    async def user():
+        for i in counter:
+            start = time.perf_counter()
+            answer, records = await executor.run("mock", [{"role": "user", "content": f"user{i % n_users}"}], list(executor.registry))
+            assert answer and len(records) == len(executor.registry) and not any(r["error"] for r in records)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    await llm_service.aclose()
+    executor.shutdown()
+
+    latencies.sort()
+    return {
+        "chats_per_s": n_chats / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        "cache_hits": executor.cache.hits,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--tool-latency-ms", type=float, default=200.0)
+    parser.add_argument("--port", type=int, default=9102)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    variants = {
+        "sequential": SequentialToolExecutor(tool_registry(args.tool_latency_ms, 0)),
+        "concurrent": ToolExecutor(tool_registry(args.tool_latency_ms, 0)),
+        "concurrent+cache": ToolExecutor(tool_registry(args.tool_latency_ms, 300)),
+    }
+    results = {}
+    config = MockConfig(latency_ms=args.latency_ms, completion_tokens=20)
+    with serve_in_thread(config, port=args.port) as base_url:
+        settings.OPENAI_BASE_URL = base_url
+        settings.OPENAI_API_KEY = "mock"
+        for name, executor in variants.items():
+            row = results[name] = asyncio.run(run(executor, args.chats, args.concurrency, args.users))
+            print(f"{name:>16}: {row['chats_per_s']:6.2f} chats/s  p50 {row['p50_ms']:7.1f} ms  p95 {row['p95_ms']:7.1f} ms  cache hits {row['cache_hits']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
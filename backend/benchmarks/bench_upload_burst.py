@@ -0,0 +1,117 @@
+"""
+Chat latency while a burst of uploads is being ingested in the background.
+
+    python -m benchmarks.bench_upload_burst --uploads 40 --pages 50
+
+Starts the mock OpenAI server and the API (in a temp working directory),
+measures POST /chat/ latency idle, then again while --uploads synthetic PDFs
+are posted at once to /documents/upload and processed by the job queue.
+"""
+import os
+import tempfile
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_burst_")
+BACKEND_DIR = os.getcwd()
+os.chdir(WORKDIR)
+os.environ.setdefault("CHROMA_DB_DIR", os.path.join(WORKDIR, "chroma_db"))
+
+import argparse
+import asyncio
+import json
+import statistics
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from benchmarks.bench_ingest_pipeline import make_pdf
+from benchmarks.mock_openai_server import MockConfig, serve_in_thread
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+async def chat_latencies(client, agent_id, n):
+    latencies = []
+    for i in range(n):
+        start = time.perf_counter()
+        response = await client.post("/api/v1/chat/", json={"agent_id": agent_id, "message": f"question {i}"})
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+async def wait_for_jobs(client, job_ids):
+    pending = set(job_ids)
+    while pending:
+        for job_id in list(pending):
+            job = (await client.get(f"/api/v1/documents/jobs/{job_id}")).json()
+            if job["status"] in ("completed", "failed"):
+                pending.discard(job_id)
+        await asyncio.sleep(0.2)
+
+async def bench(base_url, pdf, uploads, chats):
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        agent = (await client.post("/api/v1/agents/", json={"name": "bench", "model": "mock", "system_prompt": "Help."})).json()
+        idle = await chat_latencies(client, agent["id"], chats)
+
+        with open(pdf, "rb") as f:
+            content = f.read()
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/api/v1/documents/upload", files={"file": (f"manual_{i}.pdf", content, "application/pdf")})
+            for i in range(uploads)
+        ))
+        accept_ms = (time.perf_counter() - start) * 1000
+        job_ids = [r.json()["job_id"] for r in responses]
+
+        busy, _ = await asyncio.gather(chat_latencies(client, agent["id"], chats), wait_for_jobs(client, job_ids))
+        ingest_s = time.perf_counter() - start
+
+    result = {
+        "uploads": uploads,
+        "accept_all_ms": accept_ms,
+        "ingest_all_s": ingest_s,
+        "chat_idle_p50_ms": statistics.median(idle),
+        "chat_idle_p99_ms": percentile(idle, 0.99),
+        "chat_burst_p50_ms": statistics.median(busy),
+        "chat_burst_p99_ms": percentile(busy, 0.99),
+    }
+    for key, value in result.items():
+        print(f"{key:>18}: {value:.1f}" if isinstance(value, float) else f"{key:>18}: {value}")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--chats", type=int, default=30)
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    pdf = os.path.join(WORKDIR, "manual.pdf")
+    make_pdf(pdf, args.pages)
+
+    config = MockConfig(latency_ms=args.llm_latency_ms, embedding_dim=384, embedding_latency_ms=50)
+    with serve_in_thread(config, port=args.mock_port) as mock_url:
+        os.environ["OPENAI_BASE_URL"] = mock_url
+        os.environ["OPENAI_API_KEY"] = "mock"
+        from app.main import app
+
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.api_port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        try:
+            results = asyncio.run(bench(f"http://127.0.0.1:{args.api_port}", pdf, args.uploads, args.chats))
+        finally:
+            server.should_exit = True
+            thread.join()
+
+    if args.json:
+        with open(os.path.join(BACKEND_DIR, args.json), "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,103 @@
+"""
+Compare a benchmark result file with a stored baseline.
+
+    python -m benchmarks.compare results.json benchmarks/baselines/e2e_small.json
+
+Both files are bench_e2e output: {"workloads": {name: {metric: value}}}.
+A metric regresses when it is worse than the baseline by more than the
+relative tolerance and by more than an absolute floor, so jitter on
+fast requests doesn't fail a run. p99 and max are reported by bench_e2e
+but not gated on: at these request counts they are single samples.
+Exits 1 if anything regressed.
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+# metric path -> (higher is better, absolute floor)
+METRICS = {
+    "throughput_rps": (True, 0.0),
+    "latency_ms.p50": (False, 5.0),
+    "latency_ms.p95": (False, 5.0),
+    "ttfb_ms.p50": (False, 5.0),
+    "ttfb_ms.p95": (False, 5.0),
+    "peak_rss_mb": (False, 10.0),
+    "error_rate": (False, 0.0),
+}
+
+def _get(row: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = row
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.15, memory_tolerance: float = 0.25) -> List[Dict[str, Any]]:
+    """
+    One row per metric present in both files: workload, metric, baseline,
+    current, relative change and whether it regressed. Workloads missing
+    from either side are skipped.
+    """
+    rows = []
+    for workload, base_row in baseline.get("workloads", {}).items():
+        current_row = current.get("workloads", {}).get(workload)
+        if current_row is None:
+            continue
+        for metric, (higher_is_better, floor) in METRICS.items():
+            base, value = _get(base_row, metric), _get(current_row, metric)
+            if base is None or value is None:
+                continue
+            limit = memory_tolerance if metric == "peak_rss_mb" else tolerance
+            worse_by = base - value if higher_is_better else value - base
+            change = (value - base) / base if base else 0.0
+            rows.append({
+                "workload": workload,
+                "metric": metric,
+                "baseline": base,
+                "current": value,
+                "change": change,
+                "regression": worse_by > floor and worse_by > limit * abs(base),
+            })
+    return rows
+
+def config_differences(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Settings that differ between the runs; results are only comparable when there are none."""
+    current_config, base_config = current.get("config", {}), baseline.get("config", {})
+    return sorted(key for key in set(current_config) | set(base_config) if current_config.get(key) != base_config.get(key))
+
+def format_report(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'workload':<12} {'metric':<16} {'baseline':>10} {'current':>10} {'change':>8}"]
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(
+            f"{row['workload']:<12} {row['metric']:<16} {row['baseline']:>10.1f} {row['current']:>10.1f} {row['change']:>+8.1%}{flag}"
+        )
+    return "\n".join(lines)
+
+def check(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.15, memory_tolerance: float = 0.25) -> bool:
+    """Print the comparison; True if nothing regressed."""
+    differences = config_differences(current, baseline)
+    if differences:
+        print(f"WARNING: run settings differ from the baseline ({', '.join(differences)}); numbers may not be comparable")
+    rows = compare(current, baseline, tolerance, memory_tolerance)
+    print(format_report(rows))
+    regressions = [row for row in rows if row["regression"]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {tolerance:.0%} (memory {memory_tolerance:.0%})")
+    return not regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("current")
+    parser.add_argument("baseline")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed relative slowdown")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="Allowed relative peak-memory growth")
+    args = parser.parse_args()
+
+    with open(args.current) as f:
+        current = json.load(f)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    sys.exit(0 if check(current, baseline, args.tolerance, args.memory_tolerance) else 1)
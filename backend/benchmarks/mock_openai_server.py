@@ -0,0 +1,181 @@
+"""
+Minimal OpenAI-compatible server used as a local stand-in for load tests.
+
+    python -m benchmarks.mock_openai_server --port 9100 --latency-ms 200
+
+Every completion sleeps for ``latency_ms`` and then for ``completion_tokens``
+at ``tokens_per_second``, so the server behaves like a provider whose cost is
+wall-clock time rather than CPU. Embeddings are deterministic per input text.
+
+When a request offers ``tools`` (and ``tool_choice`` isn't "none") and the
+last message isn't a tool result, the reply calls every offered tool once,
+with each required argument set to the last user message; the next
+completion then answers normally.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 200.0
+    tokens_per_second: float = 0.0  # 0 = emit the whole completion at once
+    completion_tokens: int = 50
+    embedding_dim: int = 1536
+    embedding_latency_ms: float = 100.0
+    embedding_ms_per_input: float = 0.5
+
+def mock_embedding(text: str, dim: int) -> np.ndarray:
+    """Unit-length pseudo-random float32 vector seeded by the text."""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dim, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def _encode_embedding(vector: np.ndarray, encoding_format: str):
+    if encoding_format == "base64":
+        return base64.b64encode(vector.astype("<f4").tobytes()).decode("ascii")
+    return vector.round(6).tolist()
+
+def _completion_text(n_tokens: int) -> str:
+    return " ".join(f"tok{i}" for i in range(n_tokens))
+
+def _stream_chunks(config: MockConfig, model: str):
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+    delay = 1 / config.tokens_per_second if config.tokens_per_second else 0
+
+    def frame(delta, finish_reason=None):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    async def generate():
+        await asyncio.sleep(config.latency_ms / 1000)
+        yield frame({"role": "assistant", "content": ""})
+        for i in range(config.completion_tokens):
+            if delay:
+                await asyncio.sleep(delay)
+            yield frame({"content": f"tok{i} " if i < config.completion_tokens - 1 else f"tok{i}"})
+        yield frame({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return generate()
+
+def _tool_calls(body):
+    if not body.get("tools") or body.get("tool_choice") == "none" or body["messages"][-1]["role"] == "tool":
+        return None
+    user_message = next(m["content"] for m in reversed(body["messages"]) if m["role"] == "user")
+    return [
+        {
+            "id": f"call_{uuid.uuid4().hex[:12]}",
+            "type": "function",
+            "function": {
+                "name": tool["function"]["name"],
+                "arguments": json.dumps({name: user_message for name in tool["function"]["parameters"].get("required", [])}),
+            },
+        }
+        for tool in body["tools"]
+    ]
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if body.get("stream"):
+            # latency_ms is time-to-first-token, then tokens arrive at tokens_per_second
+            return StreamingResponse(_stream_chunks(config, body.get("model", "mock")), media_type="text/event-stream")
+        await asyncio.sleep(config.latency_ms / 1000)
+        tool_calls = _tool_calls(body)
+        if tool_calls:
+            message = {"role": "assistant", "content": None, "tool_calls": tool_calls}
+        else:
+            if config.tokens_per_second:
+                await asyncio.sleep(config.completion_tokens / config.tokens_per_second)
+            message = {"role": "assistant", "content": _completion_text(config.completion_tokens)}
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": config.completion_tokens, "total_tokens": config.completion_tokens},
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        encoding_format = body.get("encoding_format", "float")
+        await asyncio.sleep((config.embedding_latency_ms + config.embedding_ms_per_input * len(inputs)) / 1000)
+        return {
+            "object": "list",
+            "model": body.get("model", "mock"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": _encode_embedding(mock_embedding(text, config.embedding_dim), encoding_format)}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    return app
+
+@contextmanager
+def serve_in_thread(config: MockConfig, host: str = "127.0.0.1", port: int = 9100):
+    """Run the mock server on a background thread for the duration of the block."""
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://{host}:{port}/v1"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--completion-tokens", type=int, default=50)
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--embedding-latency-ms", type=float, default=100.0)
+    parser.add_argument("--embedding-ms-per-input", type=float, default=0.5)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        embedding_dim=args.embedding_dim,
+        embedding_latency_ms=args.embedding_latency_ms,
+        embedding_ms_per_input=args.embedding_ms_per_input,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,33 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# The services are module-level singletons created when app modules are
+# first imported, so their files must point elsewhere before any test module
+# is collected. Tests that need a fresh store per test use the fixtures below.
+_data_dir = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.update({
+    "CHROMA_DB_DIR": os.path.join(_data_dir, "chroma_db"),
+    "EMBEDDING_CACHE_PATH": os.path.join(_data_dir, "embedding_cache.db"),
+    "DOCUMENT_DB_PATH": os.path.join(_data_dir, "documents.db"),
+    "CHAT_DB_PATH": os.path.join(_data_dir, "chat.db"),
+    "PROFILE_DIR": os.path.join(_data_dir, "profiles"),
+})
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_data_dir, ignore_errors=True)
+
+@pytest.fixture
+def chat_storage(monkeypatch, tmp_path):
+    """A ChatStorageService on tmp_path, used by the chat endpoints and services."""
+    from app.api.v1.endpoints import chat as chat_endpoints
+    from app.services import chat as chat_module, conversation as conversation_module
+    from app.services.chat_storage import ChatStorageService
+
+    storage = ChatStorageService(str(tmp_path / "chat.db"), finetune_log_path=str(tmp_path / "chat_logs.jsonl"))
+    for module in (chat_endpoints, chat_module, conversation_module):
+        monkeypatch.setattr(module, "chat_storage", storage)
+    yield storage
+    storage.close()
@@ -0,0 +1,22 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.vector_store import vector_store
+
+client = TestClient(app)
+
+def test_deleting_the_last_agent_drops_its_collection(monkeypatch):
+    ensured, dropped = [], []
+    monkeypatch.setattr(vector_store, "ensure_scoped_collection", lambda doc_ids: ensured.append(sorted(doc_ids)))
+    monkeypatch.setattr(vector_store, "drop_scoped_collection", lambda doc_ids: dropped.append(sorted(doc_ids)))
+
+    body = {"name": "HR", "model": "gpt-4", "system_prompt": "", "document_ids": ["a", "b"], "dedicated_collection": True}
+    first = client.post("/api/v1/agents", json=body).json()
+    second = client.post("/api/v1/agents", json={**body, "document_ids": ["b", "a"]}).json()
+    assert ensured == [["a", "b"], ["a", "b"]]
+
+    assert client.delete(f"/api/v1/agents/{first['id']}").status_code == 200
+    assert dropped == []
+    assert client.delete(f"/api/v1/agents/{second['id']}").status_code == 200
+    assert dropped == [["a", "b"]]
+    assert client.get(f"/api/v1/agents/{second['id']}").status_code == 404
+    assert client.delete(f"/api/v1/agents/{second['id']}").status_code == 404
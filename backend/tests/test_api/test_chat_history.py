@@ -0,0 +1,42 @@
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+def test_history_pages_with_cursor(chat_storage):
+    session_id = chat_storage.create_session("agent", "title")
+    for i in range(7):
+        chat_storage.add_message(session_id, "user", str(i))
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(f"/api/v1/chat/history/{session_id}", params=params)
+        assert response.status_code == 200
+        seen += [m["content"] for m in response.json()]
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert seen == [str(i) for i in range(7)]
+
+    # Unpaginated responses stay a plain list for existing clients
+    response = client.get(f"/api/v1/chat/history/{session_id}")
+    assert [m["content"] for m in response.json()] == seen
+
+    export = client.get(f"/api/v1/chat/history/{session_id}/export")
+    assert export.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line)["content"] for line in export.text.splitlines()] == seen
+
+    assert client.get(f"/api/v1/chat/history/{session_id}", params={"cursor": "bogus"}).status_code == 400
+
+def test_sessions_pages_newest_first(chat_storage):
+    ids = [chat_storage.create_session("agent", f"s{i}") for i in range(5)]
+    chat_storage.flush()
+
+    first = client.get("/api/v1/chat/sessions/agent", params={"limit": 2})
+    second = client.get("/api/v1/chat/sessions/agent", params={"limit": 2, "cursor": first.headers["x-next-cursor"]})
+    assert [s["id"] for s in first.json() + second.json()] == ids[::-1][:4]
+    assert [s["id"] for s in client.get("/api/v1/chat/sessions/agent").json()] == ids[::-1]
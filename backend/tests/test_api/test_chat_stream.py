@@ -0,0 +1,50 @@
+import json
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.config import settings
+from app.services.agent import agent_service
+from app.services.chat import chat_service
+from app.services.llm_service import llm_service
+from app.services.retrieval_service import retrieval_service
+
+client = TestClient(app)
+
+def _parse_sse(body: str):
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_chat_stream_sends_meta_tokens_done(monkeypatch, chat_storage):
+    async def fake_stream(model, messages, temperature=0.7, timeout=None):
+        for delta in ["Hello", ", ", "world"]:
+            yield delta
+
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(llm_service, "stream", fake_stream)
+    async def fake_retrieve(query, n_results=3, document_ids=None):
+        return {"documents": [["policy chunk"]]}
+
+    monkeypatch.setattr(retrieval_service, "retrieve", fake_retrieve)
+    monkeypatch.setattr(chat_service, "_log_for_finetuning", lambda *args: None)
+
+    agent = agent_service.create_agent("Support", "gpt-4", "Be helpful.", [], [])
+    response = client.post("/api/v1/chat/stream", json={"agent_id": agent.id, "message": "hi"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _parse_sse(response.text)
+    assert events[0][0] == "meta"
+    assert events[0][1]["citations"] == ["policy chunk"]
+    assert [data["delta"] for name, data in events if name == "token"] == ["Hello", ", ", "world"]
+    assert events[-1][0] == "done"
+    assert events[-1][1]["ttfb_ms"] is not None
+
+    history = chat_storage.get_session_history(events[0][1]["session_id"])
+    assert [m["role"] for m in history] == ["user", "assistant"]
+    assert history[-1]["content"] == "Hello, world"
+
+def test_chat_stream_unknown_agent():
+    response = client.post("/api/v1/chat/stream", json={"agent_id": "missing", "message": "hi"})
+    assert response.status_code == 404
@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+import time
+from fastapi.testclient import TestClient
+from app.main import app
+from app.api.v1.endpoints import documents
+from app.services import ingestion
+from app.services.document_registry import DocumentRegistry
+
+def test_upload_returns_job_and_indexes_in_background(tmp_path, monkeypatch):
+    stored = []
+
+    async def fake_embeddings(texts):
+        return [[0.0] for _ in texts]
+
+    monkeypatch.setattr(documents, "document_registry", DocumentRegistry(str(tmp_path / "documents.db"), legacy_json_path=None))
+    monkeypatch.setattr(ingestion.embedding_service, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(ingestion.vector_store, "add_documents", lambda documents, metadatas, ids, embeddings: stored.extend(ids))
+
+    with TestClient(app) as client:
+        response = client.post("/api/v1/documents/upload", files={"file": ("faq.txt", b"How do I reset my password? " * 200, "text/plain")})
+        assert response.status_code == 202
+        doc = response.json()
+        assert doc["status"] == "processing"
+
+        for _ in range(100):
+            job = client.get(f"/api/v1/documents/jobs/{doc['job_id']}").json()
+            if job["status"] in ("completed", "failed"):
+                break
+            time.sleep(0.05)
+
+        assert job["status"] == "completed"
+        assert job["chunks_done"] == len(stored) > 0
+        listed = client.get("/api/v1/documents/").json()
+        assert listed[0]["status"] == "indexed"
+        assert listed[0]["chunks"] == len(stored)
+        assert listed[0]["content_hash"] == hashlib.sha256(b"How do I reset my password? " * 200).hexdigest()
+
+def test_unknown_job_and_unsupported_type():
+    client = TestClient(app)
+    assert client.get("/api/v1/documents/jobs/missing").status_code == 404
+    response = client.post("/api/v1/documents/upload", files={"file": ("notes.exe", b"x", "application/octet-stream")})
+    assert response.status_code == 400
+
+def test_reupload_by_external_id_reuses_the_document(tmp_path, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(documents, "document_registry", DocumentRegistry(str(tmp_path / "documents.db"), legacy_json_path=None))
+    monkeypatch.setattr(documents.ingestion_jobs, "submit", lambda path, filename, doc_id, on_finished=None, incremental=False: submitted.append((doc_id, incremental)) or documents.IngestionJob(id=f"job{len(submitted)}", doc_id=doc_id, filename=filename, created_at=0.0))
+
+    client = TestClient(app)
+    upload = lambda content: client.post("/api/v1/documents/upload", data={"external_id": "manual-1"}, files={"file": ("manual.txt", content, "text/plain")})
+    first = upload(b"version one").json()
+    documents.document_registry.update(first["id"], status="indexed")
+
+    unchanged = upload(b"version one")
+    assert unchanged.status_code == 200 and unchanged.json()["unchanged"]
+
+    second = upload(b"version two")
+    assert second.status_code == 202
+    assert second.json()["id"] == first["id"] and second.json()["job_id"] == "job2"
+    assert submitted == [(first["id"], False), (first["id"], True)]
+    assert documents.document_registry.count() == 1
+
+    # A failed update left the previous version's chunks, so the next one
+    # still has to diff against them
+    documents.document_registry.update(first["id"], status="failed")
+    assert upload(b"version two").status_code == 202
+    assert submitted[-1] == (first["id"], True)
+
+def test_delete_waits_for_running_ingestion(tmp_path, monkeypatch):
+    stored, events = [], []
+
+    async def slow_embeddings(texts):
+        await asyncio.sleep(0.05)
+        return [[0.0] for _ in texts]
+
+    monkeypatch.setattr(documents, "document_registry", DocumentRegistry(str(tmp_path / "documents.db"), legacy_json_path=None))
+    monkeypatch.setattr(ingestion.embedding_service, "get_embeddings", slow_embeddings)
+    monkeypatch.setattr(ingestion.settings, "INGEST_BATCH_SIZE", 2)
+    monkeypatch.setattr(ingestion.vector_store, "add_documents", lambda documents, metadatas, ids, embeddings: stored.extend(ids) or events.append("add"))
+    monkeypatch.setattr(documents.vector_store, "delete_document", lambda doc_id: events.append("delete"))
+
+    with TestClient(app) as client:
+        content = b"How do I reset my password? " * 400
+        first = client.post("/api/v1/documents/upload", files={"file": ("faq.txt", content, "text/plain")}).json()
+        second = client.post("/api/v1/documents/upload", data={"upsert": "true"}, files={"file": ("faq.txt", content + b"v2", "text/plain")}).json()
+        assert second["id"] == first["id"]
+
+        assert client.delete(f"/api/v1/documents/{first['id']}").status_code == 200
+        time.sleep(0.2)
+        assert events[-1] == "delete" and "add" in events
+        assert client.get(f"/api/v1/documents/jobs/{second['job_id']}").json()["status"] == "cancelled"
+        assert client.get("/api/v1/documents/").json() == []
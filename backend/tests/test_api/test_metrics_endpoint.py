@@ -0,0 +1,17 @@
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+def test_metrics_endpoint_reports_requests_by_route_template():
+    client.get("/api/v1/tools/")
+    client.get("/api/v1/documents/jobs/does-not-exist")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'app_request_duration_seconds_count{method="GET",route="/api/v1/tools/",status="200"}' in body
+    assert 'route="/api/v1/documents/jobs/{job_id}",status="404"' in body
+    assert 'cache_hits_total{cache="tools"}' in body
+    assert 'route="/metrics"' not in body
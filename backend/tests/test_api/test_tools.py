@@ -0,0 +1,42 @@
+import json
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core.config import settings
+from app.services.chat import chat_service
+from app.services.llm_service import llm_service
+from app.services.retrieval_service import retrieval_service
+
+client = TestClient(app)
+
+def test_list_tools_and_reject_unknown_ones():
+    tools = {tool["name"]: tool for tool in client.get("/api/v1/tools").json()}
+    assert tools["lookup_user_status"]["parameters"]["required"] == ["user_id"]
+
+    response = client.post("/api/v1/agents", json={"name": "A", "model": "gpt-4", "system_prompt": "", "tools": ["time_off_lookup"]})
+    assert response.status_code == 400
+
+def test_chat_runs_tool_calls(monkeypatch, chat_storage):
+    async def fake_complete_with_tools(model, messages, tools, temperature=0.7, tool_choice="auto", timeout=None):
+        assert [t["function"]["name"] for t in tools] == ["lookup_user_status"]
+        if messages[-1]["role"] == "tool":
+            return SimpleNamespace(content=f"Status: {json.loads(messages[-1]['content'])['status']}", tool_calls=None)
+        call = SimpleNamespace(id="call_1", function=SimpleNamespace(name="lookup_user_status", arguments='{"user_id": "jdoe"}'))
+        return SimpleNamespace(content=None, tool_calls=[call])
+
+    async def fake_retrieve(query, n_results=3, document_ids=None):
+        return {"documents": [[]]}
+
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(llm_service, "complete_with_tools", fake_complete_with_tools)
+    monkeypatch.setattr(retrieval_service, "retrieve", fake_retrieve)
+    monkeypatch.setattr(chat_service, "_log_for_finetuning", lambda *args: None)
+
+    agent = client.post("/api/v1/agents", json={"name": "IT", "model": "gpt-4", "system_prompt": "", "tools": ["lookup_user_status"]}).json()
+    response = client.post("/api/v1/chat/", json={"agent_id": agent["id"], "message": "Is jdoe active?"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["response"] == "Status: active"
+    assert body["tool_calls"][0]["name"] == "lookup_user_status"
+    assert body["tool_calls"][0]["arguments"] == {"user_id": "jdoe"}
+    assert body["tool_calls"][0]["error"] is None
@@ -0,0 +1,34 @@
+from benchmarks.bench_e2e import median_of, percentiles
+from benchmarks.compare import compare, config_differences
+
+def _result(rps, p95, rss, errors=0.0, **config):
+    return {
+        "config": config,
+        "workloads": {"chat": {"throughput_rps": rps, "latency_ms": {"p50": 100.0, "p95": p95}, "peak_rss_mb": rss, "error_rate": errors}},
+    }
+
+def test_compare_flags_only_changes_beyond_tolerance_and_floor():
+    baseline = _result(rps=20.0, p95=200.0, rss=200.0)
+
+    same = compare(_result(rps=19.0, p95=220.0, rss=230.0), baseline)
+    assert not any(row["regression"] for row in same)
+
+    rows = {row["metric"]: row for row in compare(_result(rps=15.0, p95=260.0, rss=300.0, errors=0.1), baseline)}
+    assert rows["throughput_rps"]["regression"]
+    assert rows["latency_ms.p95"]["regression"]
+    assert rows["peak_rss_mb"]["regression"]
+    assert rows["error_rate"]["regression"]
+    assert not rows["latency_ms.p50"]["regression"]
+
+    # 3 ms on a 10 ms request is 30%, but below the absolute floor
+    fast = {"workloads": {"history": {"latency_ms": {"p95": 10.0}}}}
+    slower = {"workloads": {"history": {"latency_ms": {"p95": 13.0}}}}
+    assert not compare(slower, fast)[0]["regression"]
+
+def test_config_differences_and_median_of_runs():
+    assert config_differences(_result(1, 1, 1, seed=0, kb_docs=20), _result(1, 1, 1, seed=0, kb_docs=200)) == ["kb_docs"]
+
+    runs = [{"rps": 10.0, "latency_ms": percentiles([1.0, 2.0, 3.0])}, {"rps": 30.0, "latency_ms": percentiles([1.0])}, {"rps": 20.0, "latency_ms": percentiles([5.0])}]
+    merged = median_of(runs)
+    assert merged["rps"] == 20.0
+    assert merged["latency_ms"]["p50"] == 2.0
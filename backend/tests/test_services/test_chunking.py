@@ -0,0 +1,54 @@
+import random
+
+from app.services.chunking import TokenChunker
+
+def _words(text):
+    return len(text.split())
+
+def _document(paragraphs=40, seed=0):
+    rng = random.Random(seed)
+    vocab = "reset password account billing invoice refund login error device sync".split()
+    return "\n\n".join(
+        " ".join(" ".join(rng.choice(vocab) for _ in range(rng.randint(4, 15))).capitalize() + "." for _ in range(rng.randint(1, 8)))
+        for _ in range(paragraphs)
+    ) + "\n"
+
+def test_chunks_respect_budget_and_sentence_boundaries():
+    text = _document()
+    chunker = TokenChunker(target_tokens=40, overlap_tokens=10, count_tokens=_words)
+    chunks = chunker.chunks(text)
+
+    assert all(_words(c.text) <= 40 for c in chunks)
+    assert all(c.text.rstrip().endswith(".") for c in chunks)
+    assert all(c.text == text[c.offset:c.offset + len(c.text)] for c in chunks)
+    # Every sentence is covered, in order
+    assert chunks[0].offset == 0 and chunks[-1].offset + len(chunks[-1].text) == len(text)
+    assert all(b.offset <= a.offset + len(a.text) for a, b in zip(chunks, chunks[1:]))
+
+    # A paragraph split across chunks repeats its last sentence(s) in the next one
+    overlapping = [(a, b) for a, b in zip(chunks, chunks[1:]) if b.offset < a.offset + len(a.text)]
+    assert overlapping
+    for a, b in overlapping:
+        shared = text[b.offset:a.offset + len(a.text)]
+        assert _words(shared) <= 10 and a.text.endswith(shared) and b.text.startswith(shared)
+
+def test_streaming_over_pages_matches_whole_text_and_tracks_pages():
+    text = _document(paragraphs=200, seed=1)
+    pages = [text[i:i + 997] for i in range(0, len(text), 997)]
+    chunker = TokenChunker(target_tokens=50, overlap_tokens=8, count_tokens=_words)
+
+    whole = [(c.offset, c.text) for c in chunker.chunks(text)]
+    streamed = list(chunker.iter_chunks(pages))
+    assert [(c.offset, c.text) for c in streamed] == whole
+    for c in streamed:
+        assert c.page == c.offset // 997 + 1
+        assert c.page_end == (c.offset + len(c.text) - 1) // 997 + 1
+        assert c.metadata()["start_char"] == c.offset
+
+def test_oversized_sentences_and_words_are_split():
+    long_sentence = " ".join(f"w{i}" for i in range(100)) + "."
+    blob = "x" * 500
+    chunker = TokenChunker(target_tokens=20, overlap_tokens=0, count_tokens=lambda t: max(_words(t), len(t.strip()) // 10))
+    chunks = chunker.chunks(f"Short one. {long_sentence} {blob} End.")
+    assert "".join(c.text for c in chunks) == f"Short one. {long_sentence} {blob} End."
+    assert all(chunker.count_tokens(c.text) <= 20 for c in chunks)
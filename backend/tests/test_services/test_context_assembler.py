@@ -0,0 +1,36 @@
+from app.core.tokens import count_tokens
+from app.services.context_assembler import ContextAssembler
+from app.services.ingestion import ingestion_service
+
+TEXT = " ".join(f"Sentence {i} of the leave policy explains rule number {i}." for i in range(200))
+
+def _results(indexes, chunks, doc_id="doc"):
+    return {
+        "documents": [[chunks[i] for i in indexes]],
+        "metadatas": [[{"doc_id": doc_id, "chunk_index": i} for i in indexes]],
+    }
+
+def test_neighbouring_chunks_are_merged_without_repeating_the_overlap():
+    chunks = ingestion_service.chunk_text(TEXT)
+    context, passages = ContextAssembler().assemble(_results([3, 2, 4], chunks), max_tokens=10_000)
+    assert len(passages) == 1
+    # Chunks 2..4 cover text[1600:4200] exactly once
+    assert context == TEXT[1600:4200]
+
+def test_near_duplicates_are_dropped_and_budget_is_respected():
+    chunks = ingestion_service.chunk_text(TEXT)
+    results = _results([0, 10], chunks)
+    # The same passage indexed under another document
+    results["documents"][0].append(chunks[0])
+    results["metadatas"][0].append({"doc_id": "copy", "chunk_index": 0})
+
+    context, passages = ContextAssembler().assemble(results, max_tokens=10_000)
+    assert passages == [chunks[0], chunks[10]]
+
+    context, passages = ContextAssembler().assemble(results, max_tokens=400)
+    assert count_tokens(context) <= 400
+    assert passages[0] == chunks[0] and chunks[10].startswith(passages[1])
+
+def test_results_without_metadata():
+    context, passages = ContextAssembler().assemble({"documents": [["policy chunk"]]})
+    assert context == "policy chunk" and passages == ["policy chunk"]
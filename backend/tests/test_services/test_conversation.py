@@ -0,0 +1,40 @@
+import asyncio
+from app.core.config import settings
+from app.core.tokens import count_message_tokens
+from app.services.conversation import ConversationMemory
+
+def test_window_is_budgeted_and_older_turns_are_summarized(monkeypatch, chat_storage):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "")
+    monkeypatch.setattr(settings, "CHAT_HISTORY_MAX_TOKENS", 200)
+    monkeypatch.setattr(settings, "CHAT_SUMMARY_MAX_TOKENS", 100)
+
+    session_id = chat_storage.create_session("agent", "title")
+    for i in range(40):
+        chat_storage.add_message(session_id, "user" if i % 2 == 0 else "assistant", f"turn {i} " + "word " * 20)
+
+    memory = ConversationMemory()
+
+    async def run():
+        first = await memory.build_history(session_id)
+        await memory.wait_idle()
+        second = await memory.build_history(session_id)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert count_message_tokens(first) <= 200
+    assert first[-1]["content"].startswith("turn 39 ")
+    assert all(m["role"] != "system" for m in first)
+
+    summary = chat_storage.get_summary(session_id)
+    assert summary is not None
+    # The summary covers exactly the turns before the window
+    assert summary["covered_until"] < chat_storage.page_key(chat_storage.get_recent_messages(session_id, len(first))[-1])
+    assert second[0]["role"] == "system" and "turn" in second[0]["content"]
+    assert second[1:] == first
+
+def test_client_history_is_trimmed_to_budget(monkeypatch):
+    monkeypatch.setattr(settings, "CHAT_HISTORY_MAX_TOKENS", 50)
+    history = [{"role": "user", "content": f"message {i} " + "x" * 60} for i in range(10)]
+    kept = ConversationMemory().fit_client_history(history)
+    assert kept and kept[-1] == history[-1]
+    assert count_message_tokens(kept) <= 50
@@ -0,0 +1,32 @@
+import json
+
+from app.services.document_registry import DocumentRegistry
+
+def test_imports_legacy_json_and_paginates(tmp_path):
+    legacy = tmp_path / "documents.json"
+    legacy.write_text(json.dumps([
+        {"id": f"doc{i}", "filename": f"f{i}.txt", "status": "indexed", "chunks": i, "uploaded_at": "1700000000.0", "job_id": None}
+        for i in range(5)
+    ]))
+    registry = DocumentRegistry(str(tmp_path / "documents.db"), legacy_json_path=str(legacy))
+    assert registry.count() == 5
+    assert registry.get("doc3")["chunks"] == 3
+
+    registry.add("doc5", "f5.txt", content_hash="abc", size_bytes=10)
+    assert registry.update("doc5", status="indexed", chunks=7)
+    assert not registry.update("missing", status="indexed")
+    assert registry.find_by_filename("f5.txt")[0]["content_hash"] == "abc"
+
+    first = registry.list(limit=4)
+    second = registry.list(limit=4, after=first[-1]["seq"])
+    assert [d["id"] for d in first + second] == [f"doc{i}" for i in range(6)]
+    assert second[-1]["chunks"] == 7
+
+    assert registry.delete("doc0") and not registry.delete("doc0")
+    assert [d["id"] for d in registry.iter_documents(batch_size=2)] == [f"doc{i}" for i in range(1, 6)]
+    registry.close()
+
+    # Imported once: reopening doesn't bring deleted documents back
+    reopened = DocumentRegistry(str(tmp_path / "documents.db"), legacy_json_path=str(legacy))
+    assert reopened.count() == 5
+    reopened.close()
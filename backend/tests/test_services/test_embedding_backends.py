@@ -0,0 +1,45 @@
+import asyncio
+import os
+import numpy as np
+import pytest
+from app.core.config import settings
+from app.services.embedding import EmbeddingService
+from app.services.embedding_backends import HashEmbeddingBackend, LocalEmbeddingBackend
+
+def test_hash_backend_is_deterministic_and_lexical():
+    backend = HashEmbeddingBackend(256)
+    a, b, c = backend.embed_sync(["reset my router password", "router password reset", "invoice billing period"])
+    assert backend.embed_sync(["reset my router password"])[0] == a
+    assert np.isclose(np.linalg.norm(a), 1.0)
+    assert np.dot(a, b) > np.dot(a, c)
+
+def test_auto_backend_without_key_is_offline(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "")
+    monkeypatch.setattr(settings, "EMBEDDING_BACKEND", "auto")
+    service = EmbeddingService()
+    vectors = asyncio.run(service.get_embeddings(["printer error", "billing"]))
+    assert len(vectors) == 2 and len(vectors[0]) == settings.HASH_EMBEDDING_DIM
+    assert vectors[0] != vectors[1]
+
+def test_local_backend_batches_by_length_and_keeps_order(tmp_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    from benchmarks.bench_local_embeddings import make_synthetic_model
+
+    model_dir = str(tmp_path / "tiny")
+    make_synthetic_model(model_dir, vocab_size=64, hidden=16, layers=1, intermediate=32)
+    texts = ["password", "password reset account billing invoice", "router firmware", "error code escalation policy password"]
+
+    backend = LocalEmbeddingBackend(model_dir, quantize=False, threads=1, batch_size=2)
+    batched = asyncio.run(backend.embed(texts))
+    assert all(np.isclose(np.linalg.norm(v), 1.0, atol=1e-5) for v in batched)
+    # Same vectors as embedding each text on its own (padding is masked out)
+    for text, vector in zip(texts, batched):
+        assert np.allclose(backend.embed_sync([text])[0], vector, atol=1e-4)
+    backend.close()
+
+    quantized = LocalEmbeddingBackend(model_dir, quantize=True, threads=1, batch_size=2)
+    int8 = quantized.embed_sync(texts)
+    assert os.path.exists(os.path.join(model_dir, "model.int8.onnx"))
+    assert all(np.dot(a, b) > 0.99 for a, b in zip(batched, int8))
+    quantized.close()
@@ -0,0 +1,38 @@
+import asyncio
+from app.services.embedding_batcher import EmbeddingBatcher, queue_wait_seconds
+
+def test_concurrent_queries_share_batches():
+    calls = []
+
+    async def embed_many(texts):
+        calls.append(list(texts))
+        await asyncio.sleep(0.01)
+        return [[float(len(text))] for text in texts]
+
+    batcher = EmbeddingBatcher(embed_many, max_batch_size=4, max_wait_ms=20)
+    observed = queue_wait_seconds.count()
+
+    async def run():
+        texts = ["a", "bb", "ccc", "a", "dddd", "eeeee"]
+        return texts, await asyncio.gather(*(batcher.embed(text) for text in texts))
+
+    texts, vectors = asyncio.run(run())
+    assert vectors == [[float(len(text))] for text in texts]
+    # A full batch goes out immediately (duplicates embedded once), the rest after the wait
+    assert calls == [["a", "bb", "ccc"], ["dddd", "eeeee"]]
+    stats = batcher.stats()
+    assert stats["batches"] == 2 and stats["items"] == 6
+    assert stats["queue_wait_max_ms"] >= 15
+    assert queue_wait_seconds.count() == observed + 6
+
+def test_errors_reach_every_caller_in_the_batch():
+    async def embed_many(texts):
+        raise RuntimeError("provider down")
+
+    batcher = EmbeddingBatcher(embed_many, max_batch_size=8, max_wait_ms=1)
+
+    async def run():
+        return await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
@@ -0,0 +1,23 @@
+from app.services.embedding_cache import EmbeddingCache
+
+def test_key_ignores_whitespace_but_not_model():
+    assert EmbeddingCache.make_key("m", "Reset  your password ") == EmbeddingCache.make_key("m", "Reset your password")
+    assert EmbeddingCache.make_key("m", "text") != EmbeddingCache.make_key("other", "text")
+
+def test_memory_lru_and_disk_tier(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_memory_items=2)
+    cache.put_many({"a": [1.0, 2.0], "b": [3.0, 4.0], "c": [5.0, 6.0]})
+    assert cache.stats()["memory_items"] == 2
+
+    found = cache.get_many(["a", "c", "missing"])
+    assert found == {"a": [1.0, 2.0], "c": [5.0, 6.0]}
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    EmbeddingCache(path).put_many({"k": [0.5, 0.25]})
+
+    reopened = EmbeddingCache(path)
+    assert reopened.get_many(["k"]) == {"k": [0.5, 0.25]}
+    assert reopened.stats()["disk_hits"] == 1
@@ -0,0 +1,135 @@
+import asyncio
+import pytest
+from app.core.config import settings
+from app.services import ingestion
+from app.services.ingestion import ingestion_service
+
+def _reference_chunks(text, chunk_size=1000, overlap=200):
+    chunks, start = [], 0
+    while start < len(text):
+        chunks.append(text[start:start + chunk_size])
+        start += chunk_size - overlap
+    return chunks
+
+def test_iter_chunks_matches_whole_text_chunking():
+    text = "".join(f"word{i} " for i in range(2000))
+    pages = [text[i:i + 777] for i in range(0, len(text), 777)]
+    assert list(ingestion_service.iter_chunks(pages)) == _reference_chunks(text)
+    assert list(ingestion_service.iter_chunks(["x" * 1000])) == _reference_chunks("x" * 1000)
+
+def test_ingest_pipeline_batches_in_order(tmp_path, monkeypatch):
+    text = "".join(f"line {i}\n" for i in range(5000))
+    path = tmp_path / "manual.txt"
+    path.write_text(text)
+
+    stored = []
+
+    async def fake_embeddings(texts):
+        return [[float(len(t))] for t in texts]
+
+    def fake_add(documents, metadatas, ids, embeddings):
+        stored.extend(zip(ids, documents, metadatas))
+
+    monkeypatch.setattr(settings, "CHUNK_STRATEGY", "fixed")
+    monkeypatch.setattr(settings, "INGEST_BATCH_SIZE", 8)
+    monkeypatch.setattr(settings, "INGEST_READ_BLOCK_BYTES", 4096)
+    monkeypatch.setattr(ingestion.embedding_service, "get_embeddings", fake_embeddings)
+    monkeypatch.setattr(ingestion.vector_store, "add_documents", fake_add)
+
+    progress = []
+    stats = asyncio.run(ingestion_service.ingest(str(path), "manual.txt", "doc", progress=lambda p, c: progress.append(c)))
+
+    expected = _reference_chunks(text)
+    assert stats["chunks"] == len(expected)
+    assert [doc for _, doc, _ in stored] == expected
+    assert [meta["chunk_index"] for _, _, meta in stored] == list(range(len(expected)))
+    assert progress[-1] == len(expected)
+
+def test_parallel_pdf_extraction_keeps_page_order(tmp_path, monkeypatch):
+    import fitz
+
+    path = str(tmp_path / "manual.pdf")
+    doc = fitz.open()
+    for i in range(10):
+        doc.new_page().insert_text((72, 72), f"page number {i}")
+    doc.save(path)
+    doc.close()
+
+    monkeypatch.setattr(settings, "PDF_EXTRACT_WORKERS", 0)
+    inline = list(ingestion_service.iter_pages(path))
+
+    monkeypatch.setattr(settings, "PDF_EXTRACT_WORKERS", 2)
+    monkeypatch.setattr(settings, "PDF_PARALLEL_MIN_PAGES", 1)
+    monkeypatch.setattr(settings, "PDF_PAGES_PER_TASK", 3)
+    try:
+        assert list(ingestion_service.iter_pages(path)) == inline
+    finally:
+        ingestion_service.shutdown()
+    assert [f"page number {i}" in text for i, text in enumerate(inline)] == [True] * 10
+
+def test_reingest_embeds_only_changed_chunks(tmp_path, monkeypatch):
+    from app.services.vector_store import VectorStoreService
+
+    monkeypatch.setattr(settings, "CHROMA_DB_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(settings, "VECTOR_STORE_BACKEND", "numpy")
+    store = VectorStoreService()
+    monkeypatch.setattr(ingestion, "vector_store", store)
+    embedded = []
+
+    async def fake_embeddings(texts):
+        embedded.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+    monkeypatch.setattr(ingestion.embedding_service, "get_embeddings", fake_embeddings)
+
+    lines = [f"line {i:05d}\n" for i in range(3000)]
+    path = tmp_path / "manual.txt"
+    path.write_text("".join(lines))
+    first = asyncio.run(ingestion_service.ingest(str(path), "manual.txt", "doc"))
+    assert first["embedded"] == first["chunks"] == store.collection.count()
+
+    # Same-length edit in one place, plus the last 500 lines dropped
+    lines[1000] = "LINE EDIT!\n"
+    path.write_text("".join(lines[:2500]))
+    embedded.clear()
+    second = asyncio.run(ingestion_service.ingest(str(path), "manual.txt", "doc", incremental=True))
+
+    assert second["embedded"] == len(embedded) <= 3
+    assert second["removed"] >= first["chunks"] - second["chunks"]
+    stored = store.get_chunk_metadatas("doc")
+    assert len(stored) == second["chunks"]
+    assert sorted(meta["chunk_index"] for meta in stored.values()) == list(range(second["chunks"]))
+    assert store.lexical.search("EDIT", 5)["ids"][0]
+
+def test_failed_reingest_restores_rewritten_metadata(tmp_path, monkeypatch):
+    from app.services.vector_store import VectorStoreService
+
+    monkeypatch.setattr(settings, "CHROMA_DB_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(settings, "VECTOR_STORE_BACKEND", "numpy")
+    monkeypatch.setattr(settings, "INGEST_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "INGEST_EMBED_RETRIES", 0)
+    store = VectorStoreService()
+    monkeypatch.setattr(ingestion, "vector_store", store)
+    fail = []
+
+    async def fake_embeddings(texts):
+        if fail:
+            raise RuntimeError("embedding service down")
+        return [[float(len(t)), 1.0] for t in texts]
+
+    monkeypatch.setattr(ingestion.embedding_service, "get_embeddings", fake_embeddings)
+
+    lines = [f"line {i:05d}\n" for i in range(3000)]
+    path = tmp_path / "manual.txt"
+    path.write_text("".join(lines))
+    asyncio.run(ingestion_service.ingest(str(path), "manual.txt", "doc"))
+    before = store.get_chunk_metadatas("doc")
+
+    # Renamed, so unchanged chunks get new metadata before the edited one
+    # near the end fails to embed
+    lines[2900] = "LINE EDIT!\n"
+    path.write_text("".join(lines))
+    fail.append(True)
+    with pytest.raises(RuntimeError):
+        asyncio.run(ingestion_service.ingest(str(path), "manual-v2.txt", "doc", incremental=True))
+    assert store.get_chunk_metadatas("doc") == before
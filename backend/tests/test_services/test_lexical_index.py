@@ -0,0 +1,40 @@
+from app.services.lexical_index import LexicalIndex
+from app.services.retrieval_service import RetrievalService
+
+def _index(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.db"))
+    index.add(
+        ids=["a_0", "a_1", "b_0"],
+        documents=[
+            "Printer shows ERR-1042 after the firmware update.",
+            "To reset the printer, hold the power button.",
+            "SKU_998 is out of stock; ERR-1042 is unrelated.",
+        ],
+        metadatas=[{"doc_id": "a", "chunk_index": 0}, {"doc_id": "a", "chunk_index": 1}, {"doc_id": "b", "chunk_index": 0}],
+    )
+    return index
+
+def test_identifiers_match_exactly_and_respect_scope(tmp_path):
+    index = _index(tmp_path)
+    assert set(index.search("what does err-1042 mean?", 5)["ids"][0]) == {"a_0", "b_0"}
+    assert index.search("sku_998", 5)["ids"][0] == ["b_0"]
+    assert index.search("ERR-1042", 5, doc_ids=["a"])["ids"][0] == ["a_0"]
+    # FTS5 syntax in user input is treated as plain terms
+    assert index.search('reset" OR NEAR(', 5)["ids"][0] == ["a_1"]
+    assert index.search("?!", 5)["ids"][0] == []
+
+def test_reindex_and_delete_keep_index_in_sync(tmp_path):
+    index = _index(tmp_path)
+    index.add(ids=["a_0"], documents=["Nothing to see here."], metadatas=[{"doc_id": "a", "chunk_index": 0}])
+    assert index.search("ERR-1042", 5)["ids"][0] == ["b_0"]
+    index.delete_document("b")
+    assert index.search("ERR-1042", 5)["ids"][0] == []
+    assert index.count() == 2
+    index.close()
+
+def test_reciprocal_rank_fusion_prefers_hits_in_both_rankings():
+    vector = {"ids": [["x", "y", "z"]], "documents": [["X", "Y", "Z"]], "metadatas": [[{}, {}, {}]]}
+    lexical = {"ids": [["z", "w"]], "documents": [["Z", "W"]], "metadatas": [[{}, {}]]}
+    fused = RetrievalService.fuse([vector, lexical], 3)
+    assert fused["ids"][0] == ["z", "x", "y"]
+    assert fused["documents"][0] == ["Z", "X", "Y"]
@@ -0,0 +1,24 @@
+import asyncio
+from app.core.config import settings
+from app.services.llm_service import LLMService
+
+def test_client_is_closed_with_its_event_loop(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "test")
+    service = LLMService()
+
+    async def get_client():
+        client = service.client
+        assert service.client is client
+        return client
+
+    first = asyncio.run(get_client())
+    assert first.is_closed()
+    second = asyncio.run(get_client())
+    assert second is not first and second.is_closed()
+
+    async def close_early():
+        client = service.client
+        await service.aclose()
+        return client
+
+    assert asyncio.run(close_early()).is_closed()
@@ -0,0 +1,53 @@
+import asyncio
+import time
+from app.core.metrics import MetricsRegistry, SamplingProfiler, Trace, _current_trace, span, stage_seconds
+
+def test_histogram_and_counter_render_in_prometheus_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests", "Requests", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    requests.inc(1, "/a")
+    requests.inc(2, "/a")
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, "/a")
+    registry.add_collector(lambda: [("queue_depth", "gauge", "Queued", [({"queue": "q"}, 3)])])
+
+    lines = registry.render().splitlines()
+    assert 'requests_total{route="/a"} 3' in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/a"} 3' in lines
+    assert 'queue_depth{queue="q"} 3' in lines
+    assert latency.quantile(0.5, "/a") == 1.0
+
+def test_spans_are_recorded_on_the_current_trace_across_threads():
+    before = stage_seconds.count("test.stage")
+
+    async def handle():
+        trace = Trace("/x")
+        _current_trace.set(trace)
+        with span("test.stage"):
+            await asyncio.sleep(0)
+        await asyncio.to_thread(lambda: span("test.stage").__enter__().__exit__(None, None, None))
+        return trace
+
+    trace = asyncio.run(handle())
+    assert [stage for stage, _, _ in trace.spans] == ["test.stage", "test.stage"]
+    assert stage_seconds.count("test.stage") == before + 2
+    assert "test.stage=" in trace.breakdown()
+
+def test_profiler_stops_sampling_a_trace_once_it_ends(tmp_path):
+    profiler = SamplingProfiler(1, str(tmp_path))
+    trace, other = Trace("/slow"), Trace("/other")
+    profiler.begin(trace)
+    profiler.begin(other)
+    time.sleep(0.05)
+    path = profiler.end(trace, slow=True, route="/slow")
+    written = sum(int(line.rsplit(" ", 1)[1]) for line in open(path))
+    assert written > 0
+
+    # The sampler keeps running for the other request but leaves this one alone
+    time.sleep(0.05)
+    assert sum(trace.samples.values()) == written
+    assert profiler.end(other, slow=False, route="/other") is None
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.numpy_index import NumpyVectorIndex
+from app.services.vector_store import VectorStoreService
+
+def _random_chunks(n, dim=16, doc_of=lambda i: f"doc{i % 3}", seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    ids = [f"c{i}" for i in range(n)]
+    return ids, [f"text {i}" for i in range(n)], [{"doc_id": doc_of(i), "chunk_index": i} for i in range(n)], vectors
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_matches_exact_search(tmp_path, dtype):
+    ids, documents, metadatas, vectors = _random_chunks(300)
+    index = NumpyVectorIndex(str(tmp_path), dtype=dtype)
+    index.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=vectors.tolist())
+
+    query = vectors[7] + 0.05
+    expected = np.argsort(((vectors - query) ** 2).sum(axis=1))[:10]
+    result = index.query(query_embeddings=[query.tolist()], n_results=10)
+    assert result["ids"][0][0] == "c7"
+    assert len(set(result["ids"][0]) & {f"c{i}" for i in expected}) >= 9
+    assert result["documents"][0][0] == "text 7"
+    assert result["metadatas"][0][0] == {"doc_id": "doc1", "chunk_index": 7}
+    assert result["distances"][0] == sorted(result["distances"][0])
+
+    filtered = index.query(query_embeddings=[query.tolist()], n_results=50, where={"doc_id": {"$in": ["doc0", "doc2"]}})
+    assert {m["doc_id"] for m in filtered["metadatas"][0]} == {"doc0", "doc2"}
+    index.close()
+
+def test_delete_replace_compaction_and_reopen(tmp_path):
+    ids, documents, metadatas, vectors = _random_chunks(100)
+    index = NumpyVectorIndex(str(tmp_path), compact_ratio=0.5)
+    index.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=vectors.tolist())
+
+    # Re-adding an id replaces the chunk, leaving a tombstone
+    index.upsert(ids=["c0"], documents=["new text"], metadatas=[{"doc_id": "doc0"}], embeddings=[vectors[50].tolist()])
+    assert index.count() == 100
+    hit = index.query(query_embeddings=[vectors[50].tolist()], n_results=2)
+    assert set(hit["ids"][0]) == {"c0", "c50"}
+
+    index.delete(where={"doc_id": "doc1"})
+    assert index.count() == 67
+    assert (tmp_path / "vectors.bin").stat().st_size == 101 * 16 * 2
+    index.delete(where={"doc_id": "doc2"})  # tombstones pass compact_ratio
+    assert index.count() == 34
+    assert (tmp_path / "vectors.bin").stat().st_size == 34 * 16 * 2
+
+    result = index.query(query_embeddings=[vectors[3].tolist()], n_results=100)
+    assert len(result["ids"][0]) == 34 and result["ids"][0][0] == "c3"
+    index.close()
+
+    reopened = NumpyVectorIndex(str(tmp_path))
+    assert reopened.count() == 34
+    assert reopened.get(ids=["c0"])["documents"] == ["new text"]
+    assert reopened.query(query_embeddings=[vectors[3].tolist()], n_results=1)["ids"][0] == ["c3"]
+    reopened.close()
+
+def test_query_skips_chunks_deleted_while_it_runs(tmp_path):
+    ids, documents, metadatas, vectors = _random_chunks(50)
+    index = NumpyVectorIndex(str(tmp_path))
+    index.add(ids=ids, documents=documents, metadatas=metadatas, embeddings=vectors.tolist())
+
+    # Delete between the query's matrix snapshot and its row lookup
+    rows = index._rows
+    def rows_after_delete(chunk_ids):
+        index.delete(ids=["c7"])
+        return rows(chunk_ids)
+    index._rows = rows_after_delete
+
+    result = index.query(query_embeddings=[vectors[7].tolist()], n_results=5)
+    assert "c7" not in result["ids"][0] and len(result["ids"][0]) == 4
+    assert len(result["documents"][0]) == len(result["distances"][0]) == 4
+    index.close()
+
+def test_vector_store_numpy_backend(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "CHROMA_DB_DIR", str(tmp_path / "chroma"))
+    monkeypatch.setattr(settings, "VECTOR_STORE_BACKEND", "numpy")
+    store = VectorStoreService()
+    ids, documents, metadatas, vectors = _random_chunks(30)
+    store.add_documents(documents=documents, metadatas=metadatas, ids=ids, embeddings=vectors.tolist())
+
+    assert store.ensure_scoped_collection(["doc0"]) is store.collection
+    result = store.query(vectors[4].tolist(), n_results=5, doc_ids=["doc1"])
+    assert result["ids"][0][0] == "c4"
+    assert {m["doc_id"] for m in result["metadatas"][0]} == {"doc1"}
+
+    store.delete_document("doc1")
+    assert store.query(vectors[4].tolist(), n_results=5, doc_ids=["doc1"])["ids"][0] == []
+    assert store.lexical.search("text", 50)["ids"][0]
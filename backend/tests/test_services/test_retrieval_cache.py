@@ -0,0 +1,29 @@
+import time
+from app.services.retrieval_cache import RetrievalCache
+
+def test_exact_hit_uses_normalized_query():
+    cache = RetrievalCache()
+    cache.put("*", 3, "How do I reset my password?", 0, {"documents": [["a"]]})
+    assert cache.get("*", 3, "how do i  reset my password", 0) == {"documents": [["a"]]}
+    assert cache.get("other-agent", 3, "how do i reset my password", 0) is None
+
+def test_generation_change_invalidates():
+    cache = RetrievalCache()
+    cache.put("*", 3, "q", 0, "old")
+    assert cache.get("*", 3, "q", 1) is None
+    assert cache.stats()["invalidations"] == 1
+
+def test_ttl_and_size_bound():
+    cache = RetrievalCache(max_items=2, ttl_seconds=0.05)
+    for query in ["a", "b", "c"]:
+        cache.put("*", 3, query, 0, query)
+    assert cache.get("*", 3, "a", 0) is None
+    assert cache.get("*", 3, "c", 0) == "c"
+    time.sleep(0.06)
+    assert cache.get("*", 3, "c", 0) is None
+
+def test_semantic_tier_threshold():
+    cache = RetrievalCache(semantic_threshold=0.95)
+    cache.put("*", 3, "reset password", 0, "hit", embedding=[1.0, 0.0])
+    assert cache.get_similar("*", 3, [0.99, 0.05], 0) == "hit"
+    assert cache.get_similar("*", 3, [0.5, 0.5], 0) is None
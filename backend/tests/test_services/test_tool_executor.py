@@ -0,0 +1,125 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from typing import Literal, Optional
+
+from app.core.config import settings
+from app.core.tools import Tool, TOOL_REGISTRY
+from app.services.agent_service import ToolExecutor
+from app.services.llm_service import llm_service
+
+def _call(call_id, name, **arguments):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+def test_schema_generated_from_signature_and_docstring():
+    def book_room(room: str, hours: int, size: Literal["small", "large"] = "small", note: Optional[str] = None):
+        """
+        Book a meeting room.
+
+        Args:
+            room: Room name.
+            hours: How long to book it for.
+        """
+
+    schema = Tool(book_room).schema()["function"]
+    assert schema["name"] == "book_room"
+    assert schema["description"] == "Book a meeting room."
+    assert schema["parameters"] == {
+        "type": "object",
+        "properties": {
+            "room": {"type": "string", "description": "Room name."},
+            "hours": {"type": "integer", "description": "How long to book it for."},
+            "size": {"type": "string", "enum": ["small", "large"]},
+            "note": {"type": "string"},
+        },
+        "required": ["room", "hours"],
+    }
+    assert TOOL_REGISTRY["lookup_user_status"].cache_ttl_seconds > 0
+    assert TOOL_REGISTRY["create_servicenow_ticket"].cache_ttl_seconds == 0
+
+def test_calls_run_concurrently_with_timeouts_and_errors():
+    def slow_lookup(key: str):
+        time.sleep(0.2)
+        return {"key": key}
+
+    async def slow_fetch(key: str):
+        await asyncio.sleep(0.2)
+        return {"fetched": key}
+
+    async def hangs():
+        await asyncio.sleep(10)
+
+    executor = ToolExecutor(registry={
+        "slow_lookup": Tool(slow_lookup),
+        "slow_fetch": Tool(slow_fetch),
+        "hangs": Tool(hangs, timeout_seconds=0.3),
+    })
+    calls = [
+        _call("1", "slow_lookup", key="a"),
+        _call("2", "slow_lookup", key="b"),
+        _call("3", "slow_fetch", key="c"),
+        _call("4", "hangs"),
+        _call("5", "missing"),
+        SimpleNamespace(id="6", function=SimpleNamespace(name="slow_fetch", arguments="{not json")),
+    ]
+    started = time.perf_counter()
+    records = asyncio.run(executor.execute(calls))
+    elapsed = time.perf_counter() - started
+    executor.shutdown()
+
+    # Bounded by the slowest call (the timeout), not the 0.6s sum of the others
+    assert elapsed < 0.5
+    assert [r["id"] for r in records] == ["1", "2", "3", "4", "5", "6"]
+    assert [r["result"] for r in records[:3]] == [{"key": "a"}, {"key": "b"}, {"fetched": "c"}]
+    assert records[3]["error"] == "Tool hangs timed out"
+    assert "Unknown tool" in records[4]["error"]
+    assert "not valid JSON" in records[5]["error"]
+
+def test_cacheable_lookups_are_reused_and_coalesced():
+    invocations = []
+
+    def lookup(user_id: str):
+        invocations.append(user_id)
+        time.sleep(0.05)
+        return {"user_id": user_id}
+
+    executor = ToolExecutor(registry={"lookup": Tool(lookup, cache_ttl_seconds=60)})
+
+    async def run():
+        # Two identical calls in one turn share one execution...
+        first = await executor.execute([_call("1", "lookup", user_id="u1"), _call("2", "lookup", user_id="u1")])
+        # ...and later turns hit the cache
+        second = await executor.execute([_call("3", "lookup", user_id="u1"), _call("4", "lookup", user_id="u2")])
+        return first + second
+
+    records = asyncio.run(run())
+    executor.shutdown()
+    assert invocations == ["u1", "u2"]
+    assert [r["cached"] for r in records] == [False, True, True, False]
+    assert all(r["result"] == {"user_id": r["arguments"]["user_id"]} for r in records)
+
+def test_loop_feeds_results_back_and_caps_iterations(monkeypatch):
+    requests = []
+
+    async def fake_complete_with_tools(model, messages, tools, temperature=0.7, tool_choice="auto", timeout=None):
+        requests.append((list(messages), tool_choice))
+        if tool_choice == "none":
+            return SimpleNamespace(content="Final answer", tool_calls=None)
+        return SimpleNamespace(content=None, tool_calls=[_call(f"c{len(requests)}", "echo", text="hi")])
+
+    def echo(text: str):
+        return {"echo": text}
+
+    monkeypatch.setattr(llm_service, "complete_with_tools", fake_complete_with_tools)
+    monkeypatch.setattr(settings, "TOOL_MAX_ITERATIONS", 3)
+    executor = ToolExecutor(registry={"echo": Tool(echo)})
+    answer, records = asyncio.run(executor.run("gpt-4", [{"role": "user", "content": "hi"}], ["echo"]))
+    executor.shutdown()
+
+    assert answer == "Final answer"
+    assert len(records) == 3
+    assert [choice for _, choice in requests] == ["auto", "auto", "auto", "none"]
+    final_messages = requests[-1][0]
+    assert [m["role"] for m in final_messages] == ["user"] + ["assistant", "tool"] * 3
+    assert final_messages[2] == {"role": "tool", "tool_call_id": "c1", "content": json.dumps({"echo": "hi"})}
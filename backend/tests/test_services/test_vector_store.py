@@ -0,0 +1,44 @@
+from app.core.config import settings
+from app.services.vector_store import VectorStoreService
+
+def _add(store, doc_id, n, offset=0.0):
+    store.add_documents(
+        documents=[f"{doc_id} chunk {i}" for i in range(n)],
+        metadatas=[{"doc_id": doc_id, "filename": f"{doc_id}.txt", "chunk_index": i} for i in range(n)],
+        ids=[f"{doc_id}_{i}" for i in range(n)],
+        embeddings=[[1.0, offset + i * 0.01, 0.0] for i in range(n)]
+    )
+
+def _doc_ids(result):
+    return {meta["doc_id"] for meta in result["metadatas"][0]}
+
+def test_queries_are_restricted_to_the_agents_documents(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "CHROMA_DB_DIR", str(tmp_path / "chroma"))
+    store = VectorStoreService()
+    _add(store, "a", 5)
+    _add(store, "b", 5, offset=0.5)
+    _add(store, "c", 5)
+
+    assert _doc_ids(store.query([1.0, 0.0, 0.0], n_results=15)) == {"a", "b", "c"}
+    assert _doc_ids(store.query([1.0, 0.0, 0.0], n_results=10, doc_ids=["a", "b"])) == {"a", "b"}
+    assert _doc_ids(store.query([1.0, 0.0, 0.0], n_results=10, doc_ids=["b"])) == {"b"}
+
+    # A dedicated collection is backfilled and then kept in sync
+    collection = store.ensure_scoped_collection(["b", "a"])
+    assert collection.count() == 10
+    _add(store, "a", 7)
+    store.delete_document("b")
+    assert collection.count() == 7
+    result = store.query([1.0, 0.0, 0.0], n_results=10, doc_ids=["a", "b"])
+    assert _doc_ids(result) == {"a"} and len(result["ids"][0]) == 7
+
+    # Chunks of documents outside the set don't touch it
+    other = store.ensure_scoped_collection(["c"])
+    store.delete_chunks("c", ["c_0", "c_1"])
+    assert collection.count() == 7 and other.count() == 3
+
+    # Agents don't survive a restart, so neither do their collections
+    reopened = VectorStoreService()
+    assert not reopened._scoped
+    assert not [c for c in reopened.client.list_collections() if c.name.startswith("kb_scope_")]
+    assert len(reopened.query([1.0, 0.0, 0.0], n_results=10, doc_ids=["a", "b"])["ids"][0]) == 7
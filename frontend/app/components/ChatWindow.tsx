@@ -60,13 +60,10 @@ export default function ChatWindow({ agentId, initialSessionId }: ChatWindowProp
         setLoading(true);
 
         try {
-            // Convert history to format expected by backend
-            const history = messages.map(m => ({ role: m.role, content: m.content }));
-
+            // Earlier turns are loaded server-side from the session
             const res = await api.post('/chat', {
                 agent_id: agentId,
                 message: userMessage.content,
-                history: history,
                 session_id: sessionId
             });
 
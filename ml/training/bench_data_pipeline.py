@@ -0,0 +1,173 @@
+"""
+Fine-tuning batches built four ways from the same chat conversations:
+
+- pad_to_max: every example padded to --max_length (the old pipeline)
+- dynamic:    random batches padded to their longest example
+- bucketed:   dynamic padding over length-grouped batches
+- packed:     conversations packed into --max_length sequences
+
+For each: sequences, batches, the fraction of pad tokens, and (unless
+--stats_only) tokens/sec of forward+backward steps of a tiny randomly
+initialised Llama on CPU. Tokens/sec counts real (non-pad) tokens, so it
+is training progress per second.
+
+    python bench_data_pipeline.py --tokenizer TinyLlama/TinyLlama-1.1B-Chat-v1.0
+    python bench_data_pipeline.py --tokenizer_file tokenizer.json --stats_only
+
+Conversations are synthetic support chats (short turns, long tail) unless
+--data_path points at a chat_logs.jsonl.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+# collator.py and dataset.py sit next to this script
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from dataset import IGNORE_INDEX, length_grouped_batches, load_conversations, pack, tokenize_conversations
+
+WORDS = (
+    "account password reset billing invoice refund login error device sync export policy admin "
+    "settings click select open menu contact support team within days request vpn laptop access"
+).split()
+
+def synthetic_conversations(n: int, seed: int = 0):
+    rng = random.Random(seed)
+
+    def text(mean_words: float) -> str:
+        words = max(2, int(rng.lognormvariate(0, 0.8) * mean_words))
+        return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+    conversations = []
+    for _ in range(n):
+        messages = [{"role": "system", "content": "You are a helpful IT support assistant."}]
+        for _ in range(rng.choice([1, 1, 1, 2, 3])):
+            messages.append({"role": "user", "content": text(12)})
+            messages.append({"role": "assistant", "content": text(40)})
+        conversations.append(messages)
+    return conversations
+
+class JsonTokenizer:
+    """The slice of the transformers tokenizer API dataset.py uses, over a tokenizer.json."""
+    def __init__(self, path: str):
+        from tokenizers import Tokenizer
+        self.tokenizer = Tokenizer.from_file(path)
+        self.bos_token_id = None
+        self.eos_token_id = self.pad_token_id = self.tokenizer.get_vocab_size()
+        self.vocab_size = self.eos_token_id + 1
+
+    def __len__(self):
+        return self.vocab_size
+
+    def __call__(self, texts, add_special_tokens=False):
+        return {"input_ids": [e.ids for e in self.tokenizer.encode_batch(texts, add_special_tokens=add_special_tokens)]}
+
+def batches_for(mode: str, examples, packed, batch_size: int, seed: int = 0):
+    if mode == "packed":
+        order = list(range(len(packed)))
+        random.Random(seed).shuffle(order)
+        return [[packed[i] for i in order[b:b + batch_size]] for b in range(0, len(order), batch_size)]
+    if mode == "bucketed":
+        groups = length_grouped_batches([len(e["input_ids"]) for e in examples], batch_size, seed)
+        return [[examples[i] for i in group] for group in groups]
+    order = list(range(len(examples)))
+    random.Random(seed).shuffle(order)
+    return [[examples[i] for i in order[b:b + batch_size]] for b in range(0, len(order), batch_size)]
+
+def batch_shape(mode: str, batch, max_length: int, multiple: int = 8):
+    if mode == "pad_to_max":
+        return len(batch), max_length
+    longest = max(len(f["input_ids"]) for f in batch)
+    return len(batch), -(-longest // multiple) * multiple
+
+def stats(mode: str, batches, max_length: int):
+    positions = sum(rows * length for rows, length in (batch_shape(mode, b, max_length) for b in batches))
+    tokens = sum(len(f["input_ids"]) for b in batches for f in b)
+    labelled = sum(1 for b in batches for f in b for label in f["labels"] if label != IGNORE_INDEX)
+    return {
+        "sequences": sum(len(b) for b in batches),
+        "batches": len(batches),
+        "tokens": tokens,
+        "positions": positions,
+        "pad_fraction": 1 - tokens / positions,
+        "labelled_fraction": labelled / positions,
+    }
+
+def train_speed(mode: str, batches, tokenizer, max_length: int, steps: int, seed: int = 0):
+    import torch
+    from transformers import LlamaConfig, LlamaForCausalLM
+    from collator import DynamicPaddingCollator, PackedCollator
+
+    torch.manual_seed(seed)
+    config = LlamaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=128, intermediate_size=344, num_hidden_layers=2,
+        num_attention_heads=4, num_key_value_heads=4, max_position_embeddings=max_length,
+    )
+    model = LlamaForCausalLM(config)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=1e-4)
+    if mode == "packed":
+        collate = PackedCollator(tokenizer.pad_token_id)
+    elif mode == "pad_to_max":
+        collate = DynamicPaddingCollator(tokenizer.pad_token_id, pad_to_multiple_of=max_length)
+    else:
+        collate = DynamicPaddingCollator(tokenizer.pad_token_id)
+
+    batches = batches[:steps + 1]
+    # First step is warm-up
+    model(**collate(batches[0])).loss.backward()
+    optimizer.zero_grad()
+    tokens, start = 0, time.perf_counter()
+    for batch in batches[1:]:
+        loss = model(**collate(batch)).loss
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+        tokens += sum(len(f["input_ids"]) for f in batch)
+    return tokens / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokenizer", help="transformers tokenizer name or path")
+    parser.add_argument("--tokenizer_file", help="tokenizer.json (no transformers needed)")
+    parser.add_argument("--data_path", help="chat_logs.jsonl; default: synthetic conversations")
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--max_length", type=int, default=512)
+    parser.add_argument("--batch_size", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=30, help="Timed training steps per mode")
+    parser.add_argument("--stats_only", action="store_true", help="Skip the training-speed runs (no torch needed)")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    if args.tokenizer_file:
+        tokenizer = JsonTokenizer(args.tokenizer_file)
+    else:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer or "TinyLlama/TinyLlama-1.1B-Chat-v1.0")
+        tokenizer.pad_token = tokenizer.pad_token or tokenizer.eos_token
+
+    conversations = load_conversations(args.data_path) if args.data_path else synthetic_conversations(args.conversations)
+    start = time.perf_counter()
+    examples = tokenize_conversations(conversations, tokenizer, args.max_length)
+    tokenize_s = time.perf_counter() - start
+    start = time.perf_counter()
+    packed = pack(examples, args.max_length)
+    pack_s = time.perf_counter() - start
+    print(f"{len(examples)} conversations, {sum(len(e['input_ids']) for e in examples)} tokens "
+          f"(tokenized in {tokenize_s:.2f}s, packed into {len(packed)} sequences in {pack_s * 1000:.0f}ms)")
+
+    results = {}
+    for mode in ("pad_to_max", "dynamic", "bucketed", "packed"):
+        batches = batches_for(mode, examples, packed, args.batch_size)
+        row = results[mode] = stats(mode, batches, args.max_length)
+        line = f"{mode:>10}: {row['batches']:5d} batches  pad {row['pad_fraction']:6.1%}  labelled {row['labelled_fraction']:6.1%}"
+        if not args.stats_only:
+            row["tokens_per_s"] = train_speed(mode, batches, tokenizer, args.max_length, args.steps)
+            line += f"  {row['tokens_per_s']:8.0f} tokens/s"
+        print(line)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,89 @@
+"""
+Collators for the examples built in dataset.py.
+"""
+import os
+import sys
+from typing import Dict, List, Optional
+
+import torch
+
+# dataset.py sits next to this file, which is not part of a package
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if _HERE not in sys.path:
+    sys.path.insert(0, _HERE)
+from dataset import IGNORE_INDEX
+
+def padded_length(length: int, multiple: Optional[int]) -> int:
+    return -(-length // multiple) * multiple if multiple else length
+
+class DynamicPaddingCollator:
+    """
+    Right-pads a batch to its own longest example (rounded up to
+    pad_to_multiple_of, which keeps tensor-core shapes) instead of a fixed
+    max_length. Pair with length-grouped batches to keep padding low.
+    """
+    def __init__(self, pad_token_id: int, pad_to_multiple_of: Optional[int] = 8):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features: List[Dict[str, List[int]]]) -> Dict[str, torch.Tensor]:
+        length = padded_length(max(len(f["input_ids"]) for f in features), self.pad_to_multiple_of)
+        input_ids = torch.full((len(features), length), self.pad_token_id, dtype=torch.long)
+        labels = torch.full((len(features), length), IGNORE_INDEX, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), length), dtype=torch.long)
+        for row, feature in enumerate(features):
+            n = len(feature["input_ids"])
+            input_ids[row, :n] = torch.tensor(feature["input_ids"])
+            labels[row, :n] = torch.tensor(feature["labels"])
+            attention_mask[row, :n] = 1
+        return {"input_ids": input_ids, "labels": labels, "attention_mask": attention_mask}
+
+class PackedCollator:
+    """
+    Batches packed sequences (dataset.pack). position_ids restart at 0 for
+    every conversation; how attention is kept inside each conversation
+    depends on `attention`:
+
+    - "block": a 4D block-diagonal causal mask (batch, 1, L, L), additive
+      (0 = attend, dtype minimum = blocked), for eager/SDPA attention
+      (transformers >= 4.40 accepts such masks as attention_mask).
+      Costs L * L mask entries per sequence.
+    - "position_ids": no mask; flash-attention-2 models find the
+      boundaries from where position_ids restart, in O(L) memory.
+
+    The padding at the end of a sequence is its own block, so no row of
+    the mask is fully blocked.
+    """
+    def __init__(self, pad_token_id: int, attention: str = "block", pad_to_multiple_of: Optional[int] = 8, mask_dtype: torch.dtype = torch.float32):
+        if attention not in ("block", "position_ids"):
+            raise ValueError(f"Unknown attention mode: {attention}")
+        self.pad_token_id = pad_token_id
+        self.attention = attention
+        self.pad_to_multiple_of = pad_to_multiple_of
+        self.mask_dtype = mask_dtype
+
+    def __call__(self, features: List[Dict[str, List[int]]]) -> Dict[str, torch.Tensor]:
+        length = padded_length(max(len(f["input_ids"]) for f in features), self.pad_to_multiple_of)
+        batch = len(features)
+        input_ids = torch.full((batch, length), self.pad_token_id, dtype=torch.long)
+        labels = torch.full((batch, length), IGNORE_INDEX, dtype=torch.long)
+        position_ids = torch.zeros((batch, length), dtype=torch.long)
+        # Block id of each position; padding gets its own
+        blocks = torch.zeros((batch, length), dtype=torch.long)
+        for row, feature in enumerate(features):
+            n = len(feature["input_ids"])
+            input_ids[row, :n] = torch.tensor(feature["input_ids"])
+            labels[row, :n] = torch.tensor(feature["labels"])
+            position_ids[row, :n] = torch.tensor(feature["position_ids"])
+            position_ids[row, n:] = torch.arange(length - n)
+            seq_lens = feature["seq_lens"] + ([length - n] if length > n else [])
+            blocks[row] = torch.repeat_interleave(torch.arange(len(seq_lens)), torch.tensor(seq_lens))
+
+        result = {"input_ids": input_ids, "labels": labels, "position_ids": position_ids}
+        if self.attention == "block":
+            causal = torch.ones((length, length), dtype=torch.bool).tril()
+            allowed = (blocks[:, :, None] == blocks[:, None, :]) & causal
+            mask = torch.zeros((batch, 1, length, length), dtype=self.mask_dtype)
+            mask.masked_fill_(~allowed[:, None], torch.finfo(self.mask_dtype).min)
+            result["attention_mask"] = mask
+        return result
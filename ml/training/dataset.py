@@ -0,0 +1,160 @@
+"""
+Fine-tuning data from the chat logs (data/raw/chat_logs.jsonl, one
+{"messages": [...]} object per line).
+
+Conversations are rendered in the same "<|role|>\\ncontent\\n" format as
+before and tokenized with labels on the assistant turns only. From there
+they are either packed into full-length sequences (pack) or batched by
+similar length for dynamic padding (length_grouped_batches, as a
+DataLoader batch sampler: LengthGroupedBatchSampler), instead of every
+example being padded to max_length.
+"""
+import json
+import random
+from bisect import bisect_left, insort
+from typing import Dict, List, Sequence, Tuple
+
+# Label value the loss ignores (PyTorch cross-entropy default)
+IGNORE_INDEX = -100
+
+def load_conversations(path: str) -> List[List[Dict[str, str]]]:
+    """Conversations with at least one assistant turn; malformed lines are skipped."""
+    conversations = []
+    with open(path) as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                messages = json.loads(line)["messages"]
+            except (ValueError, KeyError, TypeError):
+                print(f"Skipping malformed line {line_no} of {path}")
+                continue
+            if any(m.get("role") == "assistant" for m in messages):
+                conversations.append(messages)
+    return conversations
+
+def tokenize_conversations(conversations: Sequence[List[Dict[str, str]]], tokenizer, max_length: int = 512) -> List[Dict[str, List[int]]]:
+    """
+    {"input_ids", "labels"} per conversation: BOS, then each turn's
+    "<|role|>\\n" header and "content\\n" body, then EOS. Only assistant
+    bodies (and the final EOS after an assistant turn) are labelled; the
+    rest is IGNORE_INDEX. Headers and bodies are tokenized separately, the
+    way the prompt and the generated answer are split at inference.
+
+    Conversations are truncated to max_length; one left with no labelled
+    token is dropped. All segments go through the tokenizer in one batch.
+    """
+    segments = []
+    for messages in conversations:
+        for message in messages:
+            segments.append(f"<|{message['role']}|>\n")
+            segments.append(f"{message['content']}\n")
+    segment_ids = tokenizer(segments, add_special_tokens=False)["input_ids"] if segments else []
+
+    examples = []
+    position = 0
+    for messages in conversations:
+        input_ids: List[int] = []
+        labels: List[int] = []
+        if tokenizer.bos_token_id is not None:
+            input_ids.append(tokenizer.bos_token_id)
+            labels.append(IGNORE_INDEX)
+        for message in messages:
+            header, body = segment_ids[position], segment_ids[position + 1]
+            position += 2
+            input_ids += header + body
+            labels += [IGNORE_INDEX] * len(header)
+            labels += body if message["role"] == "assistant" else [IGNORE_INDEX] * len(body)
+        if tokenizer.eos_token_id is not None:
+            input_ids.append(tokenizer.eos_token_id)
+            labels.append(tokenizer.eos_token_id if messages[-1]["role"] == "assistant" else IGNORE_INDEX)
+
+        input_ids, labels = input_ids[:max_length], labels[:max_length]
+        if any(label != IGNORE_INDEX for label in labels):
+            examples.append({"input_ids": input_ids, "labels": labels})
+    return examples
+
+def pack(examples: Sequence[Dict[str, List[int]]], max_length: int) -> List[Dict[str, List[int]]]:
+    """
+    Concatenate examples into sequences of at most max_length tokens, by
+    best-fit decreasing: longest example first, each into the fullest
+    sequence it still fits in. Each packed sequence carries position_ids
+    that restart at 0 for every conversation and seq_lens, which the
+    collator turns into attention boundaries.
+
+    Every example starts with an unlabelled token (BOS or a role header),
+    so no label is ever predicted from the previous conversation.
+    """
+    order = sorted(range(len(examples)), key=lambda i: len(examples[i]["input_ids"]), reverse=True)
+    bins: List[List[int]] = []
+    # (space left, bin) for bins that still have room, sorted
+    free: List[Tuple[int, int]] = []
+    for i in order:
+        length = len(examples[i]["input_ids"])
+        slot = bisect_left(free, (length, -1))
+        if slot == len(free):
+            bins.append([i])
+            space, b = max_length - length, len(bins) - 1
+        else:
+            space, b = free.pop(slot)
+            bins[b].append(i)
+            space -= length
+        if space > 0:
+            insort(free, (space, b))
+
+    packed = []
+    for members in bins:
+        sequence: Dict[str, List[int]] = {"input_ids": [], "labels": [], "position_ids": [], "seq_lens": []}
+        for i in members:
+            example = examples[i]
+            sequence["input_ids"] += example["input_ids"]
+            sequence["labels"] += example["labels"]
+            sequence["position_ids"] += range(len(example["input_ids"]))
+            sequence["seq_lens"].append(len(example["input_ids"]))
+        packed.append(sequence)
+    return packed
+
+def length_grouped_batches(lengths: Sequence[int], batch_size: int, seed: int = 0, megabatch_mult: int = 50) -> List[List[int]]:
+    """
+    Index batches of similar-length examples, so dynamic padding adds few
+    pad tokens while the order stays random: indices are shuffled, cut
+    into megabatches of batch_size * megabatch_mult, and each megabatch is
+    sorted by length before being split into batches. The batch with the
+    longest example goes first, so an out-of-memory shows up at step one.
+    """
+    rng = random.Random(seed)
+    indices = list(range(len(lengths)))
+    rng.shuffle(indices)
+    megabatch = batch_size * megabatch_mult
+    batches = []
+    for start in range(0, len(indices), megabatch):
+        group = sorted(indices[start:start + megabatch], key=lambda i: lengths[i], reverse=True)
+        batches += [group[i:i + batch_size] for i in range(0, len(group), batch_size)]
+    rng.shuffle(batches)
+    if batches:
+        longest = max(range(len(batches)), key=lambda b: max(lengths[i] for i in batches[b]))
+        batches[0], batches[longest] = batches[longest], batches[0]
+    return batches
+
+class LengthGroupedBatchSampler:
+    """
+    DataLoader batch_sampler over length_grouped_batches, with a new
+    shuffle every epoch.
+    """
+    def __init__(self, lengths: Sequence[int], batch_size: int, seed: int = 0):
+        self.lengths = list(lengths)
+        self.batch_size = batch_size
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __iter__(self):
+        batches = length_grouped_batches(self.lengths, self.batch_size, self.seed + self.epoch)
+        self.epoch += 1
+        return iter(batches)
+
+    def __len__(self) -> int:
+        # Megabatches are whole multiples of batch_size, so only the last batch can be short
+        return -(-len(self.lengths) // self.batch_size)
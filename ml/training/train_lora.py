@@ -4,6 +4,9 @@ import json
 import time
 import sys
 
+# collator.py and dataset.py sit next to this script
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
 def mock_train(data_path, output_dir, epochs=3):
     print(f"Starting mock training using data from {data_path}")
     print(f"Output directory: {output_dir}")
@@ -29,12 +32,14 @@ def mock_train(data_path, output_dir, epochs=3):
     with open(os.path.join(output_dir, "adapter_model.bin"), "w") as f:
         f.write("dummy model content")
 
-def real_train(data_path, model_name, output_dir, epochs):
+def real_train(data_path, model_name, output_dir, epochs, packing=False, max_length=512, batch_size=4):
     try:
         import torch
-        from datasets import load_dataset
         from peft import LoraConfig, get_peft_model, TaskType
-        from transformers import AutoModelForCausalLM, AutoTokenizer, TrainingArguments, Trainer, DataCollatorForLanguageModeling
+        from transformers import AutoModelForCausalLM, AutoTokenizer, TrainingArguments, Trainer
+        from collator import DynamicPaddingCollator, PackedCollator
+        from dataset import LengthGroupedBatchSampler, load_conversations, pack, tokenize_conversations
+        from torch.utils.data import DataLoader
     except ImportError as e:
         print(f"Missing dependencies for real training: {e}")
         print("Falling back to mock training...")
@@ -59,37 +64,48 @@ def real_train(data_path, model_name, output_dir, epochs):
     model = get_peft_model(model, peft_config)
     model.print_trainable_parameters()
 
-    # Load Data
-    dataset = load_dataset("json", data_files=data_path, split="train")
-    
-    def tokenize_function(examples):
-        # Simple formatting
-        texts = []
-        for msgs in examples["messages"]:
-            # Convert chat format to text
-            chat_text = ""
-            for msg in msgs:
-                chat_text += f"<|{msg['role']}|>\n{msg['content']}\n"
-            texts.append(chat_text)
-        
-        return tokenizer(texts, padding="max_length", truncation=True, max_length=512)
-
-    tokenized_datasets = dataset.map(tokenize_function, batched=True)
+    # Load Data: loss on assistant turns only, and no padding to max_length.
+    # Either several conversations share one max_length sequence (packing),
+    # or batches of similar-length conversations are padded to their longest.
+    examples = tokenize_conversations(load_conversations(data_path), tokenizer, max_length)
+    if packing:
+        train_dataset = pack(examples, max_length)
+        flash = getattr(model.config, "_attn_implementation", None) == "flash_attention_2"
+        data_collator = PackedCollator(tokenizer.pad_token_id, attention="position_ids" if flash else "block", mask_dtype=model.dtype)
+        print(f"Packed {len(examples)} conversations into {len(train_dataset)} sequences of up to {max_length} tokens")
+    else:
+        train_dataset = examples
+        data_collator = DynamicPaddingCollator(tokenizer.pad_token_id)
 
     training_args = TrainingArguments(
         output_dir=output_dir,
-        per_device_train_batch_size=1,
+        per_device_train_batch_size=batch_size,
         num_train_epochs=epochs,
         learning_rate=2e-4,
         logging_steps=1,
-        save_strategy="epoch"
+        save_strategy="epoch",
+        # The collators need seq_lens/position_ids, which aren't model arguments
+        remove_unused_columns=False
     )
 
-    trainer = Trainer(
+    class LengthGroupedTrainer(Trainer):
+        """Batches of similar-length conversations, padded to their longest."""
+        def get_train_dataloader(self):
+            lengths = [len(example["input_ids"]) for example in self.train_dataset]
+            loader = DataLoader(
+                self.train_dataset,
+                batch_sampler=LengthGroupedBatchSampler(lengths, self._train_batch_size, seed=self.args.seed),
+                collate_fn=self.data_collator,
+                num_workers=self.args.dataloader_num_workers,
+                pin_memory=self.args.dataloader_pin_memory,
+            )
+            return self.accelerator.prepare(loader)
+
+    trainer = (Trainer if packing else LengthGroupedTrainer)(
         model=model,
         args=training_args,
-        train_dataset=tokenized_datasets,
-        data_collator=DataCollatorForLanguageModeling(tokenizer, mlm=False),
+        train_dataset=train_dataset,
+        data_collator=data_collator,
     )
 
     trainer.train()
@@ -102,6 +118,9 @@ if __name__ == "__main__":
     parser.add_argument("--model_name", type=str, default="TinyLlama/TinyLlama-1.1B-Chat-v1.0")
     parser.add_argument("--output_dir", type=str, default="output")
     parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--max_length", type=int, default=512)
+    parser.add_argument("--batch_size", type=int, default=4)
+    parser.add_argument("--packing", action="store_true", help="Pack several conversations into each max_length sequence")
     parser.add_argument("--mock", action="store_true", help="Force mock training")
     
     args = parser.parse_args()
@@ -110,4 +129,4 @@ if __name__ == "__main__":
         mock_train(args.data_path, args.output_dir, args.epochs)
     else:
         # Try real training, fallback to mock if imports fail
-        real_train(args.data_path, args.model_name, args.output_dir, args.epochs)
+        real_train(args.data_path, args.model_name, args.output_dir, args.epochs, args.packing, args.max_length, args.batch_size)